@@ -0,0 +1,111 @@
+# Dashboard reads during an import: a synthetic log is imported by
+# dnd-stats ingest --quiet in a subprocess while reader threads run the queries
+# of the dashboard pages in a loop, on the read-only engine of the dashboard.
+#
+#   python benchmarks/bench_concurrency.py [--messages 100000] [--readers 4]
+#
+# Reports the import time, the number of page loads and their latency during
+# the import, and every error of the readers ("database is locked", ...). Exits
+# with status 1 when a reader or the import failed.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+from generate_log import write_log
+from bench_suite import PAGE_QUERIES, selected_filter, run_page
+from dnd_stats.db import create_write_engine, create_read_engine
+from dnd_stats.migrations import upgrade
+
+
+# Loads every page again and again until stop is set, the latency in ms of
+# each page load goes to latencies and the exceptions to errors
+class Reader(threading.Thread):
+    def __init__(self, engine, stop):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.stop = stop
+        self.latencies = []
+        self.errors = []
+
+    def run(self):
+        while not self.stop.is_set():
+            for page, page_queries in PAGE_QUERIES.items():
+                start_time = time.perf_counter()
+                try:
+                    self.load_page(page_queries)
+                except Exception as e:
+                    self.errors.append(f'{page}: {e!r}')
+                    continue
+                self.latencies.append((time.perf_counter() - start_time) * 1000)
+
+    def load_page(self, page_queries):
+        with self.engine.connect() as connection:
+            # The filter of the sidebar, on what has been imported so far
+            run_page(connection, page_queries, selected_filter(connection))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dashboard queries during an import')
+    parser.add_argument('--messages', type=int, default=100_000, help='size of the generated log')
+    parser.add_argument('--readers', type=int, default=4, help='reader threads, like dashboard sessions')
+    parser.add_argument('--seed', type=int, default=1)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='dnd-concurrency-') as directory:
+        log_path = os.path.join(directory, 'log.html')
+        with open(log_path, 'w', encoding='utf-8') as output:
+            write_log(output, arguments.messages, arguments.seed)
+
+        # The tables exist before the readers start, as when the dashboard is
+        # opened on a database
+        database_url = 'sqlite:///' + os.path.join(directory, 'ROLL20_DB.db')
+        engine = create_write_engine(database_url)
+        upgrade(engine)
+        engine.dispose()
+
+        read_engine = create_read_engine(database_url, pool_size=arguments.readers)
+        stop = threading.Event()
+        readers = [Reader(read_engine, stop) for _ in range(arguments.readers)]
+        for reader in readers:
+            reader.start()
+
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+        start_time = time.perf_counter()
+        ingest = subprocess.run(
+            [sys.executable, '-m', 'dnd_stats', 'ingest', log_path, '--quiet', '--db', database_url],
+            cwd=directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        ingest_seconds = time.perf_counter() - start_time
+
+        stop.set()
+        for reader in readers:
+            reader.join()
+        read_engine.dispose()
+
+    latencies = [latency for reader in readers for latency in reader.latencies]
+    errors = [error for reader in readers for error in reader.errors]
+    print(f'{arguments.messages} messages imported in {ingest_seconds:.2f}s with {arguments.readers} readers')
+    if latencies:
+        print(f'{len(latencies)} page loads during the import: median {statistics.median(latencies):.2f} ms, '
+              f'p95 {percentile(latencies, 0.95):.2f} ms, max {max(latencies):.2f} ms')
+    print(f'{len(errors)} reader errors')
+    for error in errors[:20]:
+        print('    ' + error)
+
+    if ingest.returncode != 0:
+        print('dnd-stats ingest failed:\n' + ingest.stderr.decode(errors='replace'))
+    sys.exit(1 if errors or ingest.returncode != 0 else 0)
@@ -0,0 +1,124 @@
+# Microbenchmark of the message extraction: the previous implementation, with a
+# string XPath per value and inline regexes, against MessageExtractor.
+#
+#   python benchmarks/bench_extractor.py dndlog_avr2024.html [repeat]
+#
+# The log is parsed once beforehand so only the extraction is timed. Both
+# implementations must find the same character, action and rejection for each
+# message (the dice are parsed by dice_expr since, the legacy values are text).
+import os
+import re
+import sys
+import time
+from lxml import html
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dnd_stats.roll20_log import message_extractor
+
+
+def legacy_extract_value_between_parentheses(input_string):
+    match = re.search(r'\((.*?)\)', input_string)
+    if match:
+        nat_roll_values = match.group(1)
+        if len(nat_roll_values.split(' + ')) > 1:
+            all_nat_roll_values = ''
+            for roll in nat_roll_values:
+                all_nat_roll_values += roll + ' '
+            return all_nat_roll_values
+        else:
+            return nat_roll_values
+
+
+def legacy_extract_dice_type_value(input_string):
+    match = re.search(r'\dd\d\d?', input_string)
+    if match:
+        return match.group(0)
+
+
+# extract_values() before MessageExtractor
+def legacy_extract(message):
+    character_name = message.xpath('.//div[contains(@class, "sheet-charname")]/span/text()')
+    if character_name and len(character_name) > 0:
+        character_name = str(character_name[0])
+    else:
+        return (None, 'NO_CHAR_NAME', None)
+
+    nat_roll_values_unparsed = message.xpath('.//span[contains(@class, "inlinerollresult")]/@title')
+    if nat_roll_values_unparsed:
+        nat_rolls = legacy_extract_value_between_parentheses(nat_roll_values_unparsed[0])
+        if nat_rolls:
+            if re.search('basicdiceroll', nat_rolls):
+                match = re.search('basicdiceroll', nat_roll_values_unparsed[0])
+                if match:
+                    values = re.findall(r'(?<=>)\d\d?(?=</span)', nat_roll_values_unparsed[0])
+                    if values:
+                        nat_rolls = values[0]
+        else:
+            return (character_name, './/span[contains(@class, "inlinerollresult")]/@title not found > basicdiceroll', None)
+    else:
+        return (character_name, './/span[contains(@class, "inlinerollresult")]/@title not found', None)
+
+    dice_type = None
+    modifier = ''
+    dice_title_unparsed = message.xpath('.//span[contains(@class, "inlinerollresult")]/@title')[0]
+    if dice_title_unparsed:
+        if "[" in dice_title_unparsed and re.search(r'\dd\d\d?', dice_title_unparsed.split("[")[1].split("]")[0]):
+            dice_type = dice_title_unparsed.split("[")[1].split("]")[0]
+        elif "[" in dice_title_unparsed:
+            dice_type = dice_title_unparsed.split("Rolling ")[1].split("[")[0]
+        elif "+" in dice_title_unparsed:
+            dice_type = dice_title_unparsed.split("Rolling ")[1].split("=")[0].rstrip()
+        elif legacy_extract_dice_type_value(dice_title_unparsed) != None:
+            dice_type = legacy_extract_dice_type_value(dice_title_unparsed)
+        if dice_type and '+' in dice_type:
+            dice_type_u = dice_type.split("+")[0].rstrip()
+            modifier = dice_type.split("+")[1].rstrip()
+            dice_type = dice_type_u
+
+    total_roll_value = message.xpath('.//span[contains(@class, "inlinerollresult")]/text()')[0]
+
+    action_name = message.xpath('.//div[@class="sheet-label"]/span/a/text()')
+    if len(action_name) > 0:
+        action_name = re.sub(r'\s{2,}', ' ', action_name[0].rstrip())
+    else:
+        action_name = ''
+    if action_name == '':
+        action_type = message.xpath('.//div[@class="sheet-label"]/span/text()')
+        if len(action_type) > 0 and action_type[0].strip() != '':
+            action_type = action_type[0].strip()
+        else:
+            action_type = ''
+        action_name = action_type
+
+    return (character_name, None, str(action_name))
+
+
+def run(extract, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = [extract(message) for message in messages]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return records, len(messages) / best
+
+
+if __name__ == '__main__':
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'dndlog_avr2024.html'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        tree = html.fromstring(file.read())
+    messages = tree.xpath('//div[contains(@class, "message") and contains(@class, "general")]')
+
+    before_records, before_rate = run(legacy_extract, messages, repeat)
+    after_records, after_rate = run(message_extractor.extract, messages, repeat)
+
+    after_records = [(record.character_name, record.reject_reason, record.action_name) for record in after_records]
+    if before_records != after_records:
+        mismatches = sum(1 for before, after in zip(before_records, after_records) if before != after)
+        sys.exit(f'{mismatches} messages extracted differently')
+
+    print(f'{len(messages)} messages')
+    print(f'before: {before_rate:10.0f} messages/sec')
+    print(f'after:  {after_rate:10.0f} messages/sec ({after_rate / before_rate:.2f}x)')
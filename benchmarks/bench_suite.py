@@ -0,0 +1,258 @@
+# Ingest and dashboard benchmark on synthetic logs from generate_log.py.
+#
+#   python benchmarks/bench_suite.py [--messages 10000 100000] [--output results.json]
+#   python benchmarks/bench_suite.py --compare before.json after.json
+#
+# For each size a log is generated in a temporary directory and imported by
+# dnd-stats ingest --quiet in a subprocess, from an empty database. The suite reports the
+# ingest messages/sec, the peak RSS of the import, the database and snapshot
+# sizes, and the latency of the queries of each page of the dashboard. The
+# results are saved as JSON, by default in benchmarks/results/, and two result
+# files can be compared.
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+from generate_log import write_log, PLAYERS
+from sqlalchemy import text, bindparam
+from dnd_stats.roll_snapshot import snapshot_paths
+from dnd_stats.db import create_read_engine
+from dnd_stats import queries
+from dnd_stats.queries import RollFilter
+from dnd_stats.roll_columns import RollColumns
+from dnd_stats.ingest_version import get_ingest_version
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+# Statements of each page of the dashboard, with their parameters besides the
+# RollFilter, None for the ones without filter. The sidebar ones run on every page.
+PAGE_QUERIES = {
+    'Sidebar': [(queries.PLAYERS_QUERY, None), (queries.GAME_SESSIONS_QUERY, None)],
+    'Critical 1d20 fail': [(queries.CRIT_COUNTS_QUERY, {'face': 1})],
+    'Critical 1d20 success': [(queries.CRIT_COUNTS_QUERY, {'face': 20})],
+    'Critical 1d20 joueurs': [(queries.DICE_COUNTS_QUERY, {})],
+    'Analyse de distribution des dés': [(queries.DICE_COUNTS_QUERY, {})],
+    'Analyse des dégâts': [(queries.DAMAGE_COUNTS_QUERY, {})],
+}
+
+# Same pages from the dice in memory of dnd-stats dashboard --data-source memory
+MEMORY_PAGES = {
+    'Critical 1d20 fail': lambda roll_columns, roll_filter: roll_columns.crit_counts(1, roll_filter),
+    'Critical 1d20 success': lambda roll_columns, roll_filter: roll_columns.crit_counts(20, roll_filter),
+    'Critical 1d20 joueurs': lambda roll_columns, roll_filter: roll_columns.face_matrix(20, roll_filter),
+    'Analyse de distribution des dés': lambda roll_columns, roll_filter: roll_columns.dice_counts(roll_filter),
+}
+
+PLAYER_IDS_QUERY = text('SELECT PLAYER_ID FROM PLAYER WHERE PLAYER_NAME IN :names').bindparams(bindparam('names', expanding=True))
+
+
+# RollFilter of the players of generate_log.py and every game session, as
+# selected in the dashboard
+def selected_filter(connection):
+    player_ids = connection.execute(PLAYER_IDS_QUERY, {'names': list(PLAYERS)}).scalars().all()
+    session_ids = [row[0] for row in queries.game_sessions(connection)] or [0]
+    return RollFilter(tuple(player_ids), min(session_ids), max(session_ids))
+
+
+def run_page(connection, page_queries, roll_filter):
+    for statement, params in page_queries:
+        if params is None:
+            connection.execute(statement).fetchall()
+        else:
+            connection.execute(statement, dict(queries.filter_params(roll_filter), **params)).fetchall()
+
+
+# Import the log into directory/ROLL20_DB.db, returns the elapsed seconds and
+# the peak RSS of the import in MB (None where os.wait4 doesn't exist)
+def run_ingest(directory, log_path):
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'dnd_stats', 'ingest', log_path, '--quiet'],
+        cwd=directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    if hasattr(os, 'wait4'):
+        # The rusage of the import and of its extraction processes
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss = rusage.ru_maxrss / 1024 if sys.platform != 'darwin' else rusage.ru_maxrss / 1024 ** 2
+    else:
+        process.wait()
+        peak_rss = None
+    elapsed = time.perf_counter() - start_time
+    errors = process.stderr.read().decode(errors='replace')
+    process.stderr.close()
+    if process.returncode != 0:
+        sys.exit(f'dnd-stats ingest failed:\n{errors}')
+    return elapsed, peak_rss
+
+
+# Median and best latency in ms of the queries of each page, from a new
+# engine so that nothing is cached by the dashboard
+def page_latencies(database_file, repeat):
+    engine = create_read_engine('sqlite:///' + database_file)
+    latencies = {}
+    with engine.connect() as connection:
+        roll_filter = selected_filter(connection)
+        for page, page_queries in PAGE_QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                run_page(connection, page_queries, roll_filter)
+                timings.append((time.perf_counter() - start_time) * 1000)
+            latencies[page] = {'median_ms': round(statistics.median(timings), 3), 'min_ms': round(min(timings), 3)}
+    engine.dispose()
+    return latencies
+
+
+# Load time and size of the dice in memory, and the latency in ms of the
+# pages computed from them
+def memory_snapshot(database_file, repeat):
+    engine = create_read_engine('sqlite:///' + database_file)
+    roll_columns = RollColumns()
+    with engine.connect() as connection:
+        roll_filter = selected_filter(connection)
+        start_time = time.perf_counter()
+        roll_columns.refresh(connection, get_ingest_version(connection))
+        load_seconds = time.perf_counter() - start_time
+    engine.dispose()
+
+    latencies = {}
+    for page, compute in MEMORY_PAGES.items():
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            compute(roll_columns, roll_filter)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        latencies[page] = {'median_ms': round(statistics.median(timings), 3), 'min_ms': round(min(timings), 3)}
+    return {
+        'dice': len(roll_columns),
+        'load_seconds': round(load_seconds, 3),
+        'size_mb': round(roll_columns.nbytes() / 1e6, 3),
+        'page_latency': latencies,
+    }
+
+
+def file_size_mb(path):
+    return round(os.path.getsize(path) / 1e6, 3) if os.path.exists(path) else None
+
+
+def run_size(messages, seed, repeat):
+    with tempfile.TemporaryDirectory(prefix='dnd-bench-') as directory:
+        log_path = os.path.join(directory, 'log.html')
+        with open(log_path, 'w', encoding='utf-8') as output:
+            write_log(output, messages, seed)
+
+        ingest_seconds, peak_rss = run_ingest(directory, log_path)
+
+        database_file = os.path.join(directory, 'ROLL20_DB.db')
+        rolls_path, dice_path = snapshot_paths(database_file)
+        with sqlite3.connect(database_file) as connection:
+            rows = {
+                table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('DICE_ROLLS', 'ROLL_DIE', 'REJECTED', 'MESSAGE_HTML')
+            }
+        return {
+            'messages': messages,
+            'log_size_mb': file_size_mb(log_path),
+            'ingest_seconds': round(ingest_seconds, 3),
+            'messages_per_second': round(messages / ingest_seconds, 1),
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+            'db_size_mb': file_size_mb(database_file),
+            'snapshot_size_mb': {'rolls': file_size_mb(rolls_path), 'dice': file_size_mb(dice_path)},
+            'rows': rows,
+            'page_latency': page_latencies(database_file, repeat),
+            'memory_snapshot': memory_snapshot(database_file, repeat),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_run(run):
+    print(f"{run['messages']} messages ({run['log_size_mb']} MB): {run['messages_per_second']} messages/sec, "
+          f"peak RSS {run['peak_rss_mb']} MB, database {run['db_size_mb']} MB")
+    for page, latency in run['page_latency'].items():
+        print(f"    {page:32} {latency['median_ms']:9.3f} ms")
+    memory = run.get('memory_snapshot')
+    if memory:
+        print(f"  {memory['dice']} dice in memory: {memory['size_mb']} MB, loaded in {memory['load_seconds']}s")
+        for page, latency in memory['page_latency'].items():
+            print(f"    {page:32} {latency['median_ms']:9.3f} ms")
+
+
+# Ratio after / before of the values of the sizes found in both result files
+def compare(before_file, after_file):
+    with open(before_file) as file:
+        before = {run['messages']: run for run in json.load(file)['runs']}
+    with open(after_file) as file:
+        after = {run['messages']: run for run in json.load(file)['runs']}
+
+    def line(name, old, new):
+        if old is None or new is None:
+            return
+        ratio = f'{new / old:6.2f}x' if old else '     -'
+        print(f'    {name:38} {old:12} -> {new:12}  {ratio}')
+
+    for messages in sorted(before.keys() & after.keys()):
+        old, new = before[messages], after[messages]
+        print(f'{messages} messages')
+        for key in ('messages_per_second', 'ingest_seconds', 'peak_rss_mb', 'db_size_mb'):
+            line(key, old[key], new[key])
+        for page, latency in old['page_latency'].items():
+            if page in new['page_latency']:
+                line(page, latency['median_ms'], new['page_latency'][page]['median_ms'])
+        if 'memory_snapshot' in old and 'memory_snapshot' in new:
+            for key in ('load_seconds', 'size_mb'):
+                line('memory ' + key, old['memory_snapshot'][key], new['memory_snapshot'][key])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest and dashboard benchmark on synthetic Roll20 logs')
+    parser.add_argument('--messages', type=int, nargs='+', default=[10_000, 100_000], help='sizes of the generated logs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20, help='runs of the queries of each page')
+    parser.add_argument('--output', help='result file, benchmarks/results/<date>-<commit>.json by default')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    arguments = parser.parse_args()
+
+    if arguments.compare:
+        compare(*arguments.compare)
+        sys.exit()
+
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'runs': [],
+    }
+    for messages in arguments.messages:
+        run = run_size(messages, arguments.seed, arguments.repeat)
+        print_run(run)
+        results['runs'].append(run)
+
+    output = arguments.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'nocommit'}.json")
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results saved to {output}')
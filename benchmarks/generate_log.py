@@ -0,0 +1,152 @@
+# Synthetic Roll20 chat export for the benchmarks, with the same structure as a
+# real log: game sessions a week apart, a dated timestamp on the first message
+# of a session then time-only ones, rollresult messages between the general
+# ones, and a mix of the roll templates the import handles or rejects.
+#
+#   python benchmarks/generate_log.py messages [output.html] [seed]
+#
+# The file is written one message at a time, 10M messages are fine. The same
+# seed always gives the same file.
+import html
+import random
+import sys
+from datetime import datetime, timedelta
+
+PLAYERS = ["Gleditschia", "Oskar", "Kirgi", "Miron", "Netari", "Kukaccar"]
+SKILLS = [("Acrobatics", "DEX"), ("Perception", "WIS"), ("Athletics", "STR"), ("Arcana", "INT"), ("Stealth", "DEX")]
+WEAPONS = [("Longsword  of  doom ", 8, 4), ("Shortbow", 6, 3), ("Dagger", 4, 3), ("Greataxe", 12, 5)]
+SPELLS = [("Fireball", 8, 8, 0), ("Healing Word", 1, 4, 3), ("Magic Missile", 3, 4, 3)]
+
+# Share of the general messages per template
+TEMPLATE_WEIGHTS = {
+    'attack': 30,          # atkdmg: attack d20 with advantage, damage roll
+    'skill': 35,           # simple: d20 + modifier with a [label]
+    'damage': 10,          # dmg: damage only, no d20
+    'initiative': 5,       # npc: [INIT] roll without a character name
+    'basic': 10,           # /r command, basicdiceroll without a template
+    'chat': 10,            # plain text, no character name
+}
+
+# Messages per game session and seconds between two messages
+SESSION_MESSAGES = 800
+MESSAGE_INTERVAL = 20
+# A general message out of ROLLRESULT_EVERY is followed by a rollresult message
+ROLLRESULT_EVERY = 7
+# A general message out of TIMESTAMP_EVERY has a timestamp
+TIMESTAMP_EVERY = 3
+
+HEADER = '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Chat Log</title></head><body><div id="textchat"><div class="content">\n'
+FOOTER = '</div></div></body></html>\n'
+
+
+class LogGenerator:
+    def __init__(self, seed=1, start=datetime(2024, 4, 5, 20, 0)):
+        self.random = random.Random(seed)
+        self.start = start
+        self.message_id = 0
+
+    # Inline roll of count dice, the faces of keep_highest dice are kept
+    def inline_roll(self, count, sides, modifier, label=None, keep_highest=None):
+        faces = [self.random.randint(1, sides) for _ in range(count)]
+        kept = sorted(faces, reverse=True)[:keep_highest] if keep_highest else faces
+        spans = '+'.join(
+            '<span class="basicdiceroll{}">{}</span>'.format(
+                ' critfail' if face == 1 else ' critsuccess' if face == sides else '', face)
+            for face in faces
+        )
+        expression = f'{count}d{sides}' + (f'kh{keep_highest}' if keep_highest else '')
+        label = f'[{label}]' if label else ''
+        title = f'Rolling {expression}+{modifier}{label} = ({spans})+{modifier}'
+        total = sum(kept) + modifier
+        return f'<span class="inlinerollresult showtip tipsy-n-right" title="{html.escape(title)}">{total}</span>'
+
+    def attack(self, player):
+        weapon, damage_sides, damage_modifier = self.random.choice(WEAPONS)
+        return (
+            '<div class="sheet-rolltemplate-atkdmg"><div class="sheet-container">'
+            f'<div class="sheet-result"><span>{self.inline_roll(2, 20, 5, keep_highest=1)}</span></div>'
+            f'<div class="sheet-label"><span><a href="~{player}|attack">{weapon}</a></span></div>'
+            f'<div class="sheet-damage"><span>{self.inline_roll(1, damage_sides, damage_modifier)}</span></div>'
+            f'<div class="sheet-charname"><span>{player}</span></div></div></div>'
+        )
+
+    def skill(self, player):
+        skill, ability = self.random.choice(SKILLS)
+        return (
+            '<div class="sheet-rolltemplate-simple"><div class="sheet-container">'
+            f'<div class="sheet-result"><div class="sheet-solo"><span>{self.inline_roll(1, 20, self.random.randint(0, 7), ability)}</span></div></div>'
+            f'<div class="sheet-label"><span>{skill}</span></div>'
+            f'<div class="sheet-charname"><span>{player}</span></div></div></div>'
+        )
+
+    def damage(self, player):
+        spell, count, sides, modifier = self.random.choice(SPELLS)
+        return (
+            '<div class="sheet-rolltemplate-dmg"><div class="sheet-container">'
+            f'<div class="sheet-label"><span><a href="~{player}|spell">{spell}</a></span></div>'
+            f'<div class="sheet-damage"><span>{self.inline_roll(count, sides, modifier)}</span></div>'
+            f'<div class="sheet-charname"><span>{player}</span></div></div></div>'
+        )
+
+    def initiative(self, player):
+        return (
+            '<div class="sheet-rolltemplate-npc"><div class="sheet-label"><span>Initiative</span></div>'
+            f'<span>{self.inline_roll(1, 20, 2, "INIT")}</span></div>'
+        )
+
+    def basic(self, player):
+        face = self.random.randint(1, 20)
+        return (
+            '<div class="formula">rolling 1d20+3</div><div class="clear"></div>'
+            '<div class="formula formattedformula"><div class="dicegrouping">('
+            f'<div class="diceroll d20"><div class="dicon"><div class="didroll">{face}</div></div></div>'
+            f')</div>+3</div><div class="rolled">{face + 3}</div>'
+        )
+
+    def chat(self, player):
+        return self.random.choice(["On y va ?", "Je regarde derrière la porte.", "Attendez-moi !", "Qui a la corde ?"])
+
+    # Roll20 timestamp, dated on the first message of a session
+    def timestamp(self, message_time, dated):
+        time_of_day = message_time.strftime('%I:%M%p').lstrip('0')
+        text = f'{message_time:%B %d, %Y} {time_of_day}' if dated else time_of_day
+        return f'<span class="tstamp" aria-hidden="true">{text}</span>'
+
+    # HTML lines of the messages, one general message per index
+    def iter_messages(self, count):
+        templates = [getattr(self, name) for name in TEMPLATE_WEIGHTS]
+        weights = list(TEMPLATE_WEIGHTS.values())
+        for index in range(count):
+            session, position = divmod(index, SESSION_MESSAGES)
+            message_time = self.start + timedelta(weeks=session, seconds=position * MESSAGE_INTERVAL)
+            self.message_id += 1
+
+            player = self.random.choice(PLAYERS)
+            template = self.random.choices(templates, weights)[0]
+            tstamp = self.timestamp(message_time, position == 0) if position == 0 or index % TIMESTAMP_EVERY == 0 else ''
+            yield (
+                f'<div class="message general" data-messageid="-N{self.message_id:09d}">'
+                f'<div class="spacer"></div>{tstamp}<span class="by">{player}:</span>{template(player)}</div>\n'
+            )
+            if index % ROLLRESULT_EVERY == 0:
+                yield (
+                    f'<div class="message rollresult player--X" data-messageid="-R{self.message_id:09d}">'
+                    '<span class="by">GM:</span><div class="formula">/gr 1d20</div></div>\n'
+                )
+
+
+def write_log(output, messages, seed=1):
+    generator = LogGenerator(seed)
+    output.write(HEADER)
+    output.writelines(generator.iter_messages(messages))
+    output.write(FOOTER)
+
+
+if __name__ == '__main__':
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    if len(sys.argv) > 2 and sys.argv[2] != '-':
+        with open(sys.argv[2], 'w', encoding='utf-8') as output:
+            write_log(output, messages, seed)
+    else:
+        write_log(sys.stdout, messages, seed)
@@ -0,0 +1,6 @@
+# Dice statistics of Roll20 chat logs. The modules import sqlalchemy, lxml,
+# numpy or pyarrow, so nothing is imported here: the CLI only loads the
+# modules of the command it runs.
+
+# Database of the import and of the dashboard when no --db is given
+DATABASE_URL = 'sqlite:///ROLL20_DB.db'
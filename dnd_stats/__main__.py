@@ -0,0 +1,4 @@
+# python -m dnd_stats, same as the dnd-stats command
+from dnd_stats.cli import main
+
+main()
@@ -0,0 +1,232 @@
+import argparse
+import os
+import sys
+from dnd_stats import DATABASE_URL
+
+# dnd-stats command line. Only argparse is imported up front, each command
+# imports the modules it needs so that --help and the small commands start
+# without loading lxml, pandas or pyarrow.
+
+DASHBOARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py')
+
+
+def ingest(arguments):
+    import cProfile
+    import functools
+    import pstats
+    from datetime import timedelta
+    from dnd_stats.ingest import LogImporter
+
+    importer = LogImporter(
+        arguments.db,
+        streaming=not arguments.in_memory,
+        batch_size=arguments.batch_size,
+        full_rebuild=arguments.full_rebuild,
+        workers=arguments.workers,
+        chunk_size=arguments.chunk_size,
+        session_gap=timedelta(hours=arguments.session_gap),
+        export_snapshot=not arguments.no_snapshot,
+        quiet=arguments.quiet,
+        progress_interval=arguments.progress_interval,
+    )
+    if arguments.watch:
+        run = functools.partial(importer.watch, arguments.files, arguments.interval)
+    else:
+        run = functools.partial(importer.run, arguments.files)
+
+    if arguments.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        profiler.dump_stats(arguments.profile)
+        print(f'Profile written to {arguments.profile}, the slowest functions:')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    else:
+        run()
+
+
+# Print what the import extracts from each message, without a database
+def extract(arguments):
+    from dnd_stats.roll20_log import iter_general_messages, message_extractor
+
+    for file_path in arguments.files:
+        for message in iter_general_messages(file_path):
+            record = message_extractor.extract(message)
+            if record.reject_reason:
+                if arguments.rejected:
+                    print('Rejected: ' + record.reject_reason)
+                continue
+
+            print('-------------------')
+            print('character_name: ' + record.character_name)
+            print(f'nat_rolls: {record.nat_roll_value}')
+            print(f'dice_type: {record.dice_type}')
+            if record.modifier:
+                print(f'modifier: {record.modifier}')
+            print(f'total_roll_value: {record.total_roll_value}')
+            if record.action_name:
+                print('action_name: ' + record.action_name)
+
+
+# Upgrade the database and check the dashboard queries use the indexes
+def migrate(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.migrations import upgrade, check_query_plans
+
+    engine = create_write_engine(arguments.db)
+    upgrade(engine)
+    with engine.connect() as connection:
+        full_scans = check_query_plans(connection)
+    if full_scans:
+        sys.exit('Queries without index:\n' + '\n'.join(full_scans))
+    print('All the checked queries use an index')
+
+
+# Consistency check of ROLL_HISTOGRAM against ROLL_DIE and of DAMAGE_HISTOGRAM
+# against INLINE_ROLL, then rebuild them from scratch
+def histogram(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.roll_histogram import check_histogram, check_damage_histogram, rebuild_histogram
+    from dnd_stats.ingest_version import bump_ingest_version
+
+    engine = create_write_engine(arguments.db)
+    with engine.begin() as connection:
+        differences = check_histogram(connection)
+        for (session_id, player_id, sides, face, kept), stored, expected in differences:
+            print(f'SESSION_ID={session_id} PLAYER_ID={player_id} d{sides} face={face} kept={kept}: {stored} stored, {expected} in ROLL_DIE')
+        print(f'{len(differences)} histogram rows differ from ROLL_DIE')
+        damage_differences = check_damage_histogram(connection)
+        for key, stored, expected in damage_differences:
+            print(f'{key}: {stored} stored, {expected} in INLINE_ROLL')
+        print(f'{len(damage_differences)} damage histogram rows differ from INLINE_ROLL')
+        if arguments.check:
+            return
+
+        rebuild_histogram(connection)
+        bump_ingest_version(connection)
+        print('ROLL_HISTOGRAM and DAMAGE_HISTOGRAM rebuilt')
+
+
+# Size report of the stored HTML, then VACUUM to give the freed pages back
+def vacuum(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.message_html import html_size_report, print_size_report, vacuum_database
+
+    engine = create_write_engine(arguments.db)
+    with engine.connect() as connection:
+        print_size_report(html_size_report(connection))
+    vacuum_database(engine)
+
+
+def snapshot(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.roll_snapshot import write_snapshot
+
+    engine = create_write_engine(arguments.db)
+    write_snapshot(engine, engine.url.database)
+
+
+# Rejected messages grouped by reason and template fingerprint
+def rejected(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.migrations import upgrade
+    from dnd_stats.rejected import rejection_summary, print_rejection_summary
+
+    engine = create_write_engine(arguments.db)
+    upgrade(engine)
+    with engine.connect() as connection:
+        print_rejection_summary(rejection_summary(connection), arguments.limit)
+
+
+# Run the rejected messages through the current extractor, after a change of the parsing rules
+def reprocess(arguments):
+    from dnd_stats.db import create_write_engine
+    from dnd_stats.migrations import upgrade
+    from dnd_stats.rejected import reprocess_rejected
+
+    engine = create_write_engine(arguments.db)
+    upgrade(engine)
+    timer = reprocess_rejected(engine, batch_size=arguments.batch_size)
+    counts = timer.counts
+    print(f"{counts['moved']} rejected messages are now rolls, {counts['kept']} are still rejected "
+          f"in {timer.elapsed():.2f}s")
+    if counts['no time']:
+        print(f"{counts['no time']} rejected before their time was stored were left, "
+              f"dnd-stats ingest --full-rebuild parses them again")
+    for line in timer.summary():
+        print(line)
+
+    if counts['moved'] and not arguments.no_snapshot:
+        from dnd_stats.roll_snapshot import write_snapshot
+        write_snapshot(engine, engine.url.database)
+
+
+# streamlit run on the dashboard, the database goes through the environment
+def dashboard(arguments):
+    import subprocess
+
+    environment = dict(os.environ, DND_STATS_DATABASE_URL=arguments.db, DND_STATS_DATA_SOURCE=arguments.data_source)
+    command = [sys.executable, '-m', 'streamlit', 'run', DASHBOARD_FILE] + arguments.streamlit_arguments
+    sys.exit(subprocess.call(command, env=environment))
+
+
+def build_parser():
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument('--db', default=DATABASE_URL, help=f'database URL (default: {DATABASE_URL})')
+
+    parser = argparse.ArgumentParser(prog='dnd-stats', description='Dice statistics of Roll20 chat logs')
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    command = commands.add_parser('ingest', parents=[database], help='import Roll20 chat logs into the database')
+    command.add_argument('files', nargs='+', help='chat exports, in chronological order')
+    command.add_argument('--quiet', action='store_true', help='no per-message output nor SQL echo')
+    command.add_argument('--profile', metavar='FILE', help='write the cProfile stats of the import to FILE')
+    command.add_argument('--full-rebuild', action='store_true', help='wipe the tables and import the logs again')
+    command.add_argument('--workers', type=int, default=1, help='extraction processes (default: 1, in this process)')
+    command.add_argument('--chunk-size', type=int, default=500, help='messages sent at once to an extraction process')
+    command.add_argument('--batch-size', type=int, default=1000, help='rows written per transaction')
+    command.add_argument('--session-gap', type=float, default=3, metavar='HOURS', help='hours between two game sessions')
+    command.add_argument('--in-memory', action='store_true', help='parse each log as a whole instead of streaming it')
+    command.add_argument('--no-snapshot', action='store_true', help="don't write the Arrow snapshot")
+    command.add_argument('--progress-interval', type=float, default=10, metavar='SECONDS', help='seconds between two progress lines')
+    command.add_argument('--watch', action='store_true', help='then import the new messages each time the logs are exported again, until Ctrl+C')
+    command.add_argument('--interval', type=float, default=2, metavar='SECONDS', help='seconds between two polls of --watch (default: 2)')
+    command.set_defaults(run=ingest)
+
+    command = commands.add_parser('extract', help='print what the import extracts from chat logs')
+    command.add_argument('files', nargs='+', help='chat exports')
+    command.add_argument('--rejected', action='store_true', help='print the rejected messages too')
+    command.set_defaults(run=extract)
+
+    command = commands.add_parser('migrate', parents=[database], help='upgrade the database and check the query plans')
+    command.set_defaults(run=migrate)
+
+    command = commands.add_parser('histogram', parents=[database], help='check and rebuild ROLL_HISTOGRAM and DAMAGE_HISTOGRAM')
+    command.add_argument('--check', action='store_true', help='only compare them to ROLL_DIE and INLINE_ROLL')
+    command.set_defaults(run=histogram)
+
+    command = commands.add_parser('vacuum', parents=[database], help='report the HTML size and VACUUM the database')
+    command.set_defaults(run=vacuum)
+
+    command = commands.add_parser('snapshot', parents=[database], help='write the Arrow snapshot of the rolls')
+    command.set_defaults(run=snapshot)
+
+    command = commands.add_parser('rejected', parents=[database], help='group the rejected messages by reason and template')
+    command.add_argument('--limit', type=int, default=20, help='groups printed, most messages first (default: 20)')
+    command.set_defaults(run=rejected)
+
+    command = commands.add_parser('reprocess', parents=[database], help='parse the rejected messages again and move the rolls found')
+    command.add_argument('--batch-size', type=int, default=1000, help='rows read and written per transaction')
+    command.add_argument('--no-snapshot', action='store_true', help="don't write the Arrow snapshot")
+    command.set_defaults(run=reprocess)
+
+    command = commands.add_parser('dashboard', parents=[database], help='run the streamlit dashboard')
+    command.add_argument('--data-source', choices=['sqlite', 'arrow', 'memory'], default='sqlite',
+                         help='read the dice from ROLL_HISTOGRAM, the Arrow snapshot or a copy in memory (default: sqlite)')
+    command.add_argument('streamlit_arguments', nargs=argparse.REMAINDER, help='arguments of streamlit run')
+    command.set_defaults(run=dashboard)
+    return parser
+
+
+def main(argv=None):
+    arguments = build_parser().parse_args(argv)
+    arguments.run(arguments)
@@ -0,0 +1,697 @@
+import streamlit as st
+import pandas as pd
+from sqlalchemy import make_url
+from sqlalchemy.orm import sessionmaker
+import altair as alt
+import numpy as np
+import os
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+from dnd_stats.migrations import upgrade
+from dnd_stats.db import create_write_engine, create_read_engine
+from dnd_stats.ingest_version import get_ingest_version
+from dnd_stats.dice_stats import face_count_matrix, fairness, monte_carlo_p_values, monte_carlo_simulations, wilson_interval, sum_deviation
+from dnd_stats.dice_distribution import roll_distribution, distribution_moments, expected_counts
+from dnd_stats.roll_snapshot import snapshot_paths, read_snapshot_table
+from dnd_stats.message_html import load_html
+from dnd_stats import queries
+from dnd_stats.queries import RollFilter
+from dnd_stats.roll_columns import RollColumns
+
+
+# Database of the dashboard, dnd-stats dashboard --db sets it
+DATABASE_URL = os.environ.get('DND_STATS_DATABASE_URL', 'sqlite:///./ROLL20_DB.db')
+
+
+# Streamlit runs this file again on every interaction: the engine and the
+# session maker are created once per server process, and the query results are
+# cached by the load_* functions below
+@st.cache_resource
+def get_session_maker():
+    # Create or upgrade the tables in the database, this also turns WAL on so
+    # the pages keep reading while an import writes
+    engine = create_write_engine(DATABASE_URL)
+    upgrade(engine)
+    engine.dispose()
+
+    # Create a session maker on the read-only connections
+    return sessionmaker(bind=create_read_engine(DATABASE_URL))
+
+Session = get_session_maker()
+
+# The cached results are keyed on the ingest version, a new import changes it
+# and the next rerun queries the database again
+with Session() as session:
+    INGEST_VERSION = get_ingest_version(session)
+
+# Characters selected when the dashboard opens, the sidebar changes the selection
+DEFAULT_CHARACTERS = ["Gleditschia", "Oskar", "Kirgi", "Miron", "Netari", "Kukaccar"]
+
+# Fair dice samples simulated per sample size for the Monte Carlo p-values, dice_stats
+# lowers it for the dice with many sides
+MONTE_CARLO_SIMULATIONS = 200_000
+
+# Damage expressions whose distribution is drawn, the most rolled first
+DAMAGE_DISTRIBUTION_CHARTS = 6
+
+# Damage rolls listed for a weapon in the messages drill-down, the latest first
+DAMAGE_MESSAGES_LIMIT = 50
+
+# Seconds between two reruns with the automatic refresh, to follow the rolls
+# imported by dnd-stats ingest --watch during a game
+LIVE_REFRESH_SECONDS = 5
+
+# Where the pages of the dice read them, dnd-stats dashboard --data-source sets it:
+# 'sqlite': ROLL_HISTOGRAM, one query per page
+# 'arrow': the Arrow snapshot written by the import, memory-mapped and reloaded when it changes
+# 'memory': the RollColumns of the server process, loaded from ROLL_DIE and
+#   completed with the new dice when the ingest version changes
+DATA_SOURCE = os.environ.get('DND_STATS_DATA_SOURCE', 'sqlite')
+_, DICE_SNAPSHOT_PATH = snapshot_paths(make_url(DATABASE_URL).database)
+if DATA_SOURCE == 'arrow' and not os.path.exists(DICE_SNAPSHOT_PATH):
+    st.warning(f"{DICE_SNAPSHOT_PATH} n'existe pas, les données sont lues dans la base")
+    DATA_SOURCE = 'sqlite'
+
+
+# The dice in memory, one copy shared by every session of the server process
+@st.cache_resource
+def get_roll_columns():
+    return RollColumns()
+
+if DATA_SOURCE == 'memory':
+    ROLL_COLUMNS = get_roll_columns()
+    with Session() as session:
+        ROLL_COLUMNS.refresh(session, INGEST_VERSION)
+
+
+# Players of the PLAYER table for the character selection. The selected names
+# are resolved to their PLAYER_ID here, the queries then filter the histograms
+# directly instead of comparing names on the joined PLAYER rows.
+@st.cache_data
+def load_players(ingest_version):
+    with Session() as session:
+        return pd.DataFrame(queries.players(session), columns=['player_id', 'player_name'])
+
+
+# Game sessions found by the import, with their first and last roll
+@st.cache_data
+def load_game_sessions(ingest_version):
+    with Session() as session:
+        columns = ['session_id', 'started_at', 'ended_at', 'roll_count']
+        game_sessions_df = pd.DataFrame(queries.game_sessions(session), columns=columns)
+    game_sessions_df['started_at'] = pd.to_datetime(game_sessions_df['started_at'])
+    game_sessions_df['ended_at'] = pd.to_datetime(game_sessions_df['ended_at'])
+    return game_sessions_df
+
+
+# Number of d20 kept with the given face per player
+@st.cache_data
+def load_crit_counts(face, roll_filter, ingest_version):
+    with Session() as session:
+        columns = ['player_id', 'player_name', 'count']
+        return pd.DataFrame(queries.crit_counts(session, face, roll_filter), columns=columns)
+
+
+# Number of dice rolled per die, face and player in one query, every die
+# rolled counts. The pages of each die size filter it.
+@st.cache_data
+def load_dice_counts_per_player(roll_filter, ingest_version):
+    with Session() as session:
+        columns = ['sides', 'player_id', 'player_name', 'nat_roll_value', 'roll_count']
+        return pd.DataFrame(queries.dice_counts_per_player(session, roll_filter), columns=columns)
+
+
+# Number of damage rolls per player, weapon, expression and total. The snapshot
+# has no inline rolls, this page always reads DAMAGE_HISTOGRAM.
+@st.cache_data
+def load_damage_counts(roll_filter, ingest_version):
+    with Session() as session:
+        columns = ['player_name', 'action_name', 'dice_type', 'modifier', 'total', 'roll_count']
+        return pd.DataFrame(queries.damage_counts(session, roll_filter), columns=columns)
+
+
+# Latest damage rolls of a player and weapon, without their HTML
+@st.cache_data
+def load_damage_messages(player_id, action_name, roll_filter, ingest_version):
+    with Session() as session:
+        columns = ['rolled_at', 'dice_type', 'modifier', 'total', 'html_hash']
+        rows = queries.damage_messages(session, player_id, action_name, roll_filter, DAMAGE_MESSAGES_LIMIT)
+        return pd.DataFrame(rows, columns=columns)
+
+
+# HTML of one message, read and decompressed only when it is opened. A hash
+# always gives the same HTML, the result doesn't depend on the ingest version.
+@st.cache_data
+def load_message_html(html_hash):
+    with Session() as session:
+        return load_html(session, html_hash)
+
+
+# Monte Carlo p-values of each row of a face count matrix, cached with the
+# matrix: showing the page again simulates nothing, whatever the number of players
+@st.cache_data
+def load_monte_carlo_p_values(counts, ingest_version):
+    return monte_carlo_p_values(counts, MONTE_CARLO_SIMULATIONS)
+
+
+# Expected mean and variance of each expression of the damage counts, from
+# its exact distribution. The expressions without one (kh, kl, r, !) get NaN.
+def damage_moments(damage_df):
+    expressions = damage_df[['dice_type', 'modifier']].drop_duplicates()
+    moments = {}
+    for dice_type, modifier in expressions.itertuples(index=False):
+        distribution = roll_distribution(dice_type, int(modifier))
+        moments[dice_type, modifier] = distribution_moments(distribution) if distribution else (np.nan, np.nan)
+    keys = list(zip(damage_df['dice_type'], damage_df['modifier']))
+    return (
+        np.array([moments[key][0] for key in keys], dtype=np.float64),
+        np.array([moments[key][1] for key in keys], dtype=np.float64),
+    )
+
+
+# The dice table of the snapshot, one per snapshot file version
+@st.cache_resource(max_entries=1)
+def load_dice_snapshot(snapshot_version):
+    return read_snapshot_table(DICE_SNAPSHOT_PATH)
+
+
+# Rows of a snapshot table of the selected players and game sessions, the
+# RollFilter of the queries applied with Arrow
+def snapshot_filter_mask(table, roll_filter):
+    return pc.and_(
+        pc.is_in(table['PLAYER_ID'], value_set=pa.array(roll_filter.player_ids, pa.uint32())),
+        pc.and_(
+            pc.greater_equal(table['SESSION_ID'], roll_filter.first_session),
+            pc.less_equal(table['SESSION_ID'], roll_filter.last_session)
+        )
+    )
+
+
+# d20 of the snapshot for the selected players and game sessions
+@st.cache_data
+def load_snapshot_d20(roll_filter, snapshot_version):
+    dice = load_dice_snapshot(snapshot_version)
+    mask = pc.and_(pc.equal(dice['SIDES'], 20), snapshot_filter_mask(dice, roll_filter))
+    return dice.filter(mask).select(['PLAYER_ID', 'PLAYER_NAME', 'FACE', 'KEPT']).to_pandas()
+
+
+# Same as load_crit_counts, from the snapshot
+def snapshot_crit_counts(face):
+    d20_df = load_snapshot_d20(ROLL_FILTER, SNAPSHOT_VERSION)
+    crits = d20_df[(d20_df['FACE'] == face) & d20_df['KEPT']]
+    counts = crits.groupby(['PLAYER_ID', 'PLAYER_NAME'], observed=True).size().reset_index()
+    counts.columns = ['player_id', 'player_name', 'count']
+    return counts
+
+
+# Same as load_dice_counts_per_player, grouped by Arrow on the dice of the snapshot
+@st.cache_data
+def load_snapshot_dice_counts(roll_filter, snapshot_version):
+    dice = load_dice_snapshot(snapshot_version)
+    counts = dice.filter(snapshot_filter_mask(dice, roll_filter)).group_by(['SIDES', 'PLAYER_ID', 'PLAYER_NAME', 'FACE']).aggregate([('FACE', 'count')])
+    counts_df = counts.to_pandas()
+    counts_df['PLAYER_NAME'] = counts_df['PLAYER_NAME'].astype(str)
+    counts_df = counts_df[['SIDES', 'PLAYER_ID', 'PLAYER_NAME', 'FACE', 'FACE_count']]
+    counts_df.columns = ['sides', 'player_id', 'player_name', 'nat_roll_value', 'roll_count']
+    return counts_df.sort_values(['sides', 'player_name', 'nat_roll_value'])
+
+
+# Crit counts and d20 counts per player of the selected rolls, from the
+# data source
+def crit_counts(face):
+    if DATA_SOURCE == 'memory':
+        return pd.DataFrame(ROLL_COLUMNS.crit_counts(face, ROLL_FILTER), columns=['player_id', 'player_name', 'count'])
+    if DATA_SOURCE == 'arrow':
+        return snapshot_crit_counts(face)
+    return load_crit_counts(face, ROLL_FILTER, INGEST_VERSION)
+
+
+def dice_counts_per_player():
+    if DATA_SOURCE == 'memory':
+        columns = ['sides', 'player_id', 'player_name', 'nat_roll_value', 'roll_count']
+        return pd.DataFrame(ROLL_COLUMNS.dice_counts(ROLL_FILTER), columns=columns)
+    if DATA_SOURCE == 'arrow':
+        return load_snapshot_dice_counts(ROLL_FILTER, SNAPSHOT_VERSION)
+    return load_dice_counts_per_player(ROLL_FILTER, INGEST_VERSION)
+
+
+# Sizes of the dice rolled by the selected players
+def dice_sides():
+    return sorted(int(sides) for sides in dice_counts_per_player()['sides'].unique())
+
+
+# Players x faces matrix of the counts of a die, the per-player sections are
+# computed on it for all the players at once
+def die_matrix(sides):
+    if DATA_SOURCE == 'memory':
+        return ROLL_COLUMNS.face_matrix(sides, ROLL_FILTER)
+    counts_df = dice_counts_per_player()
+    counts_df = counts_df[(counts_df['sides'] == sides) & counts_df['nat_roll_value'].between(1, sides)]
+    return face_count_matrix(counts_df['player_name'], counts_df['nat_roll_value'], counts_df['roll_count'], sides)
+
+
+# Sidebar for selecting table and query options
+st.sidebar.title('Query Options')
+selected_table = st.sidebar.selectbox('Select table to query:', ['Analyse de distribution des dés', 'Critical 1d20 fail', 'Critical 1d20 success', 'Critical 1d20 joueurs', 'Analyse des dégâts'])
+
+live_refresh = st.sidebar.toggle('Actualisation automatique', value=False)
+
+# Characters to analyse, among the players of the database
+st.sidebar.markdown("### Personnages filtrés")
+players_df = load_players(INGEST_VERSION)
+player_ids_by_name = dict(zip(players_df['player_name'], players_df['player_id']))
+FILTERED_CHARACTERS = st.sidebar.multiselect(
+    'Personnages', options=list(player_ids_by_name), default=[name for name in DEFAULT_CHARACTERS if name in player_ids_by_name]
+)
+FILTERED_PLAYER_IDS = [int(player_ids_by_name[name]) for name in FILTERED_CHARACTERS]
+
+# Game sessions to analyse, the queries read the histogram rows of these
+# sessions only through its primary key
+st.sidebar.markdown("### Sessions de jeu")
+game_sessions_df = load_game_sessions(INGEST_VERSION)
+session_ids = game_sessions_df['session_id'].tolist()
+session_labels = {
+    row.session_id: f"{row.session_id} - {row.started_at:%d/%m/%Y}" if pd.notna(row.started_at) else f"{row.session_id}"
+    for row in game_sessions_df.itertuples()
+}
+if len(session_ids) > 1:
+    first_session, last_session = st.sidebar.select_slider(
+        'Sessions', options=session_ids, value=(session_ids[0], session_ids[-1]), format_func=session_labels.get
+    )
+elif session_ids:
+    first_session = last_session = session_ids[0]
+else:
+    first_session = last_session = 0
+selected_sessions_df = game_sessions_df[game_sessions_df['session_id'].between(first_session, last_session)]
+if not selected_sessions_df.empty and selected_sessions_df['started_at'].notna().any():
+    st.sidebar.markdown(f"Du {selected_sessions_df['started_at'].min():%d/%m/%Y %H:%M} au {selected_sessions_df['ended_at'].max():%d/%m/%Y %H:%M}")
+
+# Size of the dice in memory and what the last refresh read
+if DATA_SOURCE == 'memory':
+    dice_read, load_seconds, full_reload = ROLL_COLUMNS.last_load
+    st.sidebar.caption(
+        f"{len(ROLL_COLUMNS)} dés en mémoire ({ROLL_COLUMNS.nbytes() / 1e6:.1f} Mo), "
+        f"{dice_read} lus {'en entier ' if full_reload else ''}en {load_seconds:.2f}s"
+    )
+
+# Filter of the queries, the cached results are keyed on it
+ROLL_FILTER = RollFilter(tuple(FILTERED_PLAYER_IDS), int(first_session), int(last_session))
+
+# The snapshot results are keyed on the time the file was written
+SNAPSHOT_VERSION = os.path.getmtime(DICE_SNAPSHOT_PATH) if DATA_SOURCE == 'arrow' else None
+
+# Main content area
+st.title('D&D')
+
+
+
+def crit_1d20_fail_graph():
+    st.header('Critical 1d20 fail')
+
+    # Crit fails of the filtered characters, a d20 kept with a 1
+    dice_rolls_df = crit_counts(1).sort_values(by="count", ascending=False)
+
+    # Display a horizontal bar chart using Streamlit with player names on the x-axis
+    st.altair_chart(alt.Chart(dice_rolls_df).mark_bar().encode(
+        x=alt.X('player_name', sort=None, title="Joueurs"),
+        y=alt.Y('count', title="Nombre de crit fails"),
+    ), use_container_width=True)
+    
+    st.text(f'Nombre total de lancés critical fail : {dice_rolls_df["count"].sum()}')
+    
+    st.divider()
+
+
+def crit_1d20_success_graph():
+    st.header('Critical 1d20 hit')
+    # Crit successes of the filtered characters, a d20 kept with a 20
+    dice_rolls_df = crit_counts(20).sort_values(by="count", ascending=False)
+
+    # Display a horizontal bar chart using Streamlit with player names on the x-axis
+    st.altair_chart(alt.Chart(dice_rolls_df).mark_bar().encode(
+        x=alt.X('player_name', sort=None, title="Joueurs"),
+        y=alt.Y('count', title="Nombre de crit success"),
+    ), use_container_width=True)
+    
+    st.text(f'Nombre total de lancés critical success : {dice_rolls_df["count"].sum()}')
+    
+    st.divider()
+
+
+def crit_1d20_players_graph():
+    st.header('Statistiques pour 1d20')
+    # d20 of the filtered characters per face, every d20 rolled counts
+    player_names, counts = die_matrix(20)
+    faces = np.arange(1, 21)
+
+    # Create individual bar charts for each player, from its row of the matrix
+    for player, player_counts in zip(player_names, counts):
+        st.subheader(f'{player}')
+        
+        chart_data = pd.DataFrame(
+            {
+                "Dice_Roll_Count": player_counts,
+                "Dice_Roll_Value": faces,
+            }
+        )
+
+        st.bar_chart(chart_data, x="Dice_Roll_Value", y="Dice_Roll_Count")
+        st.text(f'Nombre total de lancés : {player_counts.sum()}')
+        
+        st.divider()
+
+
+def dice_distribution_analysis():
+    # Die to analyse, among the ones rolled, the faces and the degrees of
+    # freedom of the tests follow from its number of sides
+    available_sides = dice_sides()
+    if not available_sides:
+        st.info("Aucun dé lancé pour ces joueurs et ces sessions")
+        return
+    sides = st.sidebar.selectbox(
+        'Dé', available_sides, index=available_sides.index(20) if 20 in available_sides else 0, format_func=lambda sides: f'd{sides}'
+    )
+    die = f'd{sides}'
+    faces = np.arange(1, sides + 1)
+
+    st.header(f'Analyse de distribution des lancés de {die}')
+
+    # Get total rolls per value for filtered players, every die of this size rolled counts
+    player_names, counts = die_matrix(sides)
+    total_counts = counts.sum(axis=0, keepdims=True)
+    total_fairness = fairness(total_counts)
+    total_rolls = int(total_fairness.totals[0])
+    expected_per_value = total_fairness.expected[0]  # For a fair die, each value should appear 1/sides of the time
+
+    # Counts, expected counts and ratios with their 95% confidence interval
+    low, high = wilson_interval(total_counts)
+    roll_dist_df = pd.DataFrame({
+        'nat_roll_value': faces,
+        'roll_count': total_counts[0],
+        'expected_count': expected_per_value,
+        'ratio_to_expected': total_fairness.ratios[0],
+        'ratio_low': low[0] * sides,
+        'ratio_high': high[0] * sides,
+    })
+    
+    # Create a combined chart showing actual vs expected distribution
+    st.subheader(f'Distribution des valeurs de {die} (Joueurs filtrés: {", ".join(FILTERED_CHARACTERS)})')
+    
+    # Bar chart of actual counts
+    chart = alt.Chart(roll_dist_df).mark_bar().encode(
+        x=alt.X('nat_roll_value:O', title='Valeur du dé'),
+        y=alt.Y('roll_count:Q', title='Nombre de lancés'),
+        tooltip=['nat_roll_value', 'roll_count', 'ratio_to_expected']
+    ).properties(
+        width=600,
+        height=400
+    )
+    
+    # Line for expected counts
+    expected_line = alt.Chart(roll_dist_df).mark_line(color='red').encode(
+        x='nat_roll_value:O',
+        y='expected_count:Q'
+    )
+    
+    # Display the combined chart
+    st.altair_chart(chart + expected_line, use_container_width=True)
+    
+    # Display ratio chart
+    ratio_chart = alt.Chart(roll_dist_df).mark_bar().encode(
+        x=alt.X('nat_roll_value:O', title='Valeur du dé'),
+        y=alt.Y('ratio_to_expected:Q', title='Ratio (Observé/Attendu)'),
+        color=alt.condition(
+            alt.datum.ratio_to_expected > 1,
+            alt.value('green'),  # The positive color
+            alt.value('red')     # The negative color
+        ),
+        tooltip=['nat_roll_value', 'roll_count', 'ratio_to_expected']
+    ).properties(
+        width=600,
+        height=400
+    )
+    
+    # Add a horizontal line at ratio = 1 (perfect distribution)
+    baseline = alt.Chart(pd.DataFrame({'y': [1]})).mark_rule(color='black', strokeDash=[3, 3]).encode(y='y')
+
+    # 95% confidence interval of the ratio of each face
+    interval_rules = alt.Chart(roll_dist_df).mark_rule(color='black').encode(
+        x='nat_roll_value:O',
+        y='ratio_low:Q',
+        y2='ratio_high:Q'
+    )
+    
+    st.subheader('Ratio des valeurs observées par rapport aux valeurs attendues')
+    st.altair_chart(ratio_chart + interval_rules + baseline, use_container_width=True)
+    
+    # p-values of the chi-square test, from the chi-square distribution and simulated
+    total_monte_carlo = load_monte_carlo_p_values(total_counts, INGEST_VERSION)
+    
+    # Display statistics
+    st.subheader('Statistiques de distribution')
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total des lancés", f"{total_rolls}")
+    with col2:
+        st.metric("Valeur attendue par face", f"{expected_per_value:.1f}")
+    with col3:
+        st.metric("Chi-square", f"{total_fairness.chi_square[0]:.2f}")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("p-value", f"{total_fairness.p_values[0]:.4f}")
+    with col2:
+        st.metric("p-value Monte Carlo", f"{total_monte_carlo[0]:.4f}")
+        
+    # Interpretation of the p-values
+    st.write(f"""
+    **Interprétation:**
+    - La p-value est la probabilité qu'un dé équilibré s'écarte au moins autant de l'attendu (Chi-square au moins aussi grand)
+    - Une p-value inférieure à 0.05 suggère une distribution non aléatoire. Sur beaucoup de joueurs, quelques-uns passeront sous ce seuil par hasard
+    - La p-value Monte Carlo est mesurée sur {monte_carlo_simulations(sides, MONTE_CARLO_SIMULATIONS)} lancés simulés d'un {die} équilibré, elle reste juste pour les petits échantillons
+    - Les traits noirs donnent l'intervalle de confiance à 95% du ratio de chaque face
+    """)
+    
+    # Per-player analysis
+    st.subheader('Analyse par joueur')
+    
+    # Expected counts, ratios, chi-square and p-values of every player in one pass
+    player_fairness = fairness(counts)
+    player_monte_carlo = load_monte_carlo_p_values(counts, INGEST_VERSION)
+    low, high = wilson_interval(counts)
+
+    # Players x faces in long format for the charts, player i is rows sides*i to sides*i + sides - 1
+    player_dist_df = pd.DataFrame({
+        'player_name': np.repeat(player_names, sides),
+        'nat_roll_value': np.tile(faces, len(player_names)),
+        'roll_count': counts.ravel(),
+        'ratio_to_expected': player_fairness.ratios.ravel(),
+        'ratio_low': low.ravel() * sides,
+        'ratio_high': high.ravel() * sides,
+    })
+
+    st.dataframe(pd.DataFrame({
+        'Joueur': player_names,
+        'Total': player_fairness.totals.astype(int),
+        'Chi-square': player_fairness.chi_square.round(2),
+        'p-value': player_fairness.p_values.round(4),
+        'p-value Monte Carlo': player_monte_carlo.round(4),
+    }), hide_index=True)
+    
+    # Display player-specific ratio charts
+    for index, player in enumerate(player_names):
+        player_data = player_dist_df.iloc[index * sides:(index + 1) * sides]
+        
+        st.write(f"**{player}** (Total: {int(player_fairness.totals[index])} lancés)")
+        
+        # Create ratio chart for this player
+        player_ratio_chart = alt.Chart(player_data).mark_bar().encode(
+            x=alt.X('nat_roll_value:O', title='Valeur du dé'),
+            y=alt.Y('ratio_to_expected:Q', title='Ratio (Observé/Attendu)'),
+            color=alt.condition(
+                alt.datum.ratio_to_expected > 1,
+                alt.value('green'),
+                alt.value('red')
+            ),
+            tooltip=['nat_roll_value', 'roll_count', 'ratio_to_expected']
+        ).properties(
+            width=600,
+            height=300
+        )
+        
+        player_interval_rules = alt.Chart(player_data).mark_rule(color='black').encode(
+            x='nat_roll_value:O',
+            y='ratio_low:Q',
+            y2='ratio_high:Q'
+        )
+        
+        # Display the chart with baseline
+        st.altair_chart(player_ratio_chart + player_interval_rules + baseline, use_container_width=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Chi-square", f"{player_fairness.chi_square[index]:.2f}")
+        with col2:
+            st.metric("p-value", f"{player_fairness.p_values[index]:.4f}")
+        with col3:
+            st.metric("p-value Monte Carlo", f"{player_monte_carlo[index]:.4f}")
+        st.divider()
+
+
+def damage_analysis():
+    st.header('Analyse des dégâts')
+
+    # Damage rolls of the filtered characters per total, with the mean and
+    # variance of their expression
+    damage_df = load_damage_counts(ROLL_FILTER, INGEST_VERSION)
+    if damage_df.empty:
+        st.info("Aucun jet de dégâts pour ces joueurs et ces sessions")
+        return
+    mean, variance = damage_moments(damage_df)
+    counts = damage_df['roll_count'].to_numpy(dtype=np.float64)
+    damage_df = damage_df.assign(
+        observed_sum=damage_df['total'] * counts,
+        expected_sum=mean * counts,
+        variance_sum=variance * counts,
+    )
+
+    # Expressions without an exact distribution (kh, kl, r, !) are left out of the comparison
+    compared_df = damage_df[np.isfinite(mean)]
+    skipped = int(damage_df.loc[~np.isfinite(mean), 'roll_count'].sum())
+
+    # Observed and expected damage per player and weapon
+    weapons_df = compared_df.groupby(['player_name', 'action_name'], as_index=False)[
+        ['roll_count', 'observed_sum', 'expected_sum', 'variance_sum']
+    ].sum()
+    z_scores, p_values = sum_deviation(weapons_df['observed_sum'], weapons_df['expected_sum'], weapons_df['variance_sum'])
+    weapons_df = weapons_df.assign(
+        observed_mean=weapons_df['observed_sum'] / weapons_df['roll_count'],
+        expected_mean=weapons_df['expected_sum'] / weapons_df['roll_count'],
+        ratio_to_expected=weapons_df['observed_sum'] / weapons_df['expected_sum'].where(weapons_df['expected_sum'] != 0),
+        z_score=z_scores,
+        p_value=p_values,
+    )
+
+    # Same per player, every weapon together
+    players_df = weapons_df.groupby('player_name', as_index=False)[
+        ['roll_count', 'observed_sum', 'expected_sum', 'variance_sum']
+    ].sum()
+    z_scores, p_values = sum_deviation(players_df['observed_sum'], players_df['expected_sum'], players_df['variance_sum'])
+    players_df = players_df.assign(
+        ratio_to_expected=players_df['observed_sum'] / players_df['expected_sum'].where(players_df['expected_sum'] != 0),
+        z_score=z_scores,
+        p_value=p_values,
+    )
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Jets de dégâts", f"{int(weapons_df['roll_count'].sum())}")
+    with col2:
+        st.metric("Dégâts observés", f"{int(weapons_df['observed_sum'].sum())}")
+    with col3:
+        st.metric("Dégâts attendus", f"{weapons_df['expected_sum'].sum():.0f}")
+    if skipped:
+        st.text(f'{skipped} jets avec des dés gardés, retirés, relancés ou explosifs (kh, kl, r, !) ne sont pas comparés')
+
+    st.subheader('Dégâts observés par rapport aux dégâts attendus, par joueur')
+    ratio_chart = alt.Chart(players_df).mark_bar().encode(
+        x=alt.X('player_name', sort=None, title='Joueurs'),
+        y=alt.Y('ratio_to_expected:Q', title='Ratio (Observé/Attendu)'),
+        color=alt.condition(
+            alt.datum.ratio_to_expected > 1,
+            alt.value('green'),
+            alt.value('red')
+        ),
+        tooltip=['player_name', 'roll_count', 'ratio_to_expected', 'p_value']
+    )
+    baseline = alt.Chart(pd.DataFrame({'y': [1]})).mark_rule(color='black', strokeDash=[3, 3]).encode(y='y')
+    st.altair_chart(ratio_chart + baseline, use_container_width=True)
+
+    st.subheader('Par joueur et par arme')
+    st.dataframe(pd.DataFrame({
+        'Joueur': weapons_df['player_name'],
+        'Arme': weapons_df['action_name'],
+        'Jets': weapons_df['roll_count'].astype(int),
+        'Dégâts moyens': weapons_df['observed_mean'].round(2),
+        'Dégâts attendus': weapons_df['expected_mean'].round(2),
+        'Ratio': weapons_df['ratio_to_expected'].round(3),
+        'Écart (z)': weapons_df['z_score'].round(2),
+        'p-value': weapons_df['p_value'].round(4),
+    }), hide_index=True)
+
+    # Drill-down to the messages of a weapon, every damage roll of the filter included
+    with st.expander("Messages d'une arme"):
+        weapons = damage_df[['player_name', 'action_name']].drop_duplicates().sort_values(['player_name', 'action_name'])
+        player_name, action_name = st.selectbox(
+            'Joueur et arme', list(weapons.itertuples(index=False, name=None)),
+            format_func=lambda weapon: f'{weapon[0]} - {weapon[1] or "sans arme"}'
+        )
+        messages_df = load_damage_messages(int(player_ids_by_name[player_name]), action_name, ROLL_FILTER, INGEST_VERSION)
+        if messages_df.empty:
+            st.info("Aucun message pour cette arme")
+        else:
+            labels = [
+                f"{pd.Timestamp(row.rolled_at):%d/%m/%Y %H:%M} - {row.dice_type}{row.modifier:+d} = {row.total}"
+                if pd.notna(row.rolled_at) else f"{row.dice_type}{row.modifier:+d} = {row.total}"
+                for row in messages_df.itertuples()
+            ]
+            index = st.selectbox('Jet de dégâts', range(len(messages_df)), format_func=labels.__getitem__)
+            html = load_message_html(messages_df['html_hash'].iloc[index])
+            if html is None:
+                st.info("Le HTML de ce message n'est pas enregistré")
+            else:
+                st.code(html, language='html')
+
+    # Observed totals of the most rolled expressions against their exact distribution
+    st.subheader('Distribution des dégâts par expression')
+    expressions_df = compared_df.groupby(['dice_type', 'modifier'], as_index=False)['roll_count'].sum()
+    expressions_df = expressions_df.sort_values('roll_count', ascending=False).head(DAMAGE_DISTRIBUTION_CHARTS)
+    for dice_type, modifier, roll_count in expressions_df.itertuples(index=False):
+        distribution = roll_distribution(dice_type, int(modifier))
+        expression_df = compared_df[(compared_df['dice_type'] == dice_type) & (compared_df['modifier'] == modifier)]
+        observed = expression_df.groupby('total')['roll_count'].sum()
+        minimum = min(distribution.minimum, int(observed.index.min()))
+        maximum = max(distribution.minimum + len(distribution.probabilities) - 1, int(observed.index.max()))
+        totals = np.arange(minimum, maximum + 1)
+        distribution_df = pd.DataFrame({
+            'total': totals,
+            'roll_count': observed.reindex(totals, fill_value=0).to_numpy(),
+            'expected_count': expected_counts(distribution, roll_count, minimum, maximum),
+        })
+
+        expression = f'{dice_type}{modifier:+d}' if modifier else dice_type
+        st.write(f"**{expression}** ({int(roll_count)} jets)")
+        chart = alt.Chart(distribution_df).mark_bar().encode(
+            x=alt.X('total:O', title='Dégâts'),
+            y=alt.Y('roll_count:Q', title='Nombre de jets'),
+            tooltip=['total', 'roll_count', 'expected_count']
+        )
+        expected_line = alt.Chart(distribution_df).mark_line(color='red').encode(
+            x='total:O',
+            y='expected_count:Q'
+        )
+        st.altair_chart(chart + expected_line, use_container_width=True)
+
+    st.write("""
+    **Interprétation:**
+    - Les dégâts attendus viennent de la distribution exacte de chaque expression (convolution des dés)
+    - L'écart z compare la somme des dégâts observés à la somme attendue, en écarts-types
+    - Une p-value inférieure à 0.05 suggère des dégâts anormalement hauts ou bas
+    """)
+
+
+if selected_table == 'Analyse de distribution des dés':
+    dice_distribution_analysis()
+elif selected_table == 'Critical 1d20 fail':
+    crit_1d20_fail_graph()
+elif selected_table == 'Critical 1d20 success':
+    crit_1d20_success_graph()
+elif selected_table == 'Critical 1d20 joueurs':
+    crit_1d20_players_graph()
+elif selected_table == 'Analyse des dégâts':
+    damage_analysis()
+
+# Rerun once the page is shown, the cached results are read again only when
+# the ingest version changed
+if live_refresh:
+    time.sleep(LIVE_REFRESH_SECONDS)
+    st.rerun()
@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, event, make_url
+
+# Connections to ROLL20_DB.db. The database is in WAL mode so that the
+# dashboard keeps reading the last committed rows while an import writes, and
+# a commit of the import doesn't wait for the readers. A connection that
+# still finds a lock (a checkpoint, another import) waits for it instead of
+# failing with "database is locked".
+
+# Seconds a connection waits for a lock
+BUSY_TIMEOUT = 30
+
+# Import and maintenance connections
+WRITE_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    # The WAL is synced at each checkpoint rather than at each commit: a power
+    # loss can lose the last batches, which the next import writes again
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',       # 64 MB
+    'PRAGMA mmap_size = 268435456',     # 256 MB
+    'PRAGMA temp_store = MEMORY',
+]
+
+# Dashboard connections, they never write
+READ_PRAGMAS = [
+    'PRAGMA query_only = ON',
+    'PRAGMA cache_size = -16384',       # 16 MB
+    'PRAGMA mmap_size = 268435456',
+]
+
+# Dashboard connections kept open, streamlit runs each session in its own thread
+READ_POOL_SIZE = 5
+
+
+def sqlite_connect_args(database_url):
+    if make_url(database_url).get_backend_name() != 'sqlite':
+        return {}
+    return {'timeout': BUSY_TIMEOUT}
+
+
+# Run the pragmas on every new SQLite connection of engine
+def set_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+# Engine of the import, the migrations and the maintenance commands
+def create_write_engine(database_url, echo=False):
+    engine = create_engine(database_url, echo=echo, connect_args=sqlite_connect_args(database_url))
+    set_pragmas(engine, WRITE_PRAGMAS)
+    return engine
+
+
+# Pooled read-only engine of the dashboard
+def create_read_engine(database_url, pool_size=READ_POOL_SIZE):
+    engine = create_engine(
+        database_url, pool_size=pool_size, max_overflow=pool_size, pool_pre_ping=True,
+        connect_args=sqlite_connect_args(database_url)
+    )
+    set_pragmas(engine, READ_PRAGMAS)
+    return engine
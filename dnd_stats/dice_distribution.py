@@ -0,0 +1,84 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# Exact distribution of the total of a roll expression such as 2d6+3 or
+# 1d8+1d6-1: the distribution of one die is uniform, the sum of several dice
+# is their convolution. The distributions are cached per expression, a page
+# with millions of damage rolls computes each distinct expression once.
+
+# probabilities[i] is P(total = minimum + i). The arrays are shared by the
+# cache and read-only.
+Distribution = namedtuple('Distribution', ['minimum', 'probabilities'])
+
+# Dice groups of a DICE_TYPE text, as written by dice_expr.dice_type_of(),
+# with their sign: '1d8-1d4' is '1d8' and '-1d4'. The only options allowed
+# after NdM are the ones that leave the total alone: sorting (s, sa, sd) and
+# the critical ranges (cs>19, cf<2).
+DICE_GROUP_RE = re.compile(r'([+-]?)(\d+)d(\d+)(?:s[ad]?|c[sf][<>=]?\d*)*$')
+GROUP_SPLIT_RE = re.compile(r'(?=[+-])')
+
+
+# Distribution of the sum of count dice with the given sides, by convolving
+# the distribution of half of the dice with itself
+@lru_cache(maxsize=256)
+def dice_sum_distribution(count, sides):
+    if count == 1:
+        probabilities = np.full(sides, 1 / sides)
+    else:
+        half = dice_sum_distribution(count // 2, sides)
+        probabilities = np.convolve(half.probabilities, half.probabilities)
+        if count % 2:
+            probabilities = np.convolve(probabilities, dice_sum_distribution(1, sides).probabilities)
+    probabilities.setflags(write=False)
+    return Distribution(count, probabilities)
+
+
+# Distribution of the total of a roll, dice_type being its DICE_TYPE text
+# ('2d6', '1d8+1d6', '1d8-1d4') and modifier the constant added. None for the
+# expressions with dice dropped or kept (2d20kh1), rerolled (2d6r<2, 2d6ro<2)
+# or exploding (1d6!): their total isn't a plain sum of dice.
+# A subtracted group adds the mirror of its distribution, from -count*sides.
+@lru_cache(maxsize=1024)
+def roll_distribution(dice_type, modifier=0):
+    minimum = modifier
+    probabilities = np.ones(1)
+    for group in GROUP_SPLIT_RE.split(dice_type):
+        if not group:
+            continue
+        match = DICE_GROUP_RE.match(group)
+        if match is None:
+            return None
+        count, sides = int(match.group(2)), int(match.group(3))
+        if count < 1 or sides < 1:
+            return None
+        dice = dice_sum_distribution(count, sides)
+        if match.group(1) == '-':
+            minimum -= count * sides
+            probabilities = np.convolve(probabilities, dice.probabilities[::-1])
+        else:
+            minimum += dice.minimum
+            probabilities = np.convolve(probabilities, dice.probabilities)
+    probabilities.setflags(write=False)
+    return Distribution(minimum, probabilities)
+
+
+# Mean and variance of a distribution
+def distribution_moments(distribution):
+    values = np.arange(distribution.minimum, distribution.minimum + len(distribution.probabilities))
+    mean = float(values @ distribution.probabilities)
+    variance = float((values - mean) ** 2 @ distribution.probabilities)
+    return mean, variance
+
+
+# Expected count of each total from minimum to maximum for count rolls
+def expected_counts(distribution, count, minimum, maximum):
+    expected = np.zeros(maximum - minimum + 1)
+    start = distribution.minimum - minimum
+    end = start + len(distribution.probabilities)
+    # Totals of the distribution outside of [minimum, maximum] are left out
+    low, high = max(start, 0), min(end, len(expected))
+    if low < high:
+        expected[low:high] = distribution.probabilities[low - start:high - start] * count
+    return expected
@@ -0,0 +1,236 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# One group of dice of a roll expression (2d20kh1, 1d8, 2d6r<2...) with the
+# faces rolled for it. kept has one bool per face, False for the dice dropped
+# by kh/kl/dh/dl and the ones replaced by a reroll. extra has one bool per
+# face, True for the dice rolled beyond the count of the group by a reroll
+# (the faces replaced) or an explosion (the dice added). sign is -1 for a
+# subtracted group (the 1d4 of 1d8-1d4). options is the text of the modifiers
+# after NdM, '' without any.
+DiceGroup = namedtuple('DiceGroup', ['count', 'sides', 'keep', 'faces', 'kept', 'sign', 'options', 'extra'])
+
+# A parsed inline roll: its dice groups, the sum of the constant +/- terms and
+# the [labels] of the expression. unsupported is the first operator of the
+# expression that isn't a sum ('*' in (1d20+2)*2), None for a plain sum: the
+# modifier and the DICE_TYPE don't describe such a roll.
+ParsedRoll = namedtuple('ParsedRoll', ['groups', 'modifier', 'labels', 'unsupported'])
+
+# One die of a roll, the rows of the ROLL_DIE table. The face is the one
+# rolled, sign tells whether it was subtracted from the total and extra
+# whether it was rolled by a reroll or explode option.
+Die = namedtuple('Die', ['sides', 'face', 'kept', 'sign', 'extra'], defaults=(1, False))
+
+
+# Tokens of an inline roll title, e.g.
+# 'Rolling 2d20kh1+5[DEX] = (<span class="basicdiceroll">12</span>+<span class="basicdiceroll dropped">3</span>)+5'
+# The part before ' = ' is the expression, the part after holds the results
+TOKEN_RE = re.compile(r'''
+    (?P<EQUALS>\s=\s)
+  | (?P<DICE>(?P<count>\d*)d(?P<sides>\d+)(?P<options>[a-z<>=!0-9]*))
+  | (?P<LABEL>\[(?P<label>[^\]]*)\])
+  | (?P<SPAN><span\sclass="(?P<css_class>[^"]*)">)
+  | (?P<END_SPAN></span>)
+  | (?P<NUMBER>\d+)
+  | (?P<SIGN>[+-])
+  | (?P<OPEN>\()
+  | (?P<CLOSE>\))
+  | (?P<OPERATOR>[*/%^])
+''', re.VERBOSE)
+
+# Modifiers of a dice group in order (kh3, sd, r<2, !, cs>19...), the longest
+# name first so that the d of sd isn't read as a drop
+OPTION_RE = re.compile(r'(kh|kl|dh|dl|sd|sa|ro|cs|cf|!!|!p|k|d|r|s|!|[<>=])(\d*)')
+KEEP_OPTIONS = {'kh', 'kl', 'dh', 'dl', 'k', 'd'}
+REROLL_OPTIONS = {'r', 'ro'}
+EXPLODE_OPTIONS = {'!', '!!', '!p'}
+COMPARISONS = {'<', '>', '='}
+
+# Modifiers of a dice group: keep is (option, number) of its keep or drop,
+# reroll (option, comparison, number) of its reroll, explode is True for an
+# exploding group and text the modifiers as written in DICE_TYPE
+GroupOptions = namedtuple('GroupOptions', ['keep', 'reroll', 'explode', 'text'])
+
+
+# GroupOptions of the options text after NdM. The keep and drop options are
+# written with their number (k is k1), the other ones as they were rolled.
+def group_options(options):
+    keep = None
+    reroll = None
+    explode = False
+    text = ''
+    matches = list(OPTION_RE.finditer(options))
+    for index, match in enumerate(matches):
+        option, number = match.groups()
+        if option in KEEP_OPTIONS:
+            number = number or '1'
+            if keep is None:
+                keep = (option, int(number))
+        elif option in REROLL_OPTIONS and reroll is None:
+            # r3 rerolls the 3s, r<2 the faces up to 2, r alone the 1s
+            following = matches[index + 1].groups() if index + 1 < len(matches) else None
+            if number:
+                reroll = (option, '=', int(number))
+            elif following and following[0] in COMPARISONS and following[1]:
+                reroll = (option, following[0], int(following[1]))
+            else:
+                reroll = (option, '=', 1)
+        elif option in EXPLODE_OPTIONS:
+            explode = True
+        text += option + number
+    return GroupOptions(keep, reroll, explode, text)
+
+
+# True when a face meets the comparison of a reroll, < and > include the number as in Roll20
+def matches_comparison(face, comparison, number):
+    if comparison == '<':
+        return face <= number
+    if comparison == '>':
+        return face >= number
+    return face == number
+
+
+# Parse a Roll20 inline roll title in a single pass over its tokens.
+# Returns None when the title has no dice or no rolled faces. The title holds
+# the faces rolled, yet the same ones come back often (1d20+5 has 20 titles),
+# and the ParsedRoll is made of tuples so it can be shared.
+@lru_cache(maxsize=4096)
+def parse_roll_title(title):
+    groups = []         # [count, sides, options, faces, dropped, sign] while parsing
+    labels = []
+    modifier = 0
+    sign = 1
+    signs = [1]         # sign of each parenthesis of the expression, -(1d4+1) subtracts both
+    in_results = False
+    depth = 0
+    span_class = None
+    group_index = 0     # dice group the faces in the results belong to
+    group_has_faces = False
+    unsupported = None
+
+    for match in TOKEN_RE.finditer(title):
+        kind = match.lastgroup
+        if not in_results:
+            if kind == 'EQUALS':
+                in_results = True
+            elif kind == 'DICE':
+                options = group_options(match.group('options'))
+                groups.append([int(match.group('count') or 1), int(match.group('sides')), options, [], [], signs[-1] * sign])
+                sign = 1
+            elif kind == 'LABEL':
+                labels.append(match.group('label'))
+            elif kind == 'SIGN':
+                sign = -1 if match.group() == '-' else 1
+            elif kind == 'NUMBER':
+                modifier += signs[-1] * sign * int(match.group())
+                sign = 1
+            elif kind == 'OPEN':
+                signs.append(signs[-1] * sign)
+                sign = 1
+            elif kind == 'CLOSE':
+                if len(signs) > 1:
+                    signs.pop()
+            elif kind == 'OPERATOR' and unsupported is None:
+                unsupported = match.group()
+            continue
+
+        # Results: the faces of each dice group are between parentheses
+        if kind == 'OPEN':
+            depth += 1
+        elif kind == 'CLOSE':
+            depth = max(depth - 1, 0)
+            if group_has_faces:
+                group_index += 1
+                group_has_faces = False
+        elif kind == 'SPAN':
+            span_class = match.group('css_class')
+        elif kind == 'END_SPAN':
+            span_class = None
+        elif kind == 'NUMBER' and depth > 0 and group_index < len(groups):
+            group = groups[group_index]
+            group[3].append(int(match.group()))
+            group[4].append(span_class is not None and 'dropped' in span_class.split())
+            group_has_faces = True
+
+    if not groups or not any(group[3] for group in groups):
+        return None
+
+    parsed_groups = []
+    for count, sides, options, faces, dropped, group_sign in groups:
+        extra = extra_faces(faces, count, options)
+        rerolled = extra if options.reroll else [False] * len(faces)
+        parsed_groups.append(DiceGroup(
+            count, sides, options.keep, tuple(faces), tuple(keep_faces(faces, dropped, options.keep, rerolled)),
+            group_sign, options.text, tuple(extra)
+        ))
+    return ParsedRoll(tuple(parsed_groups), modifier, tuple(labels), unsupported)
+
+
+# Faces rolled beyond the count of the group. A reroll lists the face replaced
+# before the new one: the first faces meeting its comparison are the replaced
+# ones, as many as there are faces beyond the count. An explosion adds its dice
+# after the ones of the count.
+def extra_faces(faces, count, options):
+    extra_count = max(len(faces) - count, 0)
+    extra = [False] * len(faces)
+    if options.reroll and extra_count:
+        _, comparison, number = options.reroll
+        for index, face in enumerate(faces):
+            if extra_count and matches_comparison(face, comparison, number):
+                extra[index] = True
+                extra_count -= 1
+    elif options.explode and extra_count:
+        extra[len(faces) - extra_count:] = [True] * extra_count
+    return extra
+
+
+# Kept dice: the export marks the dropped ones, otherwise the faces replaced by
+# a reroll are dropped and kh/kl/dh/dl applies to the others
+def keep_faces(faces, dropped, keep, rerolled):
+    if any(dropped):
+        return [not is_dropped for is_dropped in dropped]
+
+    candidates = [index for index in range(len(faces)) if not rerolled[index]]
+    if keep is None:
+        kept_indexes = set(candidates)
+    else:
+        option, number = keep
+        order = sorted(candidates, key=lambda index: faces[index], reverse=option in ('kh', 'k', 'dl', 'd'))
+        if option in ('kh', 'kl', 'k'):
+            kept_indexes = set(order[:number])
+        else:
+            kept_indexes = set(order[:max(len(candidates) - number, 0)])
+    return [index in kept_indexes for index in range(len(faces))]
+
+
+# DICE_TYPE text of a parsed roll with the options of its groups, e.g. '1d20',
+# '2d20kh1', '1d8+1d6', '1d8-1d4' or '2d6r<2'
+def dice_type_of(parsed_roll):
+    dice_type = ''
+    for group in parsed_roll.groups:
+        if group.sign < 0:
+            dice_type += '-'
+        elif dice_type:
+            dice_type += '+'
+        dice_type += f'{group.count}d{group.sides}{group.options}'
+    return dice_type
+
+
+# Every die of the roll, in the order of the expression, with the sign of its group
+def dice_of(parsed_roll):
+    return tuple(
+        Die(group.sides, face, kept, group.sign, extra)
+        for group in parsed_roll.groups
+        for face, kept, extra in zip(group.faces, group.kept, group.extra)
+    )
+
+
+# Natural value of the roll: the face of its only kept die, None when several
+# dice count (2d6, 1d8+1d6...)
+def natural_roll_of(parsed_roll):
+    kept = [die for die in dice_of(parsed_roll) if die.kept]
+    if len(kept) == 1:
+        return kept[0]
+    return None
@@ -0,0 +1,135 @@
+import math
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# Fairness statistics of dice, computed for every player at once on a
+# players x faces matrix of counts.
+
+# One row per player: totals[i] dice, expected[i] per face, ratios[i, face - 1]
+# observed / expected, chi_square[i] and its p_values[i] for a fair die
+Fairness = namedtuple('Fairness', ['totals', 'expected', 'ratios', 'chi_square', 'p_values'])
+
+
+# Players x faces matrix from (player, face, count) rows, faces go from 1 to sides.
+# Returns the sorted player names and the matrix, a face never rolled counts 0.
+def face_count_matrix(players, faces, counts, sides):
+    names, player_index = np.unique(np.asarray(players), return_inverse=True)
+    matrix = np.zeros((len(names), sides), dtype=np.int64)
+    np.add.at(matrix, (player_index, np.asarray(faces, dtype=np.int64) - 1), np.asarray(counts, dtype=np.int64))
+    return names, matrix
+
+
+# Chi-square test of each row of the matrix against a fair die
+def fairness(matrix):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    sides = matrix.shape[1]
+    totals = matrix.sum(axis=1)
+    expected = totals / sides
+    # Players without dice get 0 everywhere instead of a division by zero
+    ratios = matrix / np.where(expected > 0, expected, 1.0)[:, None]
+    chi_square = chi_square_statistic(matrix)
+    p_values = np.where(totals > 0, chi2_sf(chi_square, sides - 1), 1.0)
+    return Fairness(totals, expected, ratios, chi_square, p_values)
+
+
+# Chi-square statistic of each row of counts against a fair die, 0 for an
+# empty row. The simulated and observed statistics both come from here so that
+# equal counts give exactly equal statistics.
+def chi_square_statistic(matrix):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    expected = matrix.sum(axis=1, keepdims=True) / matrix.shape[1]
+    return ((matrix - expected) ** 2 / np.where(expected > 0, expected, 1.0)).sum(axis=1)
+
+
+# P(X >= x) for X following a chi-square distribution with an integer number of
+# degrees of freedom, from the closed forms of the regularized gamma function
+def chi2_sf(x, degrees_of_freedom):
+    half_x = np.maximum(np.asarray(x, dtype=np.float64), 0) / 2
+
+    if degrees_of_freedom % 2 == 0:
+        # exp(-x/2) * sum of (x/2)^i / i! for 0 <= i < k/2
+        term = np.exp(-half_x)
+        total = term.copy()
+        for i in range(1, degrees_of_freedom // 2):
+            term = term * half_x / i
+            total += term
+    else:
+        # erfc(sqrt(x/2)) + exp(-x/2) * sum of (x/2)^(i - 1/2) / gamma(i + 1/2) for 1 <= i <= (k-1)/2
+        total = np.vectorize(math.erfc, otypes=[np.float64])(np.sqrt(half_x))
+        term = np.exp(-half_x) * np.sqrt(half_x) / math.gamma(1.5)
+        for i in range(1, (degrees_of_freedom + 1) // 2):
+            total += term
+            term = term * half_x / (i + 0.5)
+    return np.minimum(total, 1.0)
+
+
+# Faces drawn at most for the simulated samples of one sample size
+# (simulations x sides): a d20 keeps 200_000 samples, a d100 gets 40_000
+MONTE_CARLO_MAX_DRAWS = 4_000_000
+
+
+# Fair samples simulated per sample size for a die, capped by max_draws so
+# that the cost of a page doesn't grow with the number of sides
+def monte_carlo_simulations(sides, simulations, max_draws=MONTE_CARLO_MAX_DRAWS):
+    return max(1, min(simulations, max_draws // sides))
+
+
+# Chi-square statistics of simulations fair dice samples of sample_size dice,
+# sorted. They are generated chunk_size samples at a time so the memory stays
+# bounded, and cached per (sides, sample_size): the same sample size reuses
+# them on the next page load. The generator is seeded with the key so a
+# p-value doesn't change from one run to the next.
+@lru_cache(maxsize=32)
+def simulated_chi_square(sides, sample_size, simulations, chunk_size=100_000):
+    rng = np.random.default_rng([sides, sample_size])
+    fair = np.full(sides, 1 / sides)
+    statistics = np.empty(simulations)
+    for start in range(0, simulations, chunk_size):
+        size = min(chunk_size, simulations - start)
+        statistics[start:start + size] = chi_square_statistic(rng.multinomial(sample_size, fair, size=size))
+    statistics.sort()
+    statistics.flags.writeable = False
+    return statistics
+
+
+# Monte Carlo p-value of each row of the matrix: the share of fair samples of
+# the same size whose chi-square is at least the observed one. Unlike the
+# chi-square distribution it holds for small samples too. Each distinct row
+# total costs one simulation, about 0.35s for a d20.
+def monte_carlo_p_values(matrix, simulations=1_000_000, max_draws=MONTE_CARLO_MAX_DRAWS):
+    matrix = np.asarray(matrix)
+    sides = matrix.shape[1]
+    simulations = monte_carlo_simulations(sides, simulations, max_draws)
+    totals = matrix.sum(axis=1)
+    chi_square = chi_square_statistic(matrix)
+    p_values = np.ones(len(matrix))
+    for index in np.flatnonzero(totals):
+        statistics = simulated_chi_square(sides, int(totals[index]), simulations)
+        at_least = statistics.size - np.searchsorted(statistics, chi_square[index], side='left')
+        p_values[index] = (at_least + 1) / (statistics.size + 1)
+    return p_values
+
+
+# Wilson score interval of the frequency of each face, per row of the matrix.
+# Returns the lower and upper bounds with the shape of the matrix.
+def wilson_interval(matrix, z=1.96):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    totals = np.maximum(matrix.sum(axis=-1, keepdims=True), 1.0)
+    frequencies = matrix / totals
+    denominator = 1 + z ** 2 / totals
+    centre = (frequencies + z ** 2 / (2 * totals)) / denominator
+    margin = z * np.sqrt(frequencies * (1 - frequencies) / totals + z ** 2 / (4 * totals ** 2)) / denominator
+    return np.clip(centre - margin, 0.0, 1.0), np.clip(centre + margin, 0.0, 1.0)
+
+
+# z-score of observed sums against their expected value and variance, with the
+# two-sided p-value of the normal approximation (the sum of many rolls). Sums
+# without variance get a z-score of 0 and a p-value of 1.
+def sum_deviation(observed, expected, variance):
+    observed = np.asarray(observed, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    variance = np.asarray(variance, dtype=np.float64)
+    z_scores = np.where(variance > 0, (observed - expected) / np.sqrt(np.where(variance > 0, variance, 1.0)), 0.0)
+    p_values = np.vectorize(math.erfc, otypes=[np.float64])(np.abs(z_scores) / math.sqrt(2))
+    return z_scores, p_values
@@ -0,0 +1,310 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from lxml import html, etree
+from dnd_stats.roll20_log import iter_timed_messages, is_general_message, MessageClock, get_message_key, iter_extracted
+from dnd_stats.roll_writer import BatchWriter
+from dnd_stats.player_registry import PlayerRegistry
+from dnd_stats.models import DiceRolls, RollDie, InlineRoll, Rejected, IngestedMessage
+from dnd_stats.migrations import upgrade
+from dnd_stats.db import create_write_engine
+from dnd_stats.ingest_timing import StageTimer, Progress
+from dnd_stats.ingest_version import new_data_generation
+from dnd_stats.log_tail import LogTail
+from dnd_stats import DATABASE_URL
+
+# Number of DICE_ROLLS/REJECTED rows written per transaction
+BATCH_SIZE = 1000
+
+# Number of messages sent at once to an extraction process
+EXTRACT_CHUNK_SIZE = 500
+
+# Rolls more than this apart belong to two game sessions
+SESSION_GAP = timedelta(hours=3)
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 10
+
+# Seconds between two polls of the logs in watch mode
+WATCH_INTERVAL = 2
+
+
+def read_file_into_string(file_path):
+    try:
+        with open(file_path, 'r') as file:
+            file_content = file.read()
+        return file_content
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+        return None
+
+
+# Import of Roll20 chat logs into the database at database_url. Nothing is
+# opened before run(), so the module is imported without side effects (the
+# extraction processes import it again on platforms without fork).
+#   streaming: stream the messages from the file instead of loading the whole log in memory
+#   full_rebuild: wipe the tables and parse the logs again (e.g. after a parsing
+#       change), otherwise only the messages not yet in INGESTED_MESSAGE are imported
+#   workers: number of processes extracting the messages, 1 extracts them in this process
+#   export_snapshot: write the Arrow snapshot of the rolls for the analytics after the import
+#   quiet: no per-message output nor SQL echo, only the progress and the summary
+# run() imports the logs once, watch() follows them as they are exported again.
+class LogImporter:
+    def __init__(self, database_url=DATABASE_URL, streaming=True, batch_size=BATCH_SIZE, full_rebuild=False,
+                 workers=1, chunk_size=EXTRACT_CHUNK_SIZE, session_gap=SESSION_GAP, export_snapshot=True,
+                 quiet=False, progress_interval=PROGRESS_INTERVAL):
+        self.database_url = database_url
+        self.streaming = streaming
+        self.batch_size = batch_size
+        self.full_rebuild = full_rebuild
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.session_gap = session_gap
+        self.export_snapshot = export_snapshot
+        self.quiet = quiet
+        self.progress_interval = progress_interval
+
+        # Time and counts of each stage of the import, printed at the end
+        self.timer = StageTimer()
+        self.reject_reasons = Counter()
+        self.engine = None
+        self.session = None
+        self.ingested_keys = set()
+        self.player_registry = None
+        self.writer = None
+        self.progress = None
+        self.message_count = 0
+
+    # Import the logs in order, the game sessions go on from one log to the next
+    def run(self, file_paths):
+        self.open()
+        try:
+            self.prepare()
+            self.import_messages(
+                message for file_path in file_paths for message in self.general_messages(file_path)
+            )
+            self.finish()
+        finally:
+            self.session.close()
+        self.print_summary()
+
+    # Import the logs, then the messages added to them each time they are
+    # exported again, until Ctrl+C. The new rows of each poll are committed at
+    # once so the dashboard shows them on its next refresh.
+    def watch(self, file_paths, interval=WATCH_INTERVAL):
+        self.open()
+        tails = [LogTail(file_path) for file_path in file_paths]
+        try:
+            self.prepare()
+            print(f"Watching {', '.join(file_paths)} every {interval}s, Ctrl+C to stop", flush=True)
+            try:
+                while True:
+                    for tail in tails:
+                        if tail.ready():
+                            self.import_tail(tail)
+                    with self.timer.stage('waiting'):
+                        time.sleep(interval)
+            except KeyboardInterrupt:
+                print('Watch stopped')
+            self.finish()
+        finally:
+            self.session.close()
+        self.print_summary()
+
+    def import_tail(self, tail):
+        start_time = time.perf_counter()
+        rolls, rejected = self.timer.counts['rolls'], self.timer.counts['rejected']
+        self.import_messages(self.timer.iterate('html parsing', tail.iter_messages()))
+        self.writer.flush()
+        print(f"{tail.file_path}: {self.timer.counts['rolls'] - rolls} new rolls, "
+              f"{self.timer.counts['rejected'] - rejected} rejected in {time.perf_counter() - start_time:.2f}s", flush=True)
+
+    # Create the SQLAlchemy engine, and create or upgrade the tables in the database
+    def open(self):
+        self.engine = create_write_engine(self.database_url, echo=not self.quiet)
+        upgrade(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    # The general messages of a log and their time
+    def general_messages(self, file_path):
+        if self.streaming:
+            return self.timer.iterate('html parsing', iter_timed_messages(file_path))
+
+        with self.timer.stage('html parsing'):
+            html_content = read_file_into_string(file_path)
+            if not html_content:
+                print("Failed to read file content.")
+                return []
+
+            # Parse the HTML content
+            tree = html.fromstring(html_content)
+
+            # Every message goes through the clock, the timestamps are not only on the general ones
+            clock = MessageClock()
+            general_messages = []
+            for message in tree.xpath('//div[contains(@class, "message")]'):
+                message_time = clock.update(message)
+                if is_general_message(message):
+                    general_messages.append((message, message_time))
+        return general_messages
+
+    def delete_db_rows(self):
+        # Define the SQL truncate queries for each table
+        truncate_dice_rolls_query = text('DELETE FROM DICE_ROLLS')
+        truncate_roll_die_query = text('DELETE FROM ROLL_DIE')
+        truncate_histogram_query = text('DELETE FROM ROLL_HISTOGRAM')
+        truncate_inline_roll_query = text('DELETE FROM INLINE_ROLL')
+        truncate_damage_histogram_query = text('DELETE FROM DAMAGE_HISTOGRAM')
+        truncate_message_html_query = text('DELETE FROM MESSAGE_HTML')
+        truncate_player_query = text('DELETE FROM PLAYER')
+        truncate_rejected_query = text('DELETE FROM REJECTED')
+        truncate_ingested_query = text('DELETE FROM INGESTED_MESSAGE')
+
+        # Execute the truncate queries using the session
+        self.session.execute(truncate_roll_die_query)
+        self.session.execute(truncate_histogram_query)
+        self.session.execute(truncate_inline_roll_query)
+        self.session.execute(truncate_damage_histogram_query)
+        self.session.execute(truncate_dice_rolls_query)
+        self.session.execute(truncate_player_query)
+        self.session.execute(truncate_rejected_query)
+        self.session.execute(truncate_message_html_query)
+        self.session.execute(truncate_ingested_query)
+        new_data_generation(self.session)
+
+    # Keys of the messages imported by previous runs
+    def load_ingested_keys(self):
+        return set(self.session.execute(text('SELECT MESSAGE_KEY FROM INGESTED_MESSAGE')).scalars())
+
+    # Keys of the messages to skip, the players and the writer of the rows
+    def prepare(self):
+        session = self.session
+        ingested_keys = set() if self.full_rebuild else self.load_ingested_keys()
+        if not ingested_keys and session.execute(text('SELECT 1 FROM DICE_ROLLS UNION ALL SELECT 1 FROM REJECTED LIMIT 1')).first():
+            # Rows imported before INGESTED_MESSAGE existed can't be matched to messages
+            print('Existing rows without message keys, doing a full rebuild')
+        elif ingested_keys and not session.execute(text('SELECT 1 FROM ROLL_DIE LIMIT 1')).first():
+            # Rolls imported before ROLL_DIE existed have to be parsed again
+            print('Existing rolls without dice, doing a full rebuild')
+            ingested_keys = set()
+        elif ingested_keys and session.execute(text('SELECT 1 FROM DICE_ROLLS WHERE SESSION_ID IS NULL LIMIT 1')).first():
+            # Rolls imported before timestamps were read have no time nor game session
+            print('Existing rolls without game sessions, doing a full rebuild')
+            ingested_keys = set()
+        elif ingested_keys and session.execute(text('SELECT 1 FROM DICE_ROLLS LIMIT 1')).first() and not session.execute(text('SELECT 1 FROM INLINE_ROLL LIMIT 1')).first():
+            # Rolls imported before INLINE_ROLL existed only have their first inline roll
+            print('Existing rolls without inline rolls, doing a full rebuild')
+            ingested_keys = set()
+        if not ingested_keys:
+            self.delete_db_rows()
+        self.ingested_keys = ingested_keys
+
+        # Players are loaded once, new ones are inserted with each batch of rolls
+        self.player_registry = PlayerRegistry(session)
+        self.writer = BatchWriter(session, DiceRolls.__table__, RollDie.__table__, InlineRoll.__table__, Rejected.__table__, IngestedMessage.__table__, self.player_registry, batch_size=self.batch_size, session_gap=self.session_gap, timer=self.timer)
+        self.progress = Progress(self.timer, self.progress_interval)
+        self.message_count = 0
+
+    # Serialize the general messages not imported yet, the HTML is stored with
+    # the row and is what the extraction processes parse
+    def new_messages(self, general_messages):
+        timer = self.timer
+        key_stage = timer.stage('message keys')
+        serialization_stage = timer.stage('serialization')
+        for message, message_time in general_messages:
+            # Skip the messages imported by a previous run
+            with key_stage:
+                message_key = get_message_key(message)
+            if message_key in self.ingested_keys:
+                timer.count('skipped')
+                continue
+            self.ingested_keys.add(message_key)
+            with serialization_stage:
+                full_message = etree.tostring(message, encoding='unicode', method='html')
+            yield message_key, message_time, full_message, message
+
+    # Extract the (message, time) of general_messages and queue their rows
+    def import_messages(self, general_messages):
+        timer = self.timer
+        player_registry = self.player_registry
+        writer = self.writer
+        players_stage = timer.stage('players')
+        printing_stage = timer.stage('printing')
+
+        try:
+            extracted = iter_extracted(self.new_messages(general_messages), workers=self.workers, chunk_size=self.chunk_size, timer=timer)
+            for message_key, message_time, full_message, record in extracted:
+                self.message_count += 1
+                self.progress.update(self.message_count)
+                if not self.quiet:
+                    with printing_stage:
+                        print('-------------------')
+                        if record.character_name:
+                            print('character_name: ' + record.character_name)
+                if record.character_name:
+                    # New players get their PLAYER_ID when the next batch is written
+                    with players_stage:
+                        player_registry.register(record.character_name)
+
+                if record.reject_reason:
+                    timer.count('rejected')
+                    self.reject_reasons[record.reject_reason] += 1
+                    writer.add_rejected(message_key, full_message, REASON=record.reject_reason, ROLLED_AT=message_time)
+                    continue
+
+                timer.count('rolls')
+                if not self.quiet:
+                    with printing_stage:
+                        print(f'nat_rolls: {record.nat_roll_value}')
+                        print('dice: ' + ' '.join(f'd{die.sides}:{die.face}' for die in record.dice))
+                        print(f'dice_type: {record.dice_type}')
+                        print(f'modifier: {record.modifier}')
+                        print(f'total_roll_value: {record.total_roll_value}')
+                        print('action_name: ' + record.action_name)
+                        print(f'rolled_at: {message_time}')
+
+                # Queue the new DICE_ROLLS row and its dice, they are inserted with the next batch
+                writer.add_dice_roll(
+                    message_key,
+                    record.character_name,
+                    record.dice,
+                    full_message,
+                    message_time,
+                    record.inline_rolls,
+                    NAT_ROLL_VALUE=record.nat_roll_value,
+                    TOTAL_ROLL_VALUE=record.total_roll_value,
+                    ACTION_TYPE=None,
+                    ACTION_NAME=record.action_name,
+                    DICE_TYPE=record.dice_type,
+                    MODIFIER=record.modifier,
+                    IS_CRITICAL_FAIL=int(record.is_critical_fail),
+                    IS_CRITICAL_HIT=int(record.is_critical_hit)
+                )
+
+        except etree.XPathEvalError as e:
+            print("XPath Error:", e)  # Print the error message for debugging
+
+    def finish(self):
+        # Write the last partial batch
+        self.writer.close()
+        print(f"{self.timer.counts['skipped']} messages already imported were skipped")
+
+        if self.export_snapshot:
+            # pyarrow is only imported when the snapshot is written
+            from dnd_stats.roll_snapshot import write_snapshot
+            with self.timer.stage('snapshot'):
+                write_snapshot(self.engine, self.engine.url.database)
+
+    # Time of each stage with the accepted and rejected counts
+    def print_summary(self):
+        timer = self.timer
+        elapsed = timer.elapsed()
+        imported = timer.counts['rolls'] + timer.counts['rejected']
+        print(f"Imported {imported} messages in {elapsed:.2f}s ({imported / elapsed:.0f} messages/sec): "
+              f"{timer.counts['rolls']} rolls, {timer.counts['rejected']} rejected, {timer.counts['skipped']} skipped")
+        for line in timer.summary():
+            print(line)
+        for reason, count in self.reject_reasons.most_common():
+            print(f'    rejected {count:7}  {reason}')
@@ -0,0 +1,88 @@
+import time
+from collections import Counter
+
+
+# Time spent in each stage of the import and counters of what it did. A stage
+# is timed with 'with timer.stage(name):', the stages must not be nested so
+# that their times add up; the time outside of every stage is reported as
+# 'other'. The Stage objects are reused so timing a stage per message stays
+# cheap.
+class StageTimer:
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counts = Counter()
+        self.stages = {}
+        self.start_time = time.perf_counter()
+
+    def stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(self, name)
+        return stage
+
+    def add(self, name, seconds):
+        self.seconds[name] += seconds
+        self.calls[name] += 1
+
+    # Items of iterable, the time taken to produce each one counts in the stage
+    def iterate(self, name, iterable):
+        iterator = iter(iterable)
+        stage = self.stage(name)
+        while True:
+            with stage:
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def count(self, name, increment=1):
+        self.counts[name] += increment
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    # Lines of the time of each stage, slowest first
+    def summary(self):
+        total = self.elapsed()
+        stages = self.seconds.most_common()
+        stages.append(('other', max(total - sum(self.seconds.values()), 0.0)))
+        lines = []
+        for name, seconds in stages:
+            share = seconds / total * 100 if total > 0 else 0.0
+            calls = f'{self.calls[name]} calls' if name in self.calls else ''
+            lines.append(f'    {name:22} {seconds:9.3f}s {share:5.1f}%  {calls}')
+        return lines
+
+
+class Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+# Print a progress line with the throughput and the counts of timer at most
+# every interval seconds
+class Progress:
+    def __init__(self, timer, interval=10.0):
+        self.timer = timer
+        self.interval = interval
+        self.start_time = time.perf_counter()
+        self.next_time = self.start_time + interval
+
+    def update(self, messages):
+        now = time.perf_counter()
+        if now < self.next_time:
+            return
+        self.next_time = now + self.interval
+        elapsed = now - self.start_time
+        counts = ', '.join(f'{count} {name}' for name, count in self.timer.counts.items())
+        print(f'{messages} messages in {elapsed:.0f}s ({messages / elapsed:.0f} messages/sec): {counts}', flush=True)
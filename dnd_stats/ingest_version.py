@@ -0,0 +1,36 @@
+import uuid
+from sqlalchemy import text
+
+# INGEST_VERSION in the METADATA table changes every time imported data is
+# committed. The dashboard keys its cached query results on it, so they are
+# computed again after an import and reused until the next one.
+# DATA_GENERATION changes only when the imported rows are deleted (a full
+# rebuild, or the first import in a new database): the dice the dashboard
+# keeps in memory are then loaded again instead of completed with the new ones.
+
+
+def get_ingest_version(connection):
+    version = connection.execute(text("SELECT VALUE FROM METADATA WHERE KEY = 'INGEST_VERSION'")).scalar()
+    return int(version or 0)
+
+
+# Call in the transaction that changes the data
+def bump_ingest_version(connection):
+    connection.execute(text('''
+        INSERT INTO METADATA (KEY, VALUE) VALUES ('INGEST_VERSION', 1)
+        ON CONFLICT (KEY) DO UPDATE SET VALUE = VALUE + 1
+    '''))
+
+
+# None for a database imported before DATA_GENERATION existed
+def get_data_generation(connection):
+    return connection.execute(text("SELECT VALUE FROM METADATA WHERE KEY = 'DATA_GENERATION'")).scalar()
+
+
+# Call in the transaction that deletes the imported rows. A random id rather
+# than a counter so that a database created again doesn't reuse a generation.
+def new_data_generation(connection):
+    connection.execute(text('''
+        INSERT INTO METADATA (KEY, VALUE) VALUES ('DATA_GENERATION', :generation)
+        ON CONFLICT (KEY) DO UPDATE SET VALUE = excluded.VALUE
+    '''), {'generation': uuid.uuid4().hex})
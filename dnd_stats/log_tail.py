@@ -0,0 +1,93 @@
+import mmap
+import os
+from dnd_stats.roll20_log import iter_timed_messages, MessageClock
+
+# Follow a chat export that is exported again as the game goes on. Each export
+# rewrites the whole file with the new messages at the end, so instead of
+# parsing it all again the tail is parsed from the last general message seen:
+# its data-messageid is found again in the file and the parser starts at its
+# <div>, with a MessageClock at its time. When it can't be found (no
+# data-messageid, another log) the whole file is parsed and the messages
+# already imported are skipped by their key as usual.
+
+# Start of the document given to the parser before the tail of the log
+TAIL_PREFIX = b'<html><body><div id="textchat"><div class="content">'
+
+
+class LogTail:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # (size, mtime) of the file at the last poll and at the last parse
+        self.polled_stat = None
+        self.parsed_stat = None
+        # Offset where the last parse started, data-messageid and time of the
+        # last general message parsed
+        self.offset = 0
+        self.last_key = None
+        self.last_time = None
+
+    # True when the file changed since the last parse and has been the same
+    # for two polls, so that an export being written is not parsed half way
+    def ready(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False
+        stat = (stat.st_size, stat.st_mtime_ns)
+        settled = stat == self.polled_stat
+        self.polled_stat = stat
+        return settled and stat != self.parsed_stat
+
+    # Offset of the <div> of the last general message parsed, None when it is
+    # not in the file anymore
+    def find_last_message(self, log):
+        if self.last_key is None:
+            return None
+        needle = f'data-messageid="{self.last_key}"'.encode('utf-8')
+        position = log.find(needle, self.offset)
+        if position < 0:
+            position = log.find(needle)
+        if position < 0:
+            return None
+        start = log.rfind(b'<div', 0, position)
+        return start if start >= 0 else None
+
+    # The general messages and their time from the last one parsed on, it is
+    # given again and skipped as already imported
+    def iter_messages(self):
+        self.parsed_stat = self.polled_stat
+        with open(self.file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log:
+                start = self.find_last_message(log)
+                if start is None:
+                    self.offset = 0
+                    source = TailReader(log, 0)
+                    clock = MessageClock()
+                else:
+                    self.offset = start
+                    source = TailReader(log, start, TAIL_PREFIX)
+                    clock = MessageClock(self.last_time)
+
+                for message, message_time in iter_timed_messages(source, clock):
+                    self.last_key = message.get('data-messageid')
+                    self.last_time = message_time
+                    yield message, message_time
+
+
+# File object reading a memory-mapped log from start, after prefix
+class TailReader:
+    def __init__(self, log, start, prefix=b''):
+        self.log = log
+        self.position = start
+        self.prefix = prefix
+
+    def read(self, size=-1):
+        if self.prefix:
+            data, self.prefix = self.prefix, b''
+            return data
+        end = len(self.log) if size is None or size < 0 else min(self.position + size, len(self.log))
+        data = self.log[self.position:end]
+        self.position = end
+        return data
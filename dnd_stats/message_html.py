@@ -0,0 +1,71 @@
+import hashlib
+import os
+import zlib
+from sqlalchemy import text
+
+# The HTML of the messages is kept out of DICE_ROLLS and REJECTED: MESSAGE_HTML
+# holds it once per distinct message, zlib compressed and keyed by the SHA-1 of
+# the HTML, and the rows only reference that hash. SIZE is the length of the
+# uncompressed HTML, for the size report.
+
+HTML_INSERT = text('''
+    INSERT OR IGNORE INTO MESSAGE_HTML (HTML_HASH, SIZE, HTML)
+    VALUES (:HTML_HASH, :SIZE, :HTML)
+''')
+
+
+# MESSAGE_HTML row of a serialized message
+def compress_html(html):
+    data = html.encode('utf-8')
+    return {'HTML_HASH': hashlib.sha1(data).hexdigest(), 'SIZE': len(data), 'HTML': zlib.compress(data)}
+
+
+def decompress_html(blob):
+    return zlib.decompress(blob).decode('utf-8')
+
+
+# Insert MESSAGE_HTML rows, the messages already stored are skipped
+def store_html(session, rows):
+    if rows:
+        session.execute(HTML_INSERT, rows)
+
+
+# Load the HTML of one message, only when someone looks at it
+def load_html(connection, hash_value):
+    blob = connection.execute(
+        text('SELECT HTML FROM MESSAGE_HTML WHERE HTML_HASH = :hash'), {'hash': hash_value}
+    ).scalar()
+    return decompress_html(blob) if blob is not None else None
+
+
+# Number of messages, HTML size before and after compression, and the number
+# of rows sharing their HTML with another one
+def html_size_report(connection):
+    messages, raw_size, compressed_size = connection.execute(text(
+        'SELECT COUNT(*), COALESCE(SUM(SIZE), 0), COALESCE(SUM(LENGTH(HTML)), 0) FROM MESSAGE_HTML'
+    )).one()
+    references = connection.execute(text(
+        'SELECT (SELECT COUNT(HTML_HASH) FROM DICE_ROLLS) + (SELECT COUNT(HTML_HASH) FROM REJECTED)'
+    )).scalar()
+    return {
+        'messages': messages,
+        'references': references,
+        'raw_size': raw_size,
+        'compressed_size': compressed_size,
+    }
+
+
+def print_size_report(report):
+    ratio = report['raw_size'] / report['compressed_size'] if report['compressed_size'] else 0
+    print(f"{report['references']} rows reference {report['messages']} distinct messages")
+    print(f"HTML: {report['raw_size'] / 1e6:.1f} MB, {report['compressed_size'] / 1e6:.1f} MB compressed ({ratio:.1f}x)")
+
+
+# VACUUM the SQLite database of engine to give the freed pages back
+def vacuum_database(engine):
+    database_file = engine.url.database
+    size_before = os.path.getsize(database_file)
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text('VACUUM'))
+    size_after = os.path.getsize(database_file)
+    print(f'{database_file}: {size_before / 1e6:.1f} MB before VACUUM, {size_after / 1e6:.1f} MB after')
@@ -0,0 +1,340 @@
+import sqlite3
+from sqlalchemy import inspect, text
+from dnd_stats.message_html import HTML_INSERT, compress_html, html_size_report, print_size_report
+
+# Versioned schema of ROLL20_DB.db. The version of a database is kept in
+# PRAGMA user_version (0 for the databases created before migrations existed,
+# and for new ones) and upgrade() runs the missing migrations in order.
+# The statements only create what is missing, so a migration interrupted half
+# way is simply run again on the next upgrade().
+
+# ALTER TABLE ... DROP COLUMN needs SQLite 3.35, the Python builds with an
+# older one copy the table instead
+DROP_COLUMN_SQLITE_VERSION = (3, 35, 0)
+
+
+# Version 1: the tables created by the scripts with create_all() until now,
+# and the indexes of the dashboard queries
+def migration_1_indexes(connection):
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS PLAYER (
+            PLAYER_ID INTEGER NOT NULL PRIMARY KEY,
+            PLAYER_NAME TEXT,
+            PLAYER_CLASS TEXT
+        )'''))
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS DICE_ROLLS (
+            DICE_ROLL_ID INTEGER NOT NULL PRIMARY KEY,
+            NAT_ROLL_VALUE INTEGER,
+            TOTAL_ROLL_VALUE INTEGER,
+            ACTION_TYPE TEXT,
+            ACTION_NAME TEXT,
+            DICE_TYPE TEXT,
+            MODIFIER INTEGER,
+            IS_CRITICAL_FAIL INTEGER,
+            IS_CRITICAL_HIT INTEGER,
+            FULL_MESSAGE TEXT,
+            PLAYER_ID INTEGER REFERENCES PLAYER (PLAYER_ID)
+        )'''))
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS ROLL_DIE (
+            ROLL_DIE_ID INTEGER NOT NULL PRIMARY KEY,
+            DICE_ROLL_ID INTEGER REFERENCES DICE_ROLLS (DICE_ROLL_ID),
+            PLAYER_ID INTEGER REFERENCES PLAYER (PLAYER_ID),
+            DIE_INDEX INTEGER,
+            SIDES INTEGER,
+            FACE INTEGER,
+            KEPT INTEGER
+        )'''))
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS REJECTED (
+            REJECT_ID INTEGER NOT NULL PRIMARY KEY,
+            REASON TEXT,
+            HTML TEXT
+        )'''))
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS INGESTED_MESSAGE (
+            MESSAGE_KEY TEXT NOT NULL PRIMARY KEY
+        )'''))
+
+    # streamlit.py used to create REJECTED without the REASON column
+    if 'REASON' not in [column['name'] for column in inspect(connection).get_columns('REJECTED')]:
+        connection.execute(text('ALTER TABLE REJECTED ADD COLUMN REASON TEXT'))
+
+    connection.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS UX_PLAYER_NAME ON PLAYER (PLAYER_NAME)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_DICE_ROLLS_TYPE_NAT_PLAYER ON DICE_ROLLS (DICE_TYPE, NAT_ROLL_VALUE, PLAYER_ID)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_DICE_ROLLS_PLAYER ON DICE_ROLLS (PLAYER_ID)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_ROLL_DIE_SIDES_FACE ON ROLL_DIE (SIDES, FACE, KEPT, PLAYER_ID)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_ROLL_DIE_PLAYER_SIDES ON ROLL_DIE (PLAYER_ID, SIDES, FACE)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_ROLL_DIE_DICE_ROLL ON ROLL_DIE (DICE_ROLL_ID)'))
+
+
+# Version 2: ROLL_HISTOGRAM, filled from the dice already imported
+def migration_2_roll_histogram(connection):
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS ROLL_HISTOGRAM (
+            PLAYER_ID INTEGER NOT NULL REFERENCES PLAYER (PLAYER_ID),
+            SIDES INTEGER NOT NULL,
+            FACE INTEGER NOT NULL,
+            KEPT INTEGER NOT NULL,
+            COUNT INTEGER,
+            PRIMARY KEY (PLAYER_ID, SIDES, FACE, KEPT)
+        ) WITHOUT ROWID'''))
+    connection.execute(text('''
+        INSERT INTO ROLL_HISTOGRAM (PLAYER_ID, SIDES, FACE, KEPT, COUNT)
+        SELECT PLAYER_ID, SIDES, FACE, KEPT, COUNT(*) FROM ROLL_DIE
+        GROUP BY PLAYER_ID, SIDES, FACE, KEPT'''))
+
+
+# Version 3: the HTML of the messages moves from DICE_ROLLS.FULL_MESSAGE and
+# REJECTED.HTML to MESSAGE_HTML, compressed and stored once per distinct message
+def migration_3_message_html(connection):
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS MESSAGE_HTML (
+            HTML_HASH TEXT NOT NULL PRIMARY KEY,
+            SIZE INTEGER,
+            HTML BLOB
+        )'''))
+
+    moved_rows = 0
+    dropped_columns = 0
+    for table, id_column, html_column in [('DICE_ROLLS', 'DICE_ROLL_ID', 'FULL_MESSAGE'), ('REJECTED', 'REJECT_ID', 'HTML')]:
+        columns = [column['name'] for column in inspect(connection).get_columns(table)]
+        if 'HTML_HASH' not in columns:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN HTML_HASH TEXT REFERENCES MESSAGE_HTML (HTML_HASH)'))
+        if html_column not in columns:
+            continue
+
+        # Move the HTML 1000 rows at a time
+        last_id = 0
+        while True:
+            rows = connection.execute(text(
+                f'SELECT {id_column}, {html_column} FROM {table} '
+                f'WHERE {id_column} > :last_id AND {html_column} IS NOT NULL ORDER BY {id_column} LIMIT 1000'
+            ), {'last_id': last_id}).fetchall()
+            if not rows:
+                break
+            html_rows = [compress_html(html) for _, html in rows]
+            connection.execute(HTML_INSERT, html_rows)
+            connection.execute(
+                text(f'UPDATE {table} SET HTML_HASH = :HTML_HASH WHERE {id_column} = :id'),
+                [{'HTML_HASH': html_row['HTML_HASH'], 'id': row_id} for (row_id, _), html_row in zip(rows, html_rows)]
+            )
+            last_id = rows[-1][0]
+            moved_rows += len(rows)
+        drop_column(connection, table, html_column)
+        dropped_columns += 1
+
+    # Nothing to report on a new database, nor when the dashboard upgrades one
+    if moved_rows and dropped_columns:
+        print_size_report(html_size_report(connection))
+        print('Run dnd-stats vacuum to VACUUM the database and give the space back')
+
+
+# Version 4: METADATA, with the ingest version the dashboard cache is keyed on
+def migration_4_metadata(connection):
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS METADATA (
+            KEY TEXT NOT NULL PRIMARY KEY,
+            VALUE TEXT
+        )'''))
+    connection.execute(text("INSERT OR IGNORE INTO METADATA (KEY, VALUE) VALUES ('INGEST_VERSION', 0)"))
+
+
+# Version 5: time and game session of the rolls, ROLL_HISTOGRAM per game session.
+# The rolls imported before have neither, diceRolls.py imports them again.
+def migration_5_game_sessions(connection):
+    add_missing_column(connection, 'DICE_ROLLS', 'ROLLED_AT', 'DATETIME')
+    add_missing_column(connection, 'DICE_ROLLS', 'SESSION_ID', 'INTEGER')
+    add_missing_column(connection, 'ROLL_DIE', 'SESSION_ID', 'INTEGER')
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_DICE_ROLLS_ROLLED_AT ON DICE_ROLLS (ROLLED_AT)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_DICE_ROLLS_SESSION ON DICE_ROLLS (SESSION_ID, ROLLED_AT)'))
+
+    if 'SESSION_ID' not in [column['name'] for column in inspect(connection).get_columns('ROLL_HISTOGRAM')]:
+        connection.execute(text('DROP TABLE ROLL_HISTOGRAM'))
+        connection.execute(text('''
+            CREATE TABLE ROLL_HISTOGRAM (
+                SESSION_ID INTEGER NOT NULL,
+                PLAYER_ID INTEGER NOT NULL REFERENCES PLAYER (PLAYER_ID),
+                SIDES INTEGER NOT NULL,
+                FACE INTEGER NOT NULL,
+                KEPT INTEGER NOT NULL,
+                COUNT INTEGER,
+                PRIMARY KEY (SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT)
+            ) WITHOUT ROWID'''))
+        connection.execute(text('''
+            INSERT INTO ROLL_HISTOGRAM (SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT, COUNT)
+            SELECT COALESCE(SESSION_ID, 0), PLAYER_ID, SIDES, FACE, KEPT, COUNT(*) FROM ROLL_DIE
+            GROUP BY COALESCE(SESSION_ID, 0), PLAYER_ID, SIDES, FACE, KEPT'''))
+
+
+# Version 6: time of the rejected messages, so that the ones parsed again by
+# dnd-stats reprocess get a time and a game session. The rows rejected before
+# have none and are kept until the logs are imported again.
+def migration_6_rejected_time(connection):
+    add_missing_column(connection, 'REJECTED', 'ROLLED_AT', 'DATETIME')
+
+
+# Version 7: INLINE_ROLL, every inline roll of the messages and not only the
+# first one, and DAMAGE_HISTOGRAM. The rolls imported before have no inline
+# rolls, the next import parses the logs again.
+def migration_7_inline_rolls(connection):
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS INLINE_ROLL (
+            INLINE_ROLL_ID INTEGER NOT NULL PRIMARY KEY,
+            DICE_ROLL_ID INTEGER REFERENCES DICE_ROLLS (DICE_ROLL_ID),
+            PLAYER_ID INTEGER REFERENCES PLAYER (PLAYER_ID),
+            SESSION_ID INTEGER,
+            ROLL_INDEX INTEGER,
+            DICE_TYPE TEXT,
+            MODIFIER INTEGER,
+            TOTAL INTEGER,
+            IS_DAMAGE INTEGER
+        )'''))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS IX_INLINE_ROLL_DICE_ROLL ON INLINE_ROLL (DICE_ROLL_ID)'))
+    connection.execute(text('''
+        CREATE TABLE IF NOT EXISTS DAMAGE_HISTOGRAM (
+            SESSION_ID INTEGER NOT NULL,
+            PLAYER_ID INTEGER NOT NULL REFERENCES PLAYER (PLAYER_ID),
+            ACTION_NAME TEXT NOT NULL,
+            DICE_TYPE TEXT NOT NULL,
+            MODIFIER INTEGER NOT NULL,
+            TOTAL INTEGER NOT NULL,
+            COUNT INTEGER,
+            PRIMARY KEY (SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL)
+        ) WITHOUT ROWID'''))
+
+
+# Version 8: ROLL_DIE.EXTRA, 1 for the dice rolled by a reroll or explode
+# option. The dice imported before are 0, dnd-stats ingest --full-rebuild
+# parses them again.
+def migration_8_extra_dice(connection):
+    add_missing_column(connection, 'ROLL_DIE', 'EXTRA', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def add_missing_column(connection, table, column, definition):
+    if column not in [existing['name'] for existing in inspect(connection).get_columns(table)]:
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+
+# Drop a column without an index. Before SQLite 3.35 the table is created
+# again without it from PRAGMA table_info (type, NOT NULL, PRIMARY KEY,
+# DEFAULT, REFERENCES), the rows copied and the indexes created again.
+def drop_column(connection, table, column, sqlite_version=sqlite3.sqlite_version_info):
+    if sqlite_version >= DROP_COLUMN_SQLITE_VERSION:
+        connection.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+        return
+
+    columns = [row for row in connection.execute(text(f'PRAGMA table_info({table})')) if row[1] != column]
+    references = {row[3]: (row[2], row[4]) for row in connection.execute(text(f'PRAGMA foreign_key_list({table})'))}
+    indexes = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {'table': table}
+    ).scalars().all()
+
+    definitions = []
+    for _, name, column_type, not_null, default, primary_key in columns:
+        definition = f'{name} {column_type}'
+        if not_null:
+            definition += ' NOT NULL'
+        if primary_key:
+            definition += ' PRIMARY KEY'
+        if default is not None:
+            definition += f' DEFAULT {default}'
+        if name in references:
+            definition += ' REFERENCES {} ({})'.format(*references[name])
+        definitions.append(definition)
+    names = ', '.join(row[1] for row in columns)
+
+    connection.execute(text(f'CREATE TABLE {table}_COPY ({", ".join(definitions)})'))
+    connection.execute(text(f'INSERT INTO {table}_COPY ({names}) SELECT {names} FROM {table}'))
+    connection.execute(text(f'DROP TABLE {table}'))
+    connection.execute(text(f'ALTER TABLE {table}_COPY RENAME TO {table}'))
+    for index_sql in indexes:
+        connection.execute(text(index_sql))
+
+
+# Migration n upgrades a database from version n - 1 to version n
+MIGRATIONS = [
+    migration_1_indexes,
+    migration_2_roll_histogram,
+    migration_3_message_html,
+    migration_4_metadata,
+    migration_5_game_sessions,
+    migration_6_rejected_time,
+    migration_7_inline_rolls,
+    migration_8_extra_dice,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection):
+    return connection.execute(text('PRAGMA user_version')).scalar()
+
+
+# Bring the database to SCHEMA_VERSION, one transaction per migration
+def upgrade(engine):
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f'Database schema version {version} is newer than this code ({SCHEMA_VERSION})')
+
+    for version in range(version + 1, SCHEMA_VERSION + 1):
+        with engine.begin() as connection:
+            MIGRATIONS[version - 1](connection)
+            connection.execute(text(f'PRAGMA user_version = {version}'))
+        print(f'Database upgraded to schema version {version}')
+
+
+# Access paths of the dashboard and of the histogram rebuild, each one must be
+# served by an index
+CHECKED_QUERIES = {
+    'crit count': '''
+        SELECT h.PLAYER_ID, SUM(h.COUNT) FROM ROLL_HISTOGRAM h
+        WHERE h.SIDES = 20 AND h.FACE = 1 AND h.KEPT = 1
+        AND h.SESSION_ID BETWEEN 2 AND 3 AND h.PLAYER_ID IN (1, 2, 3)
+        GROUP BY h.PLAYER_ID''',
+    'face count per player': '''
+        SELECT h.SIDES, p.PLAYER_NAME, h.FACE, SUM(h.COUNT) FROM ROLL_HISTOGRAM h
+        JOIN PLAYER p ON h.PLAYER_ID = p.PLAYER_ID
+        WHERE h.SESSION_ID BETWEEN 2 AND 3 AND h.PLAYER_ID IN (1, 2, 3)
+        GROUP BY h.SIDES, p.PLAYER_NAME, h.FACE''',
+    'game sessions': '''
+        SELECT SESSION_ID, MIN(ROLLED_AT), MAX(ROLLED_AT), COUNT(*) FROM DICE_ROLLS
+        WHERE SESSION_ID IS NOT NULL
+        GROUP BY SESSION_ID''',
+    'rolls of a time range': '''
+        SELECT DICE_ROLL_ID FROM DICE_ROLLS
+        WHERE ROLLED_AT BETWEEN '2024-04-05 00:00:00' AND '2024-04-06 00:00:00' ''',
+    'face count of the dice': '''
+        SELECT r.FACE, COUNT(*) FROM ROLL_DIE r
+        WHERE r.SIDES = 20 AND r.PLAYER_ID IN (1, 2, 3)
+        GROUP BY r.FACE''',
+    'damage per weapon': '''
+        SELECT p.PLAYER_NAME, h.ACTION_NAME, h.DICE_TYPE, h.MODIFIER, h.TOTAL, SUM(h.COUNT) FROM DAMAGE_HISTOGRAM h
+        JOIN PLAYER p ON h.PLAYER_ID = p.PLAYER_ID
+        WHERE h.SESSION_ID BETWEEN 2 AND 3 AND h.PLAYER_ID IN (1, 2, 3)
+        GROUP BY p.PLAYER_NAME, h.ACTION_NAME, h.DICE_TYPE, h.MODIFIER, h.TOTAL''',
+    'damage messages of a weapon': '''
+        SELECT d.ROLLED_AT, i.DICE_TYPE, i.MODIFIER, i.TOTAL, d.HTML_HASH FROM DICE_ROLLS d
+        JOIN INLINE_ROLL i ON i.DICE_ROLL_ID = d.DICE_ROLL_ID
+        WHERE d.PLAYER_ID = 1 AND COALESCE(d.ACTION_NAME, '') = 'Longsword'
+        AND d.SESSION_ID BETWEEN 2 AND 3 AND i.IS_DAMAGE = 1
+        ORDER BY d.DICE_ROLL_ID DESC LIMIT 20''',
+    'player by name': '''
+        SELECT PLAYER_ID FROM PLAYER WHERE PLAYER_NAME = 'Oskar' ''',
+}
+
+
+# EXPLAIN QUERY PLAN of the checked queries, returns the plan lines that read a
+# whole table instead of an index
+def check_query_plans(connection):
+    full_scans = []
+    for name, query in CHECKED_QUERIES.items():
+        for row in connection.execute(text('EXPLAIN QUERY PLAN ' + query)):
+            detail = row[3]
+            print(f'{name}: {detail}')
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                full_scans.append(f'{name}: {detail}')
+    return full_scans
@@ -0,0 +1,154 @@
+from sqlalchemy import Column, Integer, Text, LargeBinary, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship, declarative_base, deferred
+from dnd_stats.message_html import decompress_html
+
+# Create a base class for declarative class definitions
+Base = declarative_base()
+
+# Define the DiceRolls class representing the DICE_ROLLS table
+class DiceRolls(Base):
+    __tablename__ = 'DICE_ROLLS'
+
+    DICE_ROLL_ID = Column(Integer, primary_key=True, autoincrement=True)
+    NAT_ROLL_VALUE = Column(Integer)
+    TOTAL_ROLL_VALUE = Column(Integer)
+    ACTION_TYPE = Column(Text)
+    ACTION_NAME = Column(Text)
+    DICE_TYPE = Column(Text)
+    MODIFIER = Column(Integer)
+    IS_CRITICAL_FAIL = Column(Integer)
+    IS_CRITICAL_HIT = Column(Integer)
+    HTML_HASH = Column(Text, ForeignKey('MESSAGE_HTML.HTML_HASH'))  # The message, in MESSAGE_HTML
+    PLAYER_ID = Column(Integer, ForeignKey('PLAYER.PLAYER_ID'))  # Reference PLAYER_ID
+    ROLLED_AT = Column(DateTime)  # Last timestamp of the log at this message
+    SESSION_ID = Column(Integer)  # Game session, rolls separated by less than the session gap
+
+    # Define a relationship with the Player class
+    player = relationship("Player", back_populates="dice_rolls")
+    dice = relationship("RollDie", back_populates="dice_roll")
+    message = relationship("MessageHtml")
+
+    __table_args__ = (
+        Index('IX_DICE_ROLLS_TYPE_NAT_PLAYER', 'DICE_TYPE', 'NAT_ROLL_VALUE', 'PLAYER_ID'),
+        Index('IX_DICE_ROLLS_PLAYER', 'PLAYER_ID'),
+        Index('IX_DICE_ROLLS_ROLLED_AT', 'ROLLED_AT'),
+        Index('IX_DICE_ROLLS_SESSION', 'SESSION_ID', 'ROLLED_AT'),
+    )
+
+# Define the RollDie class representing the ROLL_DIE table, one row per die of a roll
+class RollDie(Base):
+    __tablename__ = 'ROLL_DIE'
+
+    ROLL_DIE_ID = Column(Integer, primary_key=True, autoincrement=True)
+    DICE_ROLL_ID = Column(Integer, ForeignKey('DICE_ROLLS.DICE_ROLL_ID'))
+    PLAYER_ID = Column(Integer, ForeignKey('PLAYER.PLAYER_ID'))  # Same as the roll, so stats don't need the join
+    DIE_INDEX = Column(Integer)  # Position of the die in the roll expression
+    SIDES = Column(Integer)
+    FACE = Column(Integer)
+    KEPT = Column(Integer)  # 0 for the dice dropped by kh/kl (advantage, disadvantage) and the rerolled ones
+    EXTRA = Column(Integer, nullable=False, default=0)  # 1 for the dice rolled by a reroll (r, ro) or explode (!) option
+    SESSION_ID = Column(Integer)  # Same as the roll, to rebuild ROLL_HISTOGRAM
+
+    dice_roll = relationship("DiceRolls", back_populates="dice")
+
+    # Access paths of the dashboard: crit counts (SIDES, FACE, KEPT) and face
+    # counts of a die for the filtered players, both covered by the index
+    __table_args__ = (
+        Index('IX_ROLL_DIE_SIDES_FACE', 'SIDES', 'FACE', 'KEPT', 'PLAYER_ID'),
+        Index('IX_ROLL_DIE_PLAYER_SIDES', 'PLAYER_ID', 'SIDES', 'FACE'),
+        Index('IX_ROLL_DIE_DICE_ROLL', 'DICE_ROLL_ID'),
+    )
+
+# Define the InlineRoll class representing the INLINE_ROLL table, one row per
+# inline roll of a message: the attack, the damage, ... The DICE_ROLLS row has
+# the values of the first one only.
+class InlineRoll(Base):
+    __tablename__ = 'INLINE_ROLL'
+
+    INLINE_ROLL_ID = Column(Integer, primary_key=True, autoincrement=True)
+    DICE_ROLL_ID = Column(Integer, ForeignKey('DICE_ROLLS.DICE_ROLL_ID'))
+    PLAYER_ID = Column(Integer, ForeignKey('PLAYER.PLAYER_ID'))  # Same as the roll, so stats don't need the join
+    SESSION_ID = Column(Integer)  # Same as the roll
+    ROLL_INDEX = Column(Integer)  # Position of the inline roll in the message
+    DICE_TYPE = Column(Text)  # e.g. '2d6', '1d8+1d6'
+    MODIFIER = Column(Integer)
+    TOTAL = Column(Integer)
+    IS_DAMAGE = Column(Integer)  # 1 in the damage part of the roll template
+
+    __table_args__ = (Index('IX_INLINE_ROLL_DICE_ROLL', 'DICE_ROLL_ID'),)
+
+# Define the DamageHistogram class representing the DAMAGE_HISTOGRAM table, the
+# number of damage rolls per game session, player, weapon, expression and
+# total, maintained at ingest time like ROLL_HISTOGRAM
+class DamageHistogram(Base):
+    __tablename__ = 'DAMAGE_HISTOGRAM'
+
+    SESSION_ID = Column(Integer, primary_key=True)
+    PLAYER_ID = Column(Integer, ForeignKey('PLAYER.PLAYER_ID'), primary_key=True)
+    ACTION_NAME = Column(Text, primary_key=True)  # Weapon or spell of the roll
+    DICE_TYPE = Column(Text, primary_key=True)
+    MODIFIER = Column(Integer, primary_key=True)
+    TOTAL = Column(Integer, primary_key=True)
+    COUNT = Column(Integer)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+# Define the RollHistogram class representing the ROLL_HISTOGRAM table, the
+# number of dice per game session, player, die and face, maintained at ingest time
+class RollHistogram(Base):
+    __tablename__ = 'ROLL_HISTOGRAM'
+
+    SESSION_ID = Column(Integer, primary_key=True)  # 0 for rolls imported without sessions
+    PLAYER_ID = Column(Integer, ForeignKey('PLAYER.PLAYER_ID'), primary_key=True)
+    SIDES = Column(Integer, primary_key=True)
+    FACE = Column(Integer, primary_key=True)
+    KEPT = Column(Integer, primary_key=True)
+    COUNT = Column(Integer)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+# Define the Player class representing the PLAYER table
+class Player(Base):
+    __tablename__ = 'PLAYER'
+
+    PLAYER_ID = Column(Integer, primary_key=True, autoincrement=True)
+    PLAYER_NAME = Column(Text)
+    PLAYER_CLASS = Column(Text)
+    # Add other columns as needed
+    dice_rolls = relationship("DiceRolls", back_populates="player")
+
+    # PlayerRegistry upserts on the player name
+    __table_args__ = (Index('UX_PLAYER_NAME', 'PLAYER_NAME', unique=True),)
+
+# Define the REJECTED table class
+class Rejected(Base):
+    __tablename__ = 'REJECTED'
+    REJECT_ID = Column(Integer, primary_key=True, autoincrement=True)
+    REASON = Column(Text)
+    HTML_HASH = Column(Text, ForeignKey('MESSAGE_HTML.HTML_HASH'))
+    ROLLED_AT = Column(DateTime)  # Time of the message, for dnd-stats reprocess
+
+    message = relationship("MessageHtml")
+
+# Define the MESSAGE_HTML table class, the HTML of each distinct message.
+# The compressed HTML is deferred: it is only read when a message is opened.
+class MessageHtml(Base):
+    __tablename__ = 'MESSAGE_HTML'
+    HTML_HASH = Column(Text, primary_key=True)  # SHA-1 of the HTML
+    SIZE = Column(Integer)  # Length of the uncompressed HTML
+    HTML = deferred(Column(LargeBinary))  # zlib compressed
+
+    @property
+    def html(self):
+        return decompress_html(self.HTML)
+
+# Define the METADATA table class, settings of the database such as INGEST_VERSION
+class Metadata(Base):
+    __tablename__ = 'METADATA'
+    KEY = Column(Text, primary_key=True)
+    VALUE = Column(Text)
+
+# Define the INGESTED_MESSAGE table class, one row per message already imported
+class IngestedMessage(Base):
+    __tablename__ = 'INGESTED_MESSAGE'
+    MESSAGE_KEY = Column(Text, primary_key=True)  # data-messageid or hash of the HTML
@@ -0,0 +1,45 @@
+from sqlalchemy import text, bindparam
+
+
+# Keep the PLAYER table in a dict so that names are resolved without a query.
+# New names are queued and inserted together by flush() with an upsert on the
+# unique PLAYER_NAME index, which also hands back their PLAYER_ID.
+class PlayerRegistry:
+    def __init__(self, session):
+        self.session = session
+        self.ids = {}
+        self.pending = {}
+        self.reload()
+
+    # Load every PLAYER row, to call again if the table was changed elsewhere
+    def reload(self):
+        result = self.session.execute(text('SELECT PLAYER_NAME, PLAYER_ID FROM PLAYER'))
+        self.ids = dict(result.fetchall())
+        self.pending = {}
+
+    def get_id(self, name):
+        return self.ids.get(name)
+
+    # Queue a name seen in the log, its id is assigned on the next flush()
+    def register(self, name):
+        if name not in self.ids:
+            self.pending[name] = None
+
+    # Insert the queued names in the order they were seen and fetch their ids
+    def flush(self):
+        if not self.pending:
+            return
+
+        names = list(self.pending)
+        self.session.execute(
+            text("INSERT INTO PLAYER (PLAYER_NAME, PLAYER_CLASS) VALUES (:name, '') ON CONFLICT (PLAYER_NAME) DO NOTHING"),
+            [{'name': name} for name in names]
+        )
+        result = self.session.execute(
+            text('SELECT PLAYER_NAME, PLAYER_ID FROM PLAYER WHERE PLAYER_NAME IN :names').bindparams(
+                bindparam('names', expanding=True)
+            ),
+            {'names': names}
+        )
+        self.ids.update(result.fetchall())
+        self.pending = {}
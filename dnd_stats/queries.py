@@ -0,0 +1,109 @@
+from collections import namedtuple
+from sqlalchemy import text, bindparam
+
+# The queries of the dashboard pages. Each statement is built once here with
+# bound parameters: the selected players are an expanding IN and the game
+# sessions a range, so a statement keeps the same SQL text whatever the
+# sidebar selection and SQLAlchemy reuses its compiled form from one rerun to
+# the next instead of compiling a new string for every filter.
+
+# Players and game sessions selected in the sidebar, the cached results of the
+# dashboard are keyed on it
+RollFilter = namedtuple('RollFilter', ['player_ids', 'first_session', 'last_session'])
+
+# Filter of the ROLL_HISTOGRAM and DAMAGE_HISTOGRAM queries, h being the
+# histogram. The session range comes first to read the primary key.
+ROLLS_FILTER_SQL = 'h.SESSION_ID BETWEEN :first_session AND :last_session AND h.PLAYER_ID IN :player_ids'
+
+PLAYERS_QUERY = text('SELECT PLAYER_ID, PLAYER_NAME FROM PLAYER ORDER BY PLAYER_NAME')
+
+GAME_SESSIONS_QUERY = text('''
+    SELECT SESSION_ID, MIN(ROLLED_AT), MAX(ROLLED_AT), COUNT(*)
+    FROM DICE_ROLLS
+    WHERE SESSION_ID IS NOT NULL
+    GROUP BY SESSION_ID
+    ORDER BY SESSION_ID
+''')
+
+# Number of d20 kept with the given face per player
+CRIT_COUNTS_QUERY = text(f'''
+    SELECT p.PLAYER_ID, p.PLAYER_NAME, SUM(h.COUNT) AS count
+    FROM ROLL_HISTOGRAM h
+    JOIN PLAYER p ON h.PLAYER_ID = p.PLAYER_ID
+    WHERE h.SIDES = 20 AND h.FACE = :face AND h.KEPT = 1
+    AND {ROLLS_FILTER_SQL}
+    GROUP BY p.PLAYER_ID
+''').bindparams(bindparam('player_ids', expanding=True))
+
+# Number of dice rolled per die, face and player, every die rolled counts
+DICE_COUNTS_QUERY = text(f'''
+    SELECT h.SIDES, p.PLAYER_ID, p.PLAYER_NAME, h.FACE, SUM(h.COUNT) AS roll_count
+    FROM ROLL_HISTOGRAM h
+    JOIN PLAYER p ON h.PLAYER_ID = p.PLAYER_ID
+    WHERE {ROLLS_FILTER_SQL}
+    GROUP BY h.SIDES, p.PLAYER_ID, p.PLAYER_NAME, h.FACE
+    ORDER BY h.SIDES, p.PLAYER_NAME, h.FACE
+''').bindparams(bindparam('player_ids', expanding=True))
+
+# Number of damage rolls per player, weapon, expression and total
+DAMAGE_COUNTS_QUERY = text(f'''
+    SELECT p.PLAYER_NAME, h.ACTION_NAME, h.DICE_TYPE, h.MODIFIER, h.TOTAL, SUM(h.COUNT) AS roll_count
+    FROM DAMAGE_HISTOGRAM h
+    JOIN PLAYER p ON h.PLAYER_ID = p.PLAYER_ID
+    WHERE {ROLLS_FILTER_SQL}
+    GROUP BY p.PLAYER_NAME, h.ACTION_NAME, h.DICE_TYPE, h.MODIFIER, h.TOTAL
+''').bindparams(bindparam('player_ids', expanding=True))
+
+# Latest damage rolls of one player and weapon in the selected game sessions,
+# with the hash of their message for message_html.load_html()
+DAMAGE_MESSAGES_QUERY = text('''
+    SELECT d.ROLLED_AT, i.DICE_TYPE, i.MODIFIER, i.TOTAL, d.HTML_HASH
+    FROM DICE_ROLLS d
+    JOIN INLINE_ROLL i ON i.DICE_ROLL_ID = d.DICE_ROLL_ID
+    WHERE d.PLAYER_ID = :player_id AND COALESCE(d.ACTION_NAME, '') = :action_name
+    AND d.SESSION_ID BETWEEN :first_session AND :last_session
+    AND i.IS_DAMAGE = 1
+    ORDER BY d.DICE_ROLL_ID DESC
+    LIMIT :limit
+''')
+
+
+def filter_params(roll_filter):
+    return {
+        'player_ids': list(roll_filter.player_ids),
+        'first_session': roll_filter.first_session,
+        'last_session': roll_filter.last_session,
+    }
+
+
+# (PLAYER_ID, PLAYER_NAME) of every player, by name
+def players(connection):
+    return connection.execute(PLAYERS_QUERY).fetchall()
+
+
+# (SESSION_ID, first roll, last roll, number of rolls) of every game session
+def game_sessions(connection):
+    return connection.execute(GAME_SESSIONS_QUERY).fetchall()
+
+
+def crit_counts(connection, face, roll_filter):
+    return connection.execute(CRIT_COUNTS_QUERY, dict(filter_params(roll_filter), face=face)).fetchall()
+
+
+def dice_counts_per_player(connection, roll_filter):
+    return connection.execute(DICE_COUNTS_QUERY, filter_params(roll_filter)).fetchall()
+
+
+def damage_counts(connection, roll_filter):
+    return connection.execute(DAMAGE_COUNTS_QUERY, filter_params(roll_filter)).fetchall()
+
+
+
+def damage_messages(connection, player_id, action_name, roll_filter, limit):
+    return connection.execute(DAMAGE_MESSAGES_QUERY, {
+        'player_id': player_id,
+        'action_name': action_name,
+        'first_session': roll_filter.first_session,
+        'last_session': roll_filter.last_session,
+        'limit': limit,
+    }).fetchall()
@@ -0,0 +1,207 @@
+import re
+from collections import Counter, namedtuple
+from datetime import timedelta
+from lxml import html
+from sqlalchemy import text, bindparam, Integer, Text, DateTime, LargeBinary
+from sqlalchemy.orm import sessionmaker
+from dnd_stats.roll20_log import message_extractor, get_message_key
+from dnd_stats.roll_writer import BatchWriter
+from dnd_stats.player_registry import PlayerRegistry
+from dnd_stats.message_html import decompress_html
+from dnd_stats.models import DiceRolls, RollDie, InlineRoll, Rejected, IngestedMessage
+from dnd_stats.ingest_timing import StageTimer
+
+# The messages of REJECTED, after a change of the parsing rules: the summary
+# groups them by reason and template fingerprint to show which gap of the
+# parser loses the most messages, and reprocess_rejected() runs them through
+# the current extractor and moves the ones that now parse into DICE_ROLLS,
+# without importing the logs again.
+
+# REJECTED rows read and extracted at once
+REPROCESS_PAGE_SIZE = 1000
+
+# One page of the rejected rows with a time, by REJECT_ID
+REJECTED_PAGE_QUERY = text('''
+    SELECT r.REJECT_ID, r.REASON, r.ROLLED_AT, r.HTML_HASH, m.HTML
+    FROM REJECTED r
+    JOIN MESSAGE_HTML m ON m.HTML_HASH = r.HTML_HASH
+    WHERE r.REJECT_ID > :last_id AND r.ROLLED_AT IS NOT NULL
+    ORDER BY r.REJECT_ID
+    LIMIT :page_size
+''').columns(REJECT_ID=Integer, REASON=Text, ROLLED_AT=DateTime, HTML_HASH=Text, HTML=LargeBinary)
+
+# Game session of the roll before a time, or after it for a time before every
+# roll. rolled_at is bound as a DateTime to compare with the stored format.
+SESSION_BEFORE_QUERY = text(
+    'SELECT SESSION_ID FROM DICE_ROLLS WHERE ROLLED_AT <= :rolled_at ORDER BY ROLLED_AT DESC LIMIT 1'
+).bindparams(bindparam('rolled_at', type_=DateTime))
+SESSION_AFTER_QUERY = text(
+    'SELECT SESSION_ID FROM DICE_ROLLS WHERE ROLLED_AT >= :rolled_at ORDER BY ROLLED_AT LIMIT 1'
+).bindparams(bindparam('rolled_at', type_=DateTime))
+
+TEMPLATE_RE = re.compile(r'sheet-rolltemplate-(\S+)')
+
+# Classes of a message outside of the roll templates that tell its kind
+MESSAGE_CLASSES = {'formula', 'rolled', 'inlinerollresult', 'basicdiceroll'}
+
+
+# Roll template of a message followed by the classes found in it, e.g.
+# 'npc: inlinerollresult sheet-label'. The classes that depend on the dice
+# (fullcrit, ...) or the layout (spacer, tstamp, ...) are left out so that the
+# messages of a template with the same fields share their fingerprint.
+def template_fingerprint(message):
+    template = None
+    classes = set()
+    for element in message.iterdescendants():
+        for css_class in element.get('class', '').split():
+            match = TEMPLATE_RE.match(css_class)
+            if match:
+                template = template or match.group(1)
+            elif css_class.startswith('sheet-') or css_class in MESSAGE_CLASSES:
+                classes.add(css_class)
+    return f"{template or 'no template'}: {' '.join(sorted(classes)) or 'text'}"
+
+
+# Rejected messages of a reason and fingerprint, example_key is the message
+# key of one of them
+RejectionGroup = namedtuple('RejectionGroup', ['reason', 'fingerprint', 'count', 'example_key'])
+
+
+# RejectionGroups of the REJECTED rows, most messages first. Each distinct
+# message is parsed once, the rows sharing its HTML are counted by SQLite.
+def rejection_summary(connection):
+    counts = Counter()
+    example_keys = {}
+    result = connection.execution_options(stream_results=True).execute(text('''
+        SELECT r.REASON, COUNT(*), m.HTML
+        FROM REJECTED r
+        JOIN MESSAGE_HTML m ON m.HTML_HASH = r.HTML_HASH
+        GROUP BY r.REASON, r.HTML_HASH
+    '''))
+    for reason, count, blob in result:
+        message = html.fromstring(decompress_html(blob))
+        group = (reason, template_fingerprint(message))
+        counts[group] += count
+        example_keys.setdefault(group, get_message_key(message))
+    return [
+        RejectionGroup(reason, fingerprint, count, example_keys[reason, fingerprint])
+        for (reason, fingerprint), count in counts.most_common()
+    ]
+
+
+def print_rejection_summary(groups, limit=None):
+    total = sum(group.count for group in groups)
+    print(f'{total} rejected messages in {len(groups)} groups')
+    for group in groups[:limit]:
+        share = group.count / total * 100
+        print(f'{group.count:7} {share:5.1f}%  {group.reason}')
+        print(f'                {group.fingerprint}')
+        print(f'                e.g. {group.example_key}')
+    if limit is not None and len(groups) > limit:
+        print(f'... {len(groups) - limit} more groups')
+
+
+# BatchWriter moving rejected messages into DICE_ROLLS: each roll is written
+# in the same transaction as the DELETE of its REJECTED row. The HTML is
+# already in MESSAGE_HTML, and the rolls join the game session of the roll
+# before them in time instead of the last one.
+class ReprocessWriter(BatchWriter):
+    def __init__(self, session, player_registry, batch_size=1000, session_gap=timedelta(hours=3), timer=None):
+        super().__init__(session, DiceRolls.__table__, RollDie.__table__, InlineRoll.__table__, Rejected.__table__, IngestedMessage.__table__,
+                         player_registry, batch_size=batch_size, session_gap=session_gap, timer=timer)
+        self.moved_ids = []
+        self.new_reasons = []
+
+    def move_rejected(self, reject_id, message_key, player_name, dice, html_hash, rolled_at, inline_rolls, **values):
+        self.moved_ids.append({'REJECT_ID': reject_id})
+        self.add_dice_roll(message_key, player_name, dice, html_hash, rolled_at, inline_rolls, **values)
+
+    # Still rejected, for another reason
+    def update_reason(self, reject_id, reason):
+        self.new_reasons.append({'REJECT_ID': reject_id, 'REASON': reason})
+
+    # The HTML is already stored, move_rejected() gives its hash
+    def add_html(self, html_hash):
+        return html_hash
+
+    def game_session_of(self, rolled_at):
+        session_id = self.session.execute(SESSION_BEFORE_QUERY, {'rolled_at': rolled_at}).scalar()
+        if session_id is None:
+            session_id = self.session.execute(SESSION_AFTER_QUERY, {'rolled_at': rolled_at}).scalar()
+        if session_id is None:
+            # No roll yet, the first game session
+            return super().game_session_of(rolled_at)
+        return session_id
+
+    def insert_rows(self):
+        super().insert_rows()
+        self.write_rejected()
+
+    def write_rejected(self):
+        if self.moved_ids:
+            self.session.execute(text('DELETE FROM REJECTED WHERE REJECT_ID = :REJECT_ID'), self.moved_ids)
+        if self.new_reasons:
+            self.session.execute(text('UPDATE REJECTED SET REASON = :REASON WHERE REJECT_ID = :REJECT_ID'), self.new_reasons)
+        self.moved_ids = []
+        self.new_reasons = []
+
+    # The reasons changed after the last roll moved are written too
+    def close(self):
+        super().close()
+        self.write_rejected()
+        self.session.commit()
+
+
+# Run the REJECTED rows through the current extractor. The ones that now parse
+# become DICE_ROLLS rows with their dice, the others stay in REJECTED with their
+# new reason. The rows rejected before their time was stored (schema version
+# 6) are left as they are. Returns the timer with the counts 'moved', 'kept'
+# and 'no time'.
+def reprocess_rejected(engine, batch_size=REPROCESS_PAGE_SIZE, session_gap=timedelta(hours=3)):
+    timer = StageTimer()
+    session = sessionmaker(bind=engine)()
+    try:
+        writer = ReprocessWriter(session, PlayerRegistry(session), batch_size=batch_size, session_gap=session_gap, timer=timer)
+        timer.count('no time', session.execute(text('SELECT COUNT(*) FROM REJECTED WHERE ROLLED_AT IS NULL')).scalar())
+
+        extraction_stage = timer.stage('extraction')
+        last_id = 0
+        while True:
+            with timer.stage('sqlite reads'):
+                rows = session.execute(REJECTED_PAGE_QUERY, {'last_id': last_id, 'page_size': batch_size}).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1].REJECT_ID
+
+            for reject_id, reason, rolled_at, html_hash, blob in rows:
+                with extraction_stage:
+                    message = html.fromstring(decompress_html(blob))
+                    record = message_extractor.extract(message)
+                if record.reject_reason:
+                    timer.count('kept')
+                    if record.reject_reason != reason:
+                        writer.update_reason(reject_id, record.reject_reason)
+                    continue
+
+                timer.count('moved')
+                writer.move_rejected(
+                    reject_id,
+                    get_message_key(message),
+                    record.character_name,
+                    record.dice,
+                    html_hash,
+                    rolled_at,
+                    record.inline_rolls,
+                    NAT_ROLL_VALUE=record.nat_roll_value,
+                    TOTAL_ROLL_VALUE=record.total_roll_value,
+                    ACTION_TYPE=None,
+                    ACTION_NAME=record.action_name,
+                    DICE_TYPE=record.dice_type,
+                    MODIFIER=record.modifier,
+                    IS_CRITICAL_FAIL=int(record.is_critical_fail),
+                    IS_CRITICAL_HIT=int(record.is_critical_hit)
+                )
+        writer.close()
+    finally:
+        session.close()
+    return timer
@@ -0,0 +1,389 @@
+import hashlib
+import re
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+from lxml import html, etree
+from dnd_stats.dice_expr import parse_roll_title, dice_type_of, dice_of, natural_roll_of
+from dnd_stats.ingest_timing import StageTimer
+
+
+# Same test as the '//div[contains(@class, "message") and contains(@class, "general")]' XPath
+def is_general_message(element):
+    css_class = element.get('class', '')
+    return 'message' in css_class and 'general' in css_class
+
+
+# Start of a chat message in the export, the log is split before one of them
+MESSAGE_START = b'<div class="message '
+
+# libxml2 keeps about 0.5 KB per message parsed until its parser is freed, even
+# with the messages cleared, so a new parser is started after this many
+MESSAGES_PER_PARSER = 2_000
+
+# Bytes read from the log at once
+READ_SIZE = 1 << 20
+
+
+# Stream the general messages of a Roll20 chat export one element at a time.
+# The file is never loaded as a whole: it is read in pieces of about
+# MESSAGES_PER_PARSER messages, each parsed by its own parser, and each message
+# is yielded once its closing tag has been parsed, then cleared and detached
+# from the tree. Memory stays bounded by the size of a piece whatever the size
+# of the log.
+def iter_general_messages(file_path):
+    for message, _ in iter_timed_messages(file_path):
+        yield message
+
+
+# Same as iter_general_messages(), with the time of each message: the
+# timestamps of every chat message, general or not, go through a MessageClock.
+# file_path can also be a file object, and clock the clock of the messages
+# before it.
+def iter_timed_messages(file_path, clock=None):
+    clock = clock or MessageClock()
+    try:
+        if hasattr(file_path, 'read'):
+            for piece in iter_log_pieces(file_path):
+                yield from iter_piece_messages(piece, clock)
+        else:
+            with open(file_path, 'rb') as file:
+                for piece in iter_log_pieces(file):
+                    yield from iter_piece_messages(piece, clock)
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+
+
+# The bytes of a log in pieces of about messages_per_piece chat messages, each
+# piece but the first starting with a message. A log without MESSAGE_START is
+# a single piece.
+def iter_log_pieces(source, messages_per_piece=MESSAGES_PER_PARSER):
+    piece = b''
+    starts = 0
+    while True:
+        data = source.read(READ_SIZE)
+        if not data:
+            break
+        # A start cut by the previous read is counted once complete
+        search_from = max(len(piece) - len(MESSAGE_START) + 1, 0)
+        piece += data
+        starts += piece.count(MESSAGE_START, search_from)
+        if starts > messages_per_piece:
+            split = piece.rfind(MESSAGE_START)
+            yield piece[:split]
+            piece = piece[split:]
+            starts = 1
+    if piece:
+        yield piece
+
+
+# (message, time) of the general messages of one piece of a log, parsed by a
+# parser of its own. The parser adds the html and body elements missing from
+# the pieces after the first, and closes the elements left open at the end of
+# a piece.
+def iter_piece_messages(piece, clock):
+    context = etree.iterparse(BytesIO(piece), events=('end',), tag='div', html=True,
+                              encoding='utf-8', huge_tree=True)
+    # A message is held back until the next one ends so that its tail text
+    # is parsed too, etree.tostring() then gives the same HTML as with
+    # html.fromstring()
+    pending = None
+    for _, element in context:
+        if not is_general_message(element):
+            if 'message' in element.get('class', '').split():
+                # Other chat messages (rollresult, emote, ...) are not used
+                clock.update(element)
+                element.clear(keep_tail=True)
+            continue
+
+        if pending is not None:
+            yield pending
+            release_message(pending[0])
+        pending = (element, clock.update(element))
+
+    if pending is not None:
+        yield pending
+        release_message(pending[0])
+
+
+# Timestamps of the export: 'April 05, 2024 8:42PM' on the first message of a
+# day, then only '8:45PM', and not on every message
+TSTAMP_RE = re.compile(r'(?:(?P<date>[A-Z][a-z]+ \d{1,2}, \d{4})\s+)?(?P<time>\d{1,2}:\d{2}\s?[AP]M)')
+
+
+# Time of the messages of a log read in order. A message without a timestamp
+# gets the time of the last one seen, and a time without a date is on the day
+# of the previous message, or the next day when the clock went past midnight.
+# The time is None until the first dated timestamp.
+class MessageClock:
+    def __init__(self, current=None):
+        self.current = current
+
+    # Read the timestamp of a message, returns its time
+    def update(self, message):
+        tstamp = message.find('span[@class="tstamp"]')
+        if tstamp is not None and tstamp.text:
+            self.current = self.parse(tstamp.text) or self.current
+        return self.current
+
+    def parse(self, text):
+        match = TSTAMP_RE.search(text)
+        if not match:
+            return None
+        time_of_day = datetime.strptime(match.group('time').replace(' ', ''), '%I:%M%p').time()
+        if match.group('date'):
+            return datetime.combine(datetime.strptime(match.group('date'), '%B %d, %Y').date(), time_of_day)
+        if self.current is None:
+            return None
+        message_time = datetime.combine(self.current.date(), time_of_day)
+        if message_time < self.current:
+            message_time += timedelta(days=1)
+        return message_time
+
+
+# Free a processed message and everything parsed before it
+def release_message(element):
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+# Key identifying a message across imports: the Roll20 data-messageid, or a
+# hash of its HTML for the messages exported without one
+def get_message_key(message):
+    message_id = message.get('data-messageid')
+    if message_id:
+        return message_id
+    full_message = etree.tostring(message, encoding='unicode', method='html')
+    return 'sha1:' + hashlib.sha1(full_message.encode('utf-8')).hexdigest()
+
+
+SPACES_RE = re.compile(r'\s{2,}')
+INTEGER_RE = re.compile(r'-?\d+')
+
+
+# Values extracted from one general message. reject_reason is None when the
+# message is a valid roll. The values are plain str/int/tuples so a record keeps
+# no reference to the lxml tree and can be sent back from a worker process.
+# dice holds one dice_expr.Die per die rolled. The values of the roll come from
+# its first inline roll, inline_rolls has one InlineRollRecord per inline roll
+# of the message, the first one included.
+MessageRecord = namedtuple('MessageRecord', [
+    'character_name', 'reject_reason', 'nat_roll_value', 'total_roll_value', 'action_name', 'dice_type', 'modifier',
+    'is_critical_fail', 'is_critical_hit', 'dice', 'inline_rolls'
+])
+
+# One inline roll of a message, the rows of the INLINE_ROLL table. total is
+# None when the result can't be read, is_damage is True for the rolls in the
+# damage part of a roll template.
+InlineRollRecord = namedtuple('InlineRollRecord', ['dice_type', 'modifier', 'total', 'is_damage'])
+
+
+def rejected_record(character_name, reject_reason):
+    return MessageRecord(character_name, reject_reason, None, None, None, None, None, None, None, (), ())
+
+
+# Roll templates made of damage rolls only, atkdmg has an attack part too
+DAMAGE_TEMPLATES = {'sheet-rolltemplate-dmg', 'sheet-rolltemplate-npcdmg'}
+
+
+# True for the damage part of a roll template (sheet-damage, sheet-dmg1, ...)
+# and for a damage template
+def is_damage_section(element):
+    for css_class in element.get('class', '').split():
+        if css_class in DAMAGE_TEMPLATES:
+            return True
+        if not css_class.startswith('sheet-rolltemplate-') and ('damage' in css_class or 'dmg' in css_class):
+            return True
+    return False
+
+
+# First text node child of an element, like the first result of 'text()'
+def first_text(element):
+    if element.text:
+        return element.text
+    for child in element:
+        if child.tail:
+            return child.tail
+    return None
+
+
+# Extract a MessageRecord from a general message. The XPath is compiled once and
+# returns every node the extraction needs in document order, so each message is
+# walked a single time instead of once per value. The divs that may be a damage
+# section come before the inline rolls they hold: their rolls are put in a set
+# once and each inline roll is looked up in it. find_values() walks the
+# message and record_of() parses the values, so the two can be timed apart.
+class MessageExtractor:
+    NODES_XPATH = etree.XPath(
+        './/div[contains(@class, "sheet-charname")]/span'
+        ' | .//span[contains(@class, "inlinerollresult")]'
+        ' | .//div[@class="sheet-label"]/span'
+        ' | .//div[contains(@class, "damage") or contains(@class, "dmg")]'
+    )
+
+    def extract(self, message):
+        return self.record_of(*self.find_values(message))
+
+    # character_name, roll_title, total_roll_value, weapon and label of the
+    # message, None for those not found, and the (title, text, is_damage) of
+    # every inline roll
+    def find_values(self, message):
+        character_name = None
+        roll_title = None
+        total_roll_value = None
+        weapon = None
+        label = None
+        inline_rolls = []
+        damage_rolls = set()
+
+        # Keep the first value of each kind, as [0] on the separate queries did
+        for node in self.NODES_XPATH(message):
+            if node.tag == 'div':
+                if is_damage_section(node):
+                    damage_rolls.update(span for span in node.iter('span') if 'inlinerollresult' in span.get('class', ''))
+                continue
+            parent = node.getparent()
+            if parent.tag == 'div':
+                parent_class = parent.get('class', '')
+                if character_name is None and 'sheet-charname' in parent_class:
+                    character_name = first_text(node)
+                if parent_class == 'sheet-label':
+                    if weapon is None:
+                        for link in node.iterchildren('a'):
+                            weapon = first_text(link)
+                            if weapon is not None:
+                                break
+                    if label is None:
+                        label = first_text(node)
+            if node.tag == 'span' and 'inlinerollresult' in node.get('class', ''):
+                title = node.get('title')
+                total_text = first_text(node)
+                if roll_title is None:
+                    roll_title = title
+                if total_roll_value is None:
+                    total_roll_value = total_text
+                inline_rolls.append((title, total_text, node in damage_rolls))
+        return character_name, roll_title, total_roll_value, weapon, label, inline_rolls
+
+    def record_of(self, character_name, roll_title, total_roll_value, weapon, label, inline_rolls=()):
+        if character_name is None:
+            return rejected_record(None, 'NO_CHAR_NAME')
+        character_name = str(character_name)
+
+        if roll_title is None:
+            return rejected_record(character_name, './/span[contains(@class, "inlinerollresult")]/@title not found')
+        if total_roll_value is None:
+            return rejected_record(character_name, './/span[contains(@class, "inlinerollresult")]/text() not found')
+
+        # dice, natural roll value, dice type and modifier from the roll expression
+        # of the first inline roll
+        parsed_roll = parse_roll_title(roll_title)
+        if parsed_roll is None:
+            return rejected_record(character_name, './/span[contains(@class, "inlinerollresult")]/@title not found > basicdiceroll')
+        if parsed_roll.unsupported:
+            return rejected_record(character_name, f'unsupported operator {parsed_roll.unsupported} in the roll expression')
+        natural_die = natural_roll_of(parsed_roll)
+        nat_roll_value = natural_die.face if natural_die else None
+        is_d20 = natural_die is not None and natural_die.sides == 20
+
+        total_match = INTEGER_RE.search(total_roll_value)
+
+        # action_name, the weapon link or else the label text
+        if weapon is not None:
+            action_name = SPACES_RE.sub(' ', weapon.rstrip())
+        else:
+            action_name = ''
+
+        if action_name == '' and label is not None:
+            action_name = label.strip()
+
+        return MessageRecord(
+            character_name,
+            None,
+            nat_roll_value,
+            int(total_match.group()) if total_match else None,
+            str(action_name),
+            dice_type_of(parsed_roll),
+            parsed_roll.modifier,
+            is_d20 and nat_roll_value == 1,
+            is_d20 and nat_roll_value == 20,
+            dice_of(parsed_roll),
+            self.inline_rolls_of(inline_rolls, roll_title, parsed_roll)
+        )
+
+    # InlineRollRecords of the (title, text, is_damage) of a message, the rolls
+    # without dice are left out. The first title is already parsed.
+    def inline_rolls_of(self, inline_rolls, roll_title, parsed_roll):
+        records = []
+        for title, total_text, is_damage in inline_rolls:
+            if title is None:
+                continue
+            parsed = parsed_roll if title == roll_title else parse_roll_title(title)
+            if parsed is None or parsed.unsupported:
+                continue
+            total_match = INTEGER_RE.search(total_text) if total_text else None
+            records.append(InlineRollRecord(
+                dice_type_of(parsed), parsed.modifier, int(total_match.group()) if total_match else None, is_damage
+            ))
+        return tuple(records)
+
+
+# One extractor per process, the compiled XPath can't be shared between processes
+message_extractor = MessageExtractor()
+
+
+# Worker side of the parallel extraction: parse back each serialized message
+def extract_chunk(full_messages):
+    return [message_extractor.extract(html.fromstring(full_message)) for full_message in full_messages]
+
+
+# Extract the (message_key, message_time, full_message, message) coming from
+# the log, in order, into (message_key, message_time, full_message, record).
+# With one worker the messages are handled in this process. With more, they are
+# sent as chunks of HTML to a process pool and the results come back in the
+# same order, so the output is the same as the serial path. Only a few chunks
+# per worker are in flight at once to keep the streaming memory flat.
+# The extraction time goes to the stages of timer: 'xpath' and 'dice parsing',
+# or 'extraction workers' for the time waiting on the pool.
+def iter_extracted(messages, workers=1, chunk_size=500, timer=None):
+    timer = timer or StageTimer()
+    if workers <= 1:
+        xpath_stage = timer.stage('xpath')
+        parsing_stage = timer.stage('dice parsing')
+        for message_key, message_time, full_message, message in messages:
+            with xpath_stage:
+                values = message_extractor.find_values(message)
+            with parsing_stage:
+                record = message_extractor.record_of(*values)
+            yield message_key, message_time, full_message, record
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+
+        def submit(chunk):
+            in_flight.append((chunk, pool.submit(extract_chunk, [full_message for _, _, full_message in chunk])))
+
+        def collect():
+            chunk, future = in_flight.popleft()
+            with timer.stage('extraction workers'):
+                future.result()
+            for (message_key, message_time, full_message), record in zip(chunk, future.result()):
+                yield message_key, message_time, full_message, record
+
+        chunk = []
+        for message_key, message_time, full_message, _ in messages:
+            chunk.append((message_key, message_time, full_message))
+            if len(chunk) >= chunk_size:
+                submit(chunk)
+                chunk = []
+                if len(in_flight) >= workers * 2:
+                    yield from collect()
+        if chunk:
+            submit(chunk)
+        while in_flight:
+            yield from collect()
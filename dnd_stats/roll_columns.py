@@ -0,0 +1,210 @@
+import sys
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import text
+from dnd_stats import queries
+from dnd_stats.ingest_version import get_data_generation
+
+# Columnar copy of ROLL_DIE in memory, shared by every session of a dashboard
+# process: one NumPy array per column in the smallest integer type that fits
+# (int8 faces for the usual dice), the player of each die coded against a
+# dictionary (int16 player codes). The pages compute their crit counts and face
+# histograms from it with np.bincount, instead of running one query each and
+# building a DataFrame of Python objects from its rows.
+# refresh() appends the dice imported since the previous load, ROLL_DIE is read
+# again entirely only when the DATA_GENERATION of the database changed (its
+# rows were deleted by dnd-stats ingest --full-rebuild or a new database).
+
+# Rows fetched at once from SQLite
+LOAD_CHUNK_SIZE = 100_000
+
+# The dice after the last one loaded
+NEW_DICE_QUERY = text('''
+    SELECT PLAYER_ID, COALESCE(SESSION_ID, 0), SIDES, FACE, KEPT, ROLL_DIE_ID
+    FROM ROLL_DIE
+    WHERE ROLL_DIE_ID > :last_id
+    ORDER BY ROLL_DIE_ID
+''')
+
+# One array per column, element i describes die i
+DiceColumns = namedtuple('DiceColumns', ['player', 'session', 'sides', 'face', 'kept'])
+
+COLUMN_DTYPES = DiceColumns(player=np.int16, session=np.int16, sides=np.int16, face=np.int8, kept=np.bool_)
+
+
+# values in the smallest signed integer type, at least smallest, that holds them
+def compact(values, smallest=np.int8):
+    array = np.asarray(values, dtype=np.int64)
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.dtype(dtype).itemsize < np.dtype(smallest).itemsize:
+            continue
+        limits = np.iinfo(dtype)
+        if array.size == 0 or (array.min() >= limits.min and array.max() <= limits.max):
+            return array.astype(dtype)
+    return array
+
+
+# Codes of the distinct values of a column, in the order they were first seen
+class ColumnDictionary:
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values):
+        codes = self.codes
+        return [codes.setdefault(value, len(codes)) for value in values]
+
+    @property
+    def values(self):
+        return list(self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    # Size of the dict and of its keys, the values are small ints shared by Python
+    def nbytes(self):
+        return sys.getsizeof(self.codes) + sum(sys.getsizeof(value) for value in self.codes)
+
+
+class RollColumns:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.columns = DiceColumns(*(np.empty(0, dtype=dtype) for dtype in COLUMN_DTYPES))
+        self.players = ColumnDictionary()  # PLAYER_ID -> code
+        self.player_names = {}
+        self.last_id = 0
+        self.data_generation = None
+        self.ingest_version = None
+        self.last_load = None  # (dice read, seconds, full reload)
+
+    def __len__(self):
+        return len(self.columns.face)
+
+    # Load the dice imported since the previous call. Returns the number of
+    # dice read, 0 when the ingest version is the same.
+    def refresh(self, connection, ingest_version):
+        # The pages of the other sessions wait for the new dice, the readers take the lock too
+        with self.lock:
+            if ingest_version == self.ingest_version:
+                return 0
+            start_time = time.perf_counter()
+            data_generation = get_data_generation(connection)
+            full_reload = data_generation != self.data_generation
+            if full_reload:
+                self.clear()
+                self.data_generation = data_generation
+
+            self.player_names = {player_id: name for player_id, name in queries.players(connection)}
+            added = self.append(connection.execute(NEW_DICE_QUERY, {'last_id': self.last_id}))
+            self.ingest_version = ingest_version
+            self.last_load = (added, time.perf_counter() - start_time, full_reload)
+            return added
+
+    # Append the rows of the result chunk by chunk, called by refresh() with the lock held
+    def append(self, result):
+        chunks = [[column] for column in self.columns]
+        added = 0
+        while True:
+            rows = result.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows:
+                break
+            players, sessions, sides, faces, kept, roll_die_ids = zip(*rows)
+            values = DiceColumns(player=self.players.encode(players), session=sessions, sides=sides, face=faces, kept=kept)
+            for chunk, column, dtype in zip(chunks, values, COLUMN_DTYPES):
+                chunk.append(np.asarray(column, dtype=np.bool_) if dtype is np.bool_ else compact(column, dtype))
+            self.last_id = roll_die_ids[-1]
+            added += len(rows)
+        if added:
+            # np.concatenate promotes a column to the type of the widest chunk
+            self.columns = DiceColumns(*(np.concatenate(chunk) for chunk in chunks))
+        return added
+
+    # Bytes of each array and of the player dictionary
+    def memory_usage(self):
+        with self.lock:
+            return self._memory_usage()
+
+    def _memory_usage(self):
+        usage = {name: column.nbytes for name, column in zip(DiceColumns._fields, self.columns)}
+        usage['players'] = self.players.nbytes()
+        return usage
+
+    def nbytes(self):
+        return sum(self.memory_usage().values())
+
+    # Dice of the players and game sessions of roll_filter
+    def selection(self, columns, roll_filter):
+        selected_players = np.zeros(len(self.players), dtype=np.bool_)
+        selected_players[[self.players.codes[player_id] for player_id in roll_filter.player_ids if player_id in self.players.codes]] = True
+        return (
+            selected_players[columns.player]
+            & (columns.session >= roll_filter.first_session)
+            & (columns.session <= roll_filter.last_session)
+        )
+
+    def player_ids(self):
+        return np.array(self.players.values, dtype=np.int64)
+
+    # (PLAYER_ID, PLAYER_NAME, count) of the players with a d20 kept with the
+    # given face, as queries.crit_counts()
+    def crit_counts(self, face, roll_filter):
+        with self.lock:
+            return self._crit_counts(face, roll_filter)
+
+    def _crit_counts(self, face, roll_filter):
+        columns = self.columns
+        mask = self.selection(columns, roll_filter) & (columns.sides == 20) & (columns.face == face) & columns.kept
+        counts = np.bincount(columns.player[mask], minlength=len(self.players))
+        player_ids = self.player_ids()
+        return sorted(
+            (int(player_ids[code]), self.player_names.get(int(player_ids[code])), int(counts[code]))
+            for code in np.flatnonzero(counts)
+        )
+
+    # (SIDES, PLAYER_ID, PLAYER_NAME, FACE, count) of every die, player and
+    # face rolled, as queries.dice_counts_per_player()
+    def dice_counts(self, roll_filter):
+        with self.lock:
+            return self._dice_counts(roll_filter)
+
+    def _dice_counts(self, roll_filter):
+        columns = self.columns
+        mask = self.selection(columns, roll_filter)
+        sides_values, sides_index = np.unique(columns.sides[mask], return_inverse=True)
+        faces = columns.face[mask].astype(np.int64)
+        face_range = int(faces.max()) + 1 if faces.size else 1
+        players = len(self.players)
+        # One bin per (die, player, face)
+        keys = (sides_index.astype(np.int64) * players + columns.player[mask]) * face_range + faces
+        counts = np.bincount(keys, minlength=len(sides_values) * players * face_range)
+        player_ids = self.player_ids()
+        rows = []
+        for key in np.flatnonzero(counts):
+            sides_code, face = divmod(int(key), face_range)
+            sides_code, player = divmod(sides_code, players)
+            player_id = int(player_ids[player])
+            rows.append((int(sides_values[sides_code]), player_id, self.player_names.get(player_id), face, int(counts[key])))
+        rows.sort(key=lambda row: (row[0], row[2], row[3]))
+        return rows
+
+    # Players x faces matrix of the dice with the given sides, the players
+    # without such a die left out, as dice_stats.face_count_matrix()
+    def face_matrix(self, sides, roll_filter):
+        with self.lock:
+            return self._face_matrix(sides, roll_filter)
+
+    def _face_matrix(self, sides, roll_filter):
+        columns = self.columns
+        mask = self.selection(columns, roll_filter) & (columns.sides == sides) & (columns.face >= 1) & (columns.face <= sides)
+        players = len(self.players)
+        keys = columns.player[mask].astype(np.int64) * sides + columns.face[mask] - 1
+        matrix = np.bincount(keys, minlength=players * sides).reshape(players, sides)
+        rolled = np.flatnonzero(matrix.sum(axis=1))
+        player_ids = self.player_ids()
+        names = np.array([self.player_names.get(int(player_ids[code])) for code in rolled], dtype=object)
+        order = np.argsort(names.astype(str), kind='stable')
+        return names[order].astype(str), matrix[rolled[order]]
@@ -0,0 +1,100 @@
+from collections import Counter
+from sqlalchemy import text
+
+# ROLL_HISTOGRAM holds the number of dice per (SESSION_ID, PLAYER_ID, SIDES,
+# FACE, KEPT). It is kept up to date by BatchWriter with every chunk of
+# ROLL_DIE rows, so the dashboard reads a few hundred counts of the selected
+# game sessions instead of aggregating every die.
+# DAMAGE_HISTOGRAM does the same for the damage rolls of INLINE_ROLL, per
+# (SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL).
+
+HISTOGRAM_UPSERT = text('''
+    INSERT INTO ROLL_HISTOGRAM (SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT, COUNT)
+    VALUES (:SESSION_ID, :PLAYER_ID, :SIDES, :FACE, :KEPT, :COUNT)
+    ON CONFLICT (SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT) DO UPDATE SET COUNT = COUNT + excluded.COUNT
+''')
+
+HISTOGRAM_FROM_DICE = '''
+    SELECT COALESCE(SESSION_ID, 0), PLAYER_ID, SIDES, FACE, KEPT, COUNT(*) AS COUNT
+    FROM ROLL_DIE
+    GROUP BY COALESCE(SESSION_ID, 0), PLAYER_ID, SIDES, FACE, KEPT
+'''
+
+DAMAGE_HISTOGRAM_UPSERT = text('''
+    INSERT INTO DAMAGE_HISTOGRAM (SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL, COUNT)
+    VALUES (:SESSION_ID, :PLAYER_ID, :ACTION_NAME, :DICE_TYPE, :MODIFIER, :TOTAL, :COUNT)
+    ON CONFLICT (SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL) DO UPDATE SET COUNT = COUNT + excluded.COUNT
+''')
+
+DAMAGE_HISTOGRAM_FROM_INLINE_ROLLS = '''
+    SELECT COALESCE(i.SESSION_ID, 0), i.PLAYER_ID, COALESCE(d.ACTION_NAME, ''), i.DICE_TYPE, i.MODIFIER, i.TOTAL, COUNT(*) AS COUNT
+    FROM INLINE_ROLL i
+    JOIN DICE_ROLLS d ON d.DICE_ROLL_ID = i.DICE_ROLL_ID
+    WHERE i.IS_DAMAGE = 1 AND i.TOTAL IS NOT NULL
+    GROUP BY COALESCE(i.SESSION_ID, 0), i.PLAYER_ID, COALESCE(d.ACTION_NAME, ''), i.DICE_TYPE, i.MODIFIER, i.TOTAL
+'''
+
+
+# Add ROLL_DIE rows (dicts with SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT) to the histogram
+def add_to_histogram(session, dice_rows):
+    counts = Counter((row['SESSION_ID'], row['PLAYER_ID'], row['SIDES'], row['FACE'], row['KEPT']) for row in dice_rows)
+    if counts:
+        session.execute(HISTOGRAM_UPSERT, [
+            {'SESSION_ID': session_id, 'PLAYER_ID': player_id, 'SIDES': sides, 'FACE': face, 'KEPT': kept, 'COUNT': count}
+            for (session_id, player_id, sides, face, kept), count in counts.items()
+        ])
+
+
+# Add the damage INLINE_ROLL rows (dicts with SESSION_ID, PLAYER_ID, DICE_TYPE,
+# MODIFIER, TOTAL and the ACTION_NAME of their roll) to DAMAGE_HISTOGRAM
+def add_to_damage_histogram(session, inline_roll_rows):
+    counts = Counter(
+        (row['SESSION_ID'], row['PLAYER_ID'], row['ACTION_NAME'] or '', row['DICE_TYPE'], row['MODIFIER'], row['TOTAL'])
+        for row in inline_roll_rows
+        if row['IS_DAMAGE'] and row['TOTAL'] is not None
+    )
+    if counts:
+        session.execute(DAMAGE_HISTOGRAM_UPSERT, [
+            {'SESSION_ID': session_id, 'PLAYER_ID': player_id, 'ACTION_NAME': action_name, 'DICE_TYPE': dice_type,
+             'MODIFIER': modifier, 'TOTAL': total, 'COUNT': count}
+            for (session_id, player_id, action_name, dice_type, modifier, total), count in counts.items()
+        ])
+
+
+# Compute both histograms again from ROLL_DIE and INLINE_ROLL
+def rebuild_histogram(connection):
+    connection.execute(text('DELETE FROM ROLL_HISTOGRAM'))
+    connection.execute(text('INSERT INTO ROLL_HISTOGRAM (SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT, COUNT) ' + HISTOGRAM_FROM_DICE))
+    connection.execute(text('DELETE FROM DAMAGE_HISTOGRAM'))
+    connection.execute(text(
+        'INSERT INTO DAMAGE_HISTOGRAM (SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL, COUNT) '
+        + DAMAGE_HISTOGRAM_FROM_INLINE_ROLLS
+    ))
+
+
+# Rows of the histogram that differ from ROLL_DIE, as (key, stored, expected)
+def check_histogram(connection):
+    return compare_counts(
+        connection.execute(text('SELECT SESSION_ID, PLAYER_ID, SIDES, FACE, KEPT, COUNT FROM ROLL_HISTOGRAM')),
+        connection.execute(text(HISTOGRAM_FROM_DICE))
+    )
+
+
+# Rows of DAMAGE_HISTOGRAM that differ from INLINE_ROLL, as (key, stored, expected)
+def check_damage_histogram(connection):
+    return compare_counts(
+        connection.execute(text('SELECT SESSION_ID, PLAYER_ID, ACTION_NAME, DICE_TYPE, MODIFIER, TOTAL, COUNT FROM DAMAGE_HISTOGRAM')),
+        connection.execute(text(DAMAGE_HISTOGRAM_FROM_INLINE_ROLLS))
+    )
+
+
+# (key, stored, expected) of the keys counted differently by two results of
+# (key columns..., count) rows
+def compare_counts(stored_rows, expected_rows):
+    stored = {tuple(row[:-1]): row[-1] for row in stored_rows}
+    expected = {tuple(row[:-1]): row[-1] for row in expected_rows}
+    return [
+        (key, stored.get(key, 0), expected.get(key, 0))
+        for key in sorted(set(stored) | set(expected), key=str)
+        if stored.get(key, 0) != expected.get(key, 0)
+    ]
@@ -0,0 +1,114 @@
+import os
+import time
+import pyarrow as pa
+
+# Columnar snapshot of the rolls for analytics, in Arrow IPC files next to the
+# database: ROLL20_DB.rolls.arrow has one row per DICE_ROLLS row and
+# ROLL20_DB.dice.arrow one row per ROLL_DIE row. The HTML is left out, the
+# integers use the smallest type that fits and the names are dictionary
+# encoded, so the files can be memory-mapped and read without copying.
+
+ROLLS_SCHEMA = pa.schema([
+    ('DICE_ROLL_ID', pa.uint32()),
+    ('PLAYER_ID', pa.uint32()),
+    ('PLAYER_NAME', pa.dictionary(pa.int32(), pa.string())),
+    ('SESSION_ID', pa.uint32()),
+    ('ROLLED_AT', pa.timestamp('s')),
+    ('NAT_ROLL_VALUE', pa.uint16()),
+    ('TOTAL_ROLL_VALUE', pa.int32()),
+    ('MODIFIER', pa.int32()),
+    ('DICE_TYPE', pa.dictionary(pa.int32(), pa.string())),
+    ('ACTION_NAME', pa.dictionary(pa.int32(), pa.string())),
+    ('IS_CRITICAL_FAIL', pa.bool_()),
+    ('IS_CRITICAL_HIT', pa.bool_()),
+])
+
+ROLLS_QUERY = '''
+    SELECT r.DICE_ROLL_ID, r.PLAYER_ID, p.PLAYER_NAME, r.SESSION_ID, CAST(strftime('%s', r.ROLLED_AT) AS INTEGER),
+           r.NAT_ROLL_VALUE, r.TOTAL_ROLL_VALUE, r.MODIFIER, r.DICE_TYPE, r.ACTION_NAME,
+           r.IS_CRITICAL_FAIL, r.IS_CRITICAL_HIT
+    FROM DICE_ROLLS r
+    LEFT JOIN PLAYER p ON r.PLAYER_ID = p.PLAYER_ID
+    ORDER BY r.DICE_ROLL_ID
+'''
+
+DICE_SCHEMA = pa.schema([
+    ('DICE_ROLL_ID', pa.uint32()),
+    ('PLAYER_ID', pa.uint32()),
+    ('PLAYER_NAME', pa.dictionary(pa.int32(), pa.string())),
+    ('SESSION_ID', pa.uint32()),
+    ('DIE_INDEX', pa.uint16()),
+    ('SIDES', pa.uint16()),
+    ('FACE', pa.uint16()),
+    ('KEPT', pa.bool_()),
+])
+
+DICE_QUERY = '''
+    SELECT d.DICE_ROLL_ID, d.PLAYER_ID, p.PLAYER_NAME, d.SESSION_ID, d.DIE_INDEX, d.SIDES, d.FACE, d.KEPT
+    FROM ROLL_DIE d
+    LEFT JOIN PLAYER p ON d.PLAYER_ID = p.PLAYER_ID
+    ORDER BY d.ROLL_DIE_ID
+'''
+
+
+def snapshot_paths(database_file):
+    prefix = os.path.splitext(database_file)[0]
+    return prefix + '.rolls.arrow', prefix + '.dice.arrow'
+
+
+# Arrow table of a query, read batch_size rows at a time with the DB-API cursor.
+# The dictionary columns are encoded per batch, then unified so that every
+# batch of the file shares the same dictionaries.
+def query_table(dbapi_connection, query, schema, batch_size=100_000):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(query)
+    batches = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        arrays = []
+        for field, values in zip(schema, columns):
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            elif pa.types.is_timestamp(field.type) or pa.types.is_boolean(field.type):
+                # Stored as integers in SQLite: epoch seconds, 0 and 1
+                arrays.append(pa.array(values, pa.int64()).cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    cursor.close()
+    return pa.Table.from_batches(batches, schema=schema).unify_dictionaries()
+
+
+# Write the table to path, through a temporary file so a dashboard reading
+# the previous snapshot never sees a half written one
+def write_table(table, path):
+    temporary_path = path + '.tmp'
+    with pa.OSFile(temporary_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary_path, path)
+
+
+def write_snapshot(engine, database_file):
+    start_time = time.perf_counter()
+    rolls_path, dice_path = snapshot_paths(database_file)
+    dbapi_connection = engine.raw_connection()
+    try:
+        rolls = query_table(dbapi_connection, ROLLS_QUERY, ROLLS_SCHEMA)
+        dice = query_table(dbapi_connection, DICE_QUERY, DICE_SCHEMA)
+    finally:
+        dbapi_connection.close()
+    write_table(rolls, rolls_path)
+    write_table(dice, dice_path)
+    elapsed = time.perf_counter() - start_time
+    print(f'Snapshot of {rolls.num_rows} rolls ({os.path.getsize(rolls_path) / 1e6:.1f} MB) and '
+          f'{dice.num_rows} dice ({os.path.getsize(dice_path) / 1e6:.1f} MB) written in {elapsed:.2f}s')
+
+
+# Memory-map a snapshot file, the columns are read from the page cache
+def read_snapshot_table(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
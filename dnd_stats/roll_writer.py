@@ -0,0 +1,174 @@
+import time
+from datetime import timedelta
+from sqlalchemy import insert, select, func
+from dnd_stats.roll_histogram import add_to_histogram, add_to_damage_histogram
+from dnd_stats.message_html import compress_html, store_html
+from dnd_stats.ingest_version import bump_ingest_version
+from dnd_stats.ingest_timing import StageTimer
+
+
+# Collect DICE_ROLLS and REJECTED rows and write them in chunks: one executemany
+# INSERT per table and a single commit per chunk instead of one per row.
+# DICE_ROLLS rows are queued with the player name, the PlayerRegistry gives
+# their PLAYER_ID when the chunk is written. Their DICE_ROLL_ID is assigned
+# here so the ROLL_DIE rows of each roll can be inserted in the same chunk,
+# along with their counts in ROLL_HISTOGRAM. The INLINE_ROLL rows of every
+# inline roll of the message go the same way, the damage ones are also
+# counted in DAMAGE_HISTOGRAM.
+# Rolls are split into game sessions the same way: a roll more than
+# session_gap after the previous one starts a new SESSION_ID.
+# The HTML of the messages is compressed into MESSAGE_HTML rows, the
+# DICE_ROLLS and REJECTED rows only keep its hash.
+# The key of each message is written to INGESTED_MESSAGE in the same
+# transaction as its row, so every committed chunk is also a checkpoint that
+# an interrupted import resumes from. Each chunk also bumps the ingest version
+# so the dashboard drops its cached results.
+# The compression, inserts and commits are timed in the stages of timer.
+class BatchWriter:
+    def __init__(self, session, dice_rolls_table, roll_die_table, inline_roll_table, rejected_table, ingested_table, player_registry, batch_size=1000, session_gap=timedelta(hours=3), timer=None):
+        self.session = session
+        self.dice_rolls_table = dice_rolls_table
+        self.roll_die_table = roll_die_table
+        self.inline_roll_table = inline_roll_table
+        self.rejected_table = rejected_table
+        self.ingested_table = ingested_table
+        self.player_registry = player_registry
+        self.batch_size = batch_size
+        self.session_gap = session_gap
+        self.timer = timer or StageTimer()
+
+        self.dice_rolls = []
+        self.roll_dice = []
+        self.inline_rolls = []
+        self.rejected = []
+        self.message_html = {}
+        self.message_keys = []
+        self.rows_written = 0
+        # The last roll by id isn't the last one in time once dnd-stats
+        # reprocess added older rolls, each value is taken on its own
+        last_roll = session.execute(select(
+            func.max(dice_rolls_table.c.DICE_ROLL_ID),
+            func.max(dice_rolls_table.c.SESSION_ID),
+            func.max(dice_rolls_table.c.ROLLED_AT),
+        )).one()
+        self.next_dice_roll_id = (last_roll[0] or 0) + 1
+        self.game_session_id = last_roll[1] or 0
+        self.last_rolled_at = last_roll[2]
+        self.start_time = time.perf_counter()
+
+    # dice: the dice_expr.Die of the roll, written to ROLL_DIE
+    # rolled_at: time of the message in the log, None before its first timestamp
+    # inline_rolls: the roll20_log.InlineRollRecord of the message, written to INLINE_ROLL
+    def add_dice_roll(self, message_key, player_name, dice, html, rolled_at, inline_rolls=(), **values):
+        dice_roll_id = self.next_dice_roll_id
+        self.next_dice_roll_id += 1
+        game_session_id = self.game_session_of(rolled_at)
+
+        self.player_registry.register(player_name)
+        values = dict(values, DICE_ROLL_ID=dice_roll_id, HTML_HASH=self.add_html(html), ROLLED_AT=rolled_at, SESSION_ID=game_session_id)
+        self.dice_rolls.append((player_name, values))
+        for die_index, die in enumerate(dice):
+            self.roll_dice.append((player_name, {
+                'DICE_ROLL_ID': dice_roll_id,
+                'DIE_INDEX': die_index,
+                'SIDES': die.sides,
+                'FACE': die.face,
+                'KEPT': int(die.kept),
+                'EXTRA': int(die.extra),
+                'SESSION_ID': game_session_id,
+            }))
+        for roll_index, inline_roll in enumerate(inline_rolls):
+            self.inline_rolls.append((player_name, {
+                'DICE_ROLL_ID': dice_roll_id,
+                'SESSION_ID': game_session_id,
+                'ROLL_INDEX': roll_index,
+                'DICE_TYPE': inline_roll.dice_type,
+                'MODIFIER': inline_roll.modifier,
+                'TOTAL': inline_roll.total,
+                'IS_DAMAGE': int(inline_roll.is_damage),
+            }))
+        self.message_keys.append({'MESSAGE_KEY': message_key})
+        self.flush_if_full()
+
+    def add_rejected(self, message_key, html, **values):
+        self.rejected.append(dict(values, HTML_HASH=self.add_html(html)))
+        self.message_keys.append({'MESSAGE_KEY': message_key})
+        self.flush_if_full()
+
+    # SESSION_ID of a roll made at rolled_at
+    def game_session_of(self, rolled_at):
+        if self.game_session_id == 0 or (
+            rolled_at is not None and self.last_rolled_at is not None and rolled_at - self.last_rolled_at > self.session_gap
+        ):
+            self.game_session_id += 1
+        if rolled_at is not None:
+            self.last_rolled_at = rolled_at
+        return self.game_session_id
+
+    # Queue the compressed HTML of a message and return its hash
+    def add_html(self, html):
+        with self.timer.stage('html compression'):
+            row = compress_html(html)
+        self.message_html[row['HTML_HASH']] = row
+        return row['HTML_HASH']
+
+    def flush_if_full(self):
+        if len(self.dice_rolls) + len(self.rejected) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Nothing queued, the ingest version stays the same
+        if not self.message_keys:
+            return
+        with self.timer.stage('sqlite inserts'):
+            self.insert_rows()
+        with self.timer.stage('sqlite commit'):
+            self.session.commit()
+
+        self.rows_written += len(self.dice_rolls) + len(self.rejected)
+        self.dice_rolls = []
+        self.roll_dice = []
+        self.inline_rolls = []
+        self.rejected = []
+        self.message_html = {}
+        self.message_keys = []
+
+    # One executemany INSERT per table, committed together by flush()
+    def insert_rows(self):
+        self.player_registry.flush()
+        store_html(self.session, list(self.message_html.values()))
+        if self.dice_rolls:
+            rows = [
+                dict(values, PLAYER_ID=self.player_registry.get_id(player_name))
+                for player_name, values in self.dice_rolls
+            ]
+            self.session.execute(insert(self.dice_rolls_table), rows)
+        if self.roll_dice:
+            rows = [
+                dict(values, PLAYER_ID=self.player_registry.get_id(player_name))
+                for player_name, values in self.roll_dice
+            ]
+            self.session.execute(insert(self.roll_die_table), rows)
+            add_to_histogram(self.session, rows)
+        if self.inline_rolls:
+            rows = [
+                dict(values, PLAYER_ID=self.player_registry.get_id(player_name))
+                for player_name, values in self.inline_rolls
+            ]
+            self.session.execute(insert(self.inline_roll_table), rows)
+            action_names = {values['DICE_ROLL_ID']: values['ACTION_NAME'] for _, values in self.dice_rolls}
+            add_to_damage_histogram(self.session, [
+                dict(row, ACTION_NAME=action_names[row['DICE_ROLL_ID']]) for row in rows if row['IS_DAMAGE']
+            ])
+        if self.rejected:
+            self.session.execute(insert(self.rejected_table), self.rejected)
+        if self.message_keys:
+            self.session.execute(insert(self.ingested_table).prefix_with('OR IGNORE'), self.message_keys)
+        bump_ingest_version(self.session)
+
+    # Write what is left and print the throughput
+    def close(self):
+        self.flush()
+        elapsed = time.perf_counter() - self.start_time
+        rows_per_sec = self.rows_written / elapsed if elapsed > 0 else 0
+        print(f'{self.rows_written} rows written in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)')
@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+# The synthetic Roll20 logs of the benchmarks
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCHMARKS_DIR)
+from generate_log import write_log
+
+
+# write_generated_log(messages, name='log.html', seed=1) writes a synthetic log
+# in the test directory and returns its path. With the same seed a log of more
+# messages starts with the messages of a shorter one, as a log exported again
+# later in the campaign.
+@pytest.fixture
+def write_generated_log(tmp_path):
+    def write_generated_log(messages, name='log.html', seed=1):
+        log_path = tmp_path / name
+        with open(log_path, 'w', encoding='utf-8') as output:
+            write_log(output, messages, seed)
+        return str(log_path)
+    return write_generated_log
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f'sqlite:///{tmp_path / "ROLL20_DB.db"}'
@@ -0,0 +1,60 @@
+import threading
+from sqlalchemy.exc import OperationalError
+from dnd_stats import queries
+from dnd_stats.db import create_write_engine, create_read_engine
+from dnd_stats.ingest import LogImporter
+from dnd_stats.ingest_version import get_ingest_version
+from dnd_stats.migrations import upgrade
+from dnd_stats.queries import RollFilter
+
+READERS = 4
+
+
+# Loads the dashboard queries on the read-only engine until stop is set, as a
+# dashboard session refreshing during the import
+def read_pages(engine, stop, versions, errors):
+    while not stop.is_set():
+        try:
+            with engine.connect() as connection:
+                versions.append(get_ingest_version(connection))
+                player_ids = tuple(player_id for player_id, _ in queries.players(connection))
+                sessions = queries.game_sessions(connection)
+                if not player_ids or not sessions:
+                    continue
+                roll_filter = RollFilter(player_ids, sessions[0][0], sessions[-1][0])
+                queries.crit_counts(connection, 20, roll_filter)
+                queries.dice_counts_per_player(connection, roll_filter)
+                queries.damage_counts(connection, roll_filter)
+        except OperationalError as e:
+            errors.append(str(e))
+
+
+def test_dashboard_reads_during_an_import(write_generated_log, database_url):
+    log_path = write_generated_log(3000)
+    # The tables exist before the readers start, as when the dashboard is
+    # opened on a database
+    upgrade(create_write_engine(database_url))
+
+    read_engine = create_read_engine(database_url, pool_size=READERS)
+    stop = threading.Event()
+    versions = [[] for _ in range(READERS)]
+    errors = []
+    readers = [threading.Thread(target=read_pages, args=(read_engine, stop, reader_versions, errors))
+               for reader_versions in versions]
+    for reader in readers:
+        reader.start()
+    try:
+        # Small batches, every commit bumps the ingest version
+        LogImporter(database_url, batch_size=100, export_snapshot=False, quiet=True).run([log_path])
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+        read_engine.dispose()
+
+    # No "database is locked" nor any other error of the readers
+    assert errors == []
+    for reader_versions in versions:
+        # The readers saw the import go on, and never an older version again
+        assert reader_versions == sorted(reader_versions)
+        assert reader_versions[-1] > reader_versions[0]
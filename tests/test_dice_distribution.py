@@ -0,0 +1,49 @@
+import itertools
+from collections import Counter
+import numpy as np
+import pytest
+from dnd_stats.dice_distribution import roll_distribution, distribution_moments, expected_counts
+
+
+# Distribution of a sum of dice by enumerating every outcome, signed_sides
+# being the sides of each die, negative for a subtracted one
+def brute_force(signed_sides, modifier):
+    totals = Counter()
+    for faces in itertools.product(*(range(1, abs(sides) + 1) for sides in signed_sides)):
+        totals[modifier + sum(face if sides > 0 else -face for face, sides in zip(faces, signed_sides))] += 1
+    outcomes = sum(totals.values())
+    minimum = min(totals)
+    return minimum, np.array([totals[total] / outcomes for total in range(minimum, max(totals) + 1)])
+
+
+@pytest.mark.parametrize('dice_type, modifier, signed_sides', [
+    ('2d6', 1, [6, 6]),
+    ('1d20', 5, [20]),
+    ('3d4', 0, [4, 4, 4]),
+    ('1d8+1d6', 2, [8, 6]),
+    ('1d8-1d4', 0, [8, -4]),
+    ('2d6-1d4', -1, [6, 6, -4]),
+    ('5d6', 0, [6] * 5),
+    ('3d6sd', 0, [6, 6, 6]),
+    ('1d20cs>19', 3, [20]),
+])
+def test_convolution_matches_enumeration(dice_type, modifier, signed_sides):
+    distribution = roll_distribution(dice_type, modifier)
+    minimum, probabilities = brute_force(signed_sides, modifier)
+    assert distribution.minimum == minimum
+    np.testing.assert_allclose(distribution.probabilities, probabilities)
+
+
+@pytest.mark.parametrize('dice_type', ['2d20kh1', '2d20kl1', '4d6dl1', '2d6r<2', '2d6ro<2', '1d6!', '1d8+2d6r<2', '1d20*2'])
+def test_not_a_sum_of_dice(dice_type):
+    assert roll_distribution(dice_type) is None
+
+
+def test_moments():
+    assert distribution_moments(roll_distribution('2d6', 1)) == pytest.approx((8.0, 35 / 6))
+    assert distribution_moments(roll_distribution('1d8-1d4')) == pytest.approx((2.0, 6.5))
+
+
+def test_expected_counts_outside_of_the_range():
+    expected = expected_counts(roll_distribution('1d4'), 8, 3, 6)
+    np.testing.assert_allclose(expected, [2, 2, 0, 0])
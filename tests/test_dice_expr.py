@@ -0,0 +1,96 @@
+import pytest
+from dnd_stats.dice_expr import parse_roll_title, dice_type_of, dice_of, natural_roll_of
+from dnd_stats.roll20_log import message_extractor
+
+
+# Title of an inline roll as in the export, dropped holds the indexes of the
+# faces the export marks as dropped
+def roll_title(expression, faces, results=None, dropped=()):
+    spans = '+'.join(
+        f'<span class="basicdiceroll{" dropped" if index in dropped else ""}">{face}</span>'
+        for index, face in enumerate(faces)
+    )
+    return f'Rolling {expression} = {results.format(spans) if results else f"({spans})"}'
+
+
+def kept_faces(parsed_roll):
+    return [die.face for die in dice_of(parsed_roll) if die.kept]
+
+
+@pytest.mark.parametrize('expression, faces, dice_type, kept', [
+    ('4d6dl1', [1, 5, 4, 3], '4d6dl1', [5, 4, 3]),
+    ('4d6kh3', [1, 5, 4, 3], '4d6kh3', [5, 4, 3]),
+    ('2d20kh1', [7, 15], '2d20kh1', [15]),
+    ('2d20kl1', [7, 15], '2d20kl1', [7]),
+    ('4d6d', [2, 6, 6, 3], '4d6d1', [6, 6, 3]),
+    ('3d6sd', [6, 4, 1], '3d6sd', [6, 4, 1]),
+    ('4d6kh3sd', [6, 5, 4, 1], '4d6kh3sd', [6, 5, 4]),
+])
+def test_keep_and_drop(expression, faces, dice_type, kept):
+    parsed_roll = parse_roll_title(roll_title(expression, faces))
+    assert dice_type_of(parsed_roll) == dice_type
+    assert kept_faces(parsed_roll) == kept
+
+
+def test_sort_is_not_a_drop():
+    parsed_roll = parse_roll_title(roll_title('3d6sd', [6, 4, 1]))
+    assert parsed_roll.groups[0].keep is None
+
+
+def test_dropped_span_of_the_export():
+    # The export is trusted over kh1 when it marks the dropped dice
+    parsed_roll = parse_roll_title(roll_title('2d20kh1+5', [12, 3], '({})+5', dropped=(1,)))
+    assert [(die.face, die.kept) for die in dice_of(parsed_roll)] == [(12, True), (3, False)]
+    assert natural_roll_of(parsed_roll).face == 12
+    assert parsed_roll.modifier == 5
+
+
+def test_subtracted_group():
+    title = 'Rolling 1d8-1d4 = (<span class="basicdiceroll">6</span>)-(<span class="basicdiceroll">3</span>)'
+    parsed_roll = parse_roll_title(title)
+    assert dice_type_of(parsed_roll) == '1d8-1d4'
+    assert [(die.sides, die.face, die.sign) for die in dice_of(parsed_roll)] == [(8, 6, 1), (4, 3, -1)]
+    assert natural_roll_of(parsed_roll) is None
+
+
+@pytest.mark.parametrize('expression, results, modifier', [
+    ('1d20+5', '({})+5', 5),
+    ('1d20+5-1', '({})+5-1', 4),
+    ('1d20-2', '({})-2', -2),
+    ('1d20+(2)', '({})+(2)', 2),
+    ('1d20-(2+1)', '({})-(2+1)', -3),
+    ('1d20', '({})', 0),
+])
+def test_constant_modifiers(expression, results, modifier):
+    parsed_roll = parse_roll_title(roll_title(expression, [11], results))
+    assert parsed_roll.modifier == modifier
+    assert dice_type_of(parsed_roll) == '1d20'
+    assert parsed_roll.unsupported is None
+
+
+def test_labels():
+    parsed_roll = parse_roll_title(roll_title('1d20+3[STR]+2[PROF]', [11], '({})+3+2'))
+    assert parsed_roll.labels == ('STR', 'PROF')
+    assert parsed_roll.modifier == 5
+
+
+def test_reroll_and_explode():
+    # Great Weapon Fighting: the 1 is rerolled, the 4 replaces it
+    parsed_roll = parse_roll_title(roll_title('2d6r<2', [1, 5, 4]))
+    assert dice_type_of(parsed_roll) == '2d6r<2'
+    assert [(die.face, die.kept, die.extra) for die in dice_of(parsed_roll)] == [(1, False, True), (5, True, False), (4, True, False)]
+
+    parsed_roll = parse_roll_title(roll_title('1d6!+1', [6, 3], '({})+1'))
+    assert dice_type_of(parsed_roll) == '1d6!'
+    assert [(die.face, die.kept, die.extra) for die in dice_of(parsed_roll)] == [(6, True, False), (3, True, True)]
+
+
+def test_multiplied_roll_is_rejected():
+    title = 'Rolling (1d20+2)*2 = ((<span class="basicdiceroll">7</span>)+2)*2'
+    assert parse_roll_title(title).unsupported == '*'
+    record = message_extractor.record_of('Oskar', title, '18', None, None)
+    assert record.reject_reason == 'unsupported operator * in the roll expression'
+
+
+def test_title_without_dice():
+    assert parse_roll_title('Rolling 5 = 5') is None
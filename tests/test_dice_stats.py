@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from dnd_stats.dice_stats import chi2_sf, wilson_interval
+
+
+# Critical values of the chi-square table, at the 0.05 and 0.01 levels
+@pytest.mark.parametrize('x, degrees_of_freedom, p_value', [
+    (3.8415, 1, 0.05),
+    (6.6349, 1, 0.01),
+    (5.9915, 2, 0.05),
+    (7.8147, 3, 0.05),
+    (11.0705, 5, 0.05),
+    (15.0863, 5, 0.01),
+    (30.1435, 19, 0.05),
+    (36.1909, 19, 0.01),
+    (123.2252, 99, 0.05),
+])
+def test_chi2_sf_against_the_table(x, degrees_of_freedom, p_value):
+    assert chi2_sf(x, degrees_of_freedom) == pytest.approx(p_value, abs=1e-5)
+
+
+def test_chi2_sf_of_an_array():
+    np.testing.assert_allclose(chi2_sf(np.array([0.0, 30.1435, 36.1909]), 19), [1.0, 0.05, 0.01], atol=1e-5)
+
+
+# Score intervals of Newcombe (1998), Statistics in Medicine 17, table I: each
+# row is (successes, failures), the interval is the one of the successes
+def test_wilson_interval_against_newcombe():
+    lower, upper = wilson_interval([[81, 182], [15, 133], [0, 20], [1, 28]])
+    np.testing.assert_allclose(lower[:, 0], [0.2553, 0.0624, 0.0, 0.0061], atol=1e-4)
+    np.testing.assert_allclose(upper[:, 0], [0.3662, 0.1605, 0.1611, 0.1718], atol=1e-4)
+    # The failures get the complementary interval
+    np.testing.assert_allclose(lower[:, 1], 1 - upper[:, 0])
+    np.testing.assert_allclose(upper[:, 1], 1 - lower[:, 0])
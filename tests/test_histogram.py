@@ -0,0 +1,44 @@
+from sqlalchemy import text
+from dnd_stats.db import create_write_engine
+from dnd_stats.ingest import LogImporter
+from dnd_stats.rejected import reprocess_rejected
+from dnd_stats.roll20_log import message_extractor, rejected_record
+from dnd_stats.roll_histogram import check_histogram, check_damage_histogram
+
+
+def import_log(database_url, log_path):
+    LogImporter(database_url, batch_size=200, export_snapshot=False, quiet=True).run([log_path])
+
+
+def check_histograms(engine):
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT COUNT(*) FROM ROLL_DIE')).scalar() > 0
+        # ROLL_HISTOGRAM against a GROUP BY over ROLL_DIE, DAMAGE_HISTOGRAM
+        # against one over INLINE_ROLL
+        assert check_histogram(connection) == []
+        assert check_damage_histogram(connection) == []
+
+
+def test_histograms_follow_the_imports(write_generated_log, database_url, monkeypatch):
+    # A parser that doesn't know kh yet rejects the attack rolls, which the
+    # reprocess moves to DICE_ROLLS once it does
+    record_of = message_extractor.record_of
+
+    def record_of_without_kh(character_name, roll_title, *values):
+        if roll_title is not None and 'kh' in roll_title:
+            return rejected_record(character_name, 'unsupported kh')
+        return record_of(character_name, roll_title, *values)
+
+    monkeypatch.setattr(message_extractor, 'record_of', record_of_without_kh)
+    import_log(database_url, write_generated_log(1500, 'log_1.html'))
+    engine = create_write_engine(database_url)
+    check_histograms(engine)
+
+    # Incremental import of the same log exported again later
+    import_log(database_url, write_generated_log(3000, 'log_2.html'))
+    check_histograms(engine)
+
+    monkeypatch.undo()
+    timer = reprocess_rejected(engine)
+    assert timer.counts['moved'] > 0
+    check_histograms(engine)
@@ -0,0 +1,44 @@
+from sqlalchemy import text
+from dnd_stats.db import create_write_engine
+from dnd_stats.ingest import LogImporter
+
+ROWS_QUERY = text('SELECT DICE_ROLL_ID, HTML_HASH, ROLLED_AT, TOTAL_ROLL_VALUE FROM DICE_ROLLS')
+
+
+def import_log(database_url, log_path):
+    importer = LogImporter(database_url, batch_size=200, export_snapshot=False, quiet=True)
+    importer.run([log_path])
+    return importer.timer.counts
+
+
+# Every general message is a roll or a rejected message, with its key
+def imported_counts(engine):
+    with engine.connect() as connection:
+        return (
+            connection.execute(text('SELECT COUNT(*) FROM INGESTED_MESSAGE')).scalar(),
+            connection.execute(text('SELECT COUNT(*) FROM DICE_ROLLS')).scalar()
+            + connection.execute(text('SELECT COUNT(*) FROM REJECTED')).scalar(),
+        )
+
+
+def test_incremental_import(write_generated_log, database_url):
+    log_path = write_generated_log(1000)
+    import_log(database_url, log_path)
+    engine = create_write_engine(database_url)
+    assert imported_counts(engine) == (1000, 1000)
+    with engine.connect() as connection:
+        rows = set(connection.execute(ROWS_QUERY).fetchall())
+
+    # The same log again adds nothing
+    counts = import_log(database_url, log_path)
+    assert (counts['rolls'], counts['rejected'], counts['skipped']) == (0, 0, 1000)
+    assert imported_counts(engine) == (1000, 1000)
+
+    # The log exported again later adds only its new messages, the rows of the
+    # first import are left as they are
+    counts = import_log(database_url, write_generated_log(2500, 'longer_log.html'))
+    assert counts['rolls'] + counts['rejected'] == 1500
+    assert counts['skipped'] == 1000
+    assert imported_counts(engine) == (2500, 2500)
+    with engine.connect() as connection:
+        assert rows <= set(connection.execute(ROWS_QUERY).fetchall())
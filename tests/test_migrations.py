@@ -0,0 +1,60 @@
+from sqlalchemy import inspect, text
+from dnd_stats import migrations
+from dnd_stats.db import create_write_engine
+from dnd_stats.migrations import upgrade, check_query_plans, get_schema_version, SCHEMA_VERSION
+
+
+# Database as the scripts left it before the HTML moved to MESSAGE_HTML, with
+# one roll and one rejected message
+def version_2_engine(tmp_path):
+    engine = create_write_engine(f'sqlite:///{tmp_path / "dnd_stats.db"}')
+    with engine.begin() as connection:
+        migrations.migration_1_indexes(connection)
+        migrations.migration_2_roll_histogram(connection)
+        connection.execute(text('PRAGMA user_version = 2'))
+        connection.execute(text("INSERT INTO PLAYER (PLAYER_ID, PLAYER_NAME) VALUES (1, 'Oskar')"))
+        connection.execute(text(
+            "INSERT INTO DICE_ROLLS (DICE_ROLL_ID, DICE_TYPE, PLAYER_ID, FULL_MESSAGE) VALUES (7, '1d20', 1, '<div>roll</div>')"
+        ))
+        connection.execute(text("INSERT INTO REJECTED (REJECT_ID, REASON, HTML) VALUES (3, 'NO_CHAR_NAME', '<div>emote</div>')"))
+    return engine
+
+
+def check_upgraded(engine):
+    with engine.begin() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+        assert 'FULL_MESSAGE' not in [column['name'] for column in inspect(connection).get_columns('DICE_ROLLS')]
+        assert 'HTML' not in [column['name'] for column in inspect(connection).get_columns('REJECTED')]
+        html = connection.execute(text(
+            'SELECT m.SIZE FROM DICE_ROLLS d JOIN MESSAGE_HTML m ON m.HTML_HASH = d.HTML_HASH WHERE d.DICE_ROLL_ID = 7'
+        )).scalar()
+        assert html == len('<div>roll</div>')
+        assert connection.execute(text('SELECT REASON FROM REJECTED WHERE REJECT_ID = 3')).scalar() == 'NO_CHAR_NAME'
+        # DICE_ROLL_ID is still the rowid and the indexes are still there
+        connection.execute(text("INSERT INTO DICE_ROLLS (DICE_TYPE) VALUES ('1d8')"))
+        assert connection.execute(text("SELECT DICE_ROLL_ID FROM DICE_ROLLS WHERE DICE_TYPE = '1d8'")).scalar() == 8
+        assert check_query_plans(connection) == []
+
+
+def test_upgrade_moves_the_html(tmp_path):
+    engine = version_2_engine(tmp_path)
+    upgrade(engine)
+    check_upgraded(engine)
+
+
+def test_upgrade_before_sqlite_3_35(tmp_path, monkeypatch):
+    # The tables are copied without the column instead of ALTER TABLE DROP COLUMN
+    monkeypatch.setattr(migrations, 'DROP_COLUMN_SQLITE_VERSION', (99, 0, 0))
+    engine = version_2_engine(tmp_path)
+    upgrade(engine)
+    check_upgraded(engine)
+    with engine.connect() as connection:
+        foreign_keys = connection.execute(text('PRAGMA foreign_key_list(DICE_ROLLS)')).fetchall()
+    assert sorted((row[2], row[3], row[4]) for row in foreign_keys) == [
+        ('MESSAGE_HTML', 'HTML_HASH', 'HTML_HASH'), ('PLAYER', 'PLAYER_ID', 'PLAYER_ID')
+    ]
+
+
+def test_new_database_prints_no_size_report(tmp_path, capsys):
+    upgrade(create_write_engine(f'sqlite:///{tmp_path / "dnd_stats.db"}'))
+    assert 'VACUUM' not in capsys.readouterr().out
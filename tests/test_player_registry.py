@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from dnd_stats.db import create_write_engine
+from dnd_stats.ingest import LogImporter
+from dnd_stats.migrations import upgrade
+from dnd_stats.player_registry import PlayerRegistry
+
+PLAYERS_QUERY = text('SELECT PLAYER_NAME, PLAYER_ID FROM PLAYER ORDER BY PLAYER_ID')
+
+
+def test_same_name_registered_twice(database_url):
+    engine = create_write_engine(database_url)
+    upgrade(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as session:
+        registry = PlayerRegistry(session)
+        registry.register('Oskar')
+        registry.register('Kirgi')
+        registry.register('Oskar')
+        # A registry loaded before the names are committed, as a second import
+        # running at the same time
+        with Session() as other_session:
+            other_registry = PlayerRegistry(other_session)
+            registry.flush()
+            session.commit()
+
+            other_registry.register('Oskar')
+            other_registry.flush()
+            other_session.commit()
+            assert other_registry.get_id('Oskar') == registry.get_id('Oskar')
+
+    with engine.connect() as connection:
+        assert connection.execute(PLAYERS_QUERY).fetchall() == [('Oskar', 1), ('Kirgi', 2)]
+
+
+def test_players_of_two_imports(write_generated_log, database_url):
+    engine = create_write_engine(database_url)
+    LogImporter(database_url, export_snapshot=False, quiet=True).run([write_generated_log(500, 'log_1.html')])
+    with engine.connect() as connection:
+        players = connection.execute(PLAYERS_QUERY).fetchall()
+    assert len(players) == len({name for name, _ in players}) > 0
+
+    # The new messages of the next import are of the same characters, each
+    # keeps a single PLAYER_ID
+    importer = LogImporter(database_url, export_snapshot=False, quiet=True)
+    importer.run([write_generated_log(1000, 'log_2.html')])
+    assert importer.timer.counts['rolls'] > 0
+    with engine.connect() as connection:
+        assert connection.execute(PLAYERS_QUERY).fetchall() == players
+        assert connection.execute(text('SELECT COUNT(*) FROM DICE_ROLLS WHERE PLAYER_ID NOT IN (SELECT PLAYER_ID FROM PLAYER)')).scalar() == 0
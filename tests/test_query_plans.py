@@ -0,0 +1,12 @@
+from dnd_stats.db import create_write_engine
+from dnd_stats.migrations import upgrade, check_query_plans, get_schema_version, MIGRATIONS
+
+
+# The dashboard queries read an index on a database created by the migrations,
+# the check dnd-stats migrate prints
+def test_dashboard_queries_use_an_index(tmp_path):
+    engine = create_write_engine(f'sqlite:///{tmp_path / "dnd_stats.db"}')
+    upgrade(engine)
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == len(MIGRATIONS)
+        assert check_query_plans(connection) == []